@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Context Packer
+Builds the retrieved-context block of the diagnosis prompt under per-section
+token budgets: candidates are picked by MMR (relevance minus overlap with
+what is already packed, across manuals and issues), near-duplicates are
+dropped, and long manual sections are cut at sentence boundaries instead of
+a fixed character count.
+"""
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# HF tokenizer repo or local tokenizer.json used for counting: Llama 3's BPE,
+# the same vocab as the Groq 70B model, so counts are its prompt tokens
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "NousResearch/Meta-Llama-3-8B")
+# Used when PROMPT_TOKENIZER cannot be loaded: the embedder's WordPiece vocab
+# (already cached). It splits Indonesian text finer than Llama 3's BPE, so its
+# counts are an estimate that errs on the high side.
+PROMPT_TOKENIZER_FALLBACK = os.getenv("PROMPT_TOKENIZER_FALLBACK", "sentence-transformers/all-MiniLM-L6-v2")
+CONTEXT_MANUAL_TOKENS = int(os.getenv("CONTEXT_MANUAL_TOKENS", "600"))
+CONTEXT_ISSUE_TOKENS = int(os.getenv("CONTEXT_ISSUE_TOKENS", "450"))
+# Longest single manual excerpt
+CONTEXT_ITEM_MAX_TOKENS = int(os.getenv("CONTEXT_ITEM_MAX_TOKENS", "220"))
+# MMR trade-off: 1.0 = relevance only, 0.0 = diversity only
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Overlap (bigram containment) above which a candidate is a duplicate and dropped
+CONTEXT_REDUNDANCY = float(os.getenv("CONTEXT_REDUNDANCY", "0.6"))
+
+# Excerpts shorter than this are not worth a truncated slot
+MIN_EXCERPT_TOKENS = 40
+
+WORD_PATTERN = re.compile(r"\w+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+_tokenizer = None
+# Which tokenizer counts: PROMPT_TOKENIZER, PROMPT_TOKENIZER_FALLBACK or "estimate" (len/4)
+tokenizer_name: Optional[str] = None
+_tokenizer_lock = threading.Lock()
+
+
+def _load_tokenizer(name: str):
+    from tokenizers import Tokenizer
+    if os.path.isfile(name):
+        return Tokenizer.from_file(name)
+    # Prefer a copy already in the local HF cache over a hub round-trip
+    from huggingface_hub import try_to_load_from_cache
+    cached = try_to_load_from_cache(name, "tokenizer.json")
+    if isinstance(cached, str):
+        return Tokenizer.from_file(cached)
+    return Tokenizer.from_pretrained(name)
+
+
+def get_tokenizer():
+    """
+    Shared tokenizer, or False when none can be loaded (counts fall back to an estimate)
+
+    Loaded by the prompt_tokenizer warm-up in main.py, so requests never wait on it.
+    tokenizer_name tells whether counts are Llama 3 prompt tokens or an estimate.
+    """
+    global _tokenizer, tokenizer_name
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                for name in dict.fromkeys(filter(None, (PROMPT_TOKENIZER, PROMPT_TOKENIZER_FALLBACK))):
+                    try:
+                        tokenizer = _load_tokenizer(name)
+                    except Exception as e:
+                        print(f"[PROMPT] Tokenizer {name} unavailable: {e}")
+                        continue
+                    tokenizer_name = name
+                    _tokenizer = tokenizer
+                    break
+                else:
+                    print("[PROMPT] No tokenizer available, estimating counts")
+                    tokenizer_name = "estimate"
+                    _tokenizer = False
+    return _tokenizer
+
+
+def counts_are_exact() -> bool:
+    """True when counts come from PROMPT_TOKENIZER (the LLM's own vocab)"""
+    return tokenizer_name == PROMPT_TOKENIZER
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    # ~4 characters per token for mixed Indonesian/English
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, counter: Callable[[str], int] = count_tokens) -> str:
+    """Longest prefix of whole sentences within max_tokens (word-level cut for a single long sentence)"""
+    if counter(text) <= max_tokens:
+        return text
+
+    kept = ""
+    for sentence in SENTENCE_END.split(text.strip()):
+        candidate = f"{kept} {sentence}".strip() if kept else sentence
+        if counter(candidate) > max_tokens:
+            break
+        kept = candidate
+    if kept:
+        return kept
+
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if counter(" ".join(words[:mid]) + " …") <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low]) + " …" if low else ""
+
+
+def _bigrams(text: str) -> Set[tuple]:
+    words = WORD_PATTERN.findall(text.lower())
+    return set(zip(words, words[1:])) or {(w,) for w in words}
+
+
+def overlap(a: Set[tuple], b: Set[tuple]) -> float:
+    """Containment: share of the smaller text's bigrams found in the other"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+@dataclass
+class _Candidate:
+    section: str  # "manual" | "issue"
+    source: dict
+    relevance: float
+    text: str  # rendered prompt line(s)
+    shingles: Set[tuple] = field(default_factory=set)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    manuals: List[dict]
+    issues: List[dict]
+    dropped_redundant: int = 0
+    dropped_budget: int = 0
+
+
+def render_manual(doc: dict, content: Optional[str] = None) -> str:
+    return f"- {doc.get('section', 'N/A')}: {content if content is not None else doc.get('content', '')}"
+
+
+def render_issue(issue: dict) -> str:
+    causes = ", ".join(issue.get('probable_cause') or [])
+    cost = issue.get('cost_estimate_idr') or {}
+    return (
+        f"- Gejala: {issue.get('symptom', 'N/A')}\n"
+        f"  Penyebab: {causes}\n"
+        f"  Estimasi: Rp {cost.get('min', 0):,} - Rp {cost.get('max', 0):,}"
+    )
+
+
+def _relevance(row: dict, rank: int) -> float:
+    similarity = row.get("similarity")
+    # Rows without a score keep their retrieval order
+    return float(similarity) if similarity is not None else 0.5 - rank * 0.01
+
+
+def pack_context(
+    manuals: List[dict],
+    issues: List[dict],
+    manual_tokens: int = CONTEXT_MANUAL_TOKENS,
+    issue_tokens: int = CONTEXT_ISSUE_TOKENS,
+    item_max_tokens: int = CONTEXT_ITEM_MAX_TOKENS,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    redundancy: float = CONTEXT_REDUNDANCY,
+    counter: Callable[[str], int] = count_tokens,
+) -> PackedContext:
+    """
+    Select and render retrieved rows for the prompt
+
+    One greedy MMR pass over manuals and issues together; each pick must fit
+    its section's remaining budget (manual excerpts are shortened to fit,
+    issues are kept whole or skipped).
+    """
+    candidates = []
+    for rank, doc in enumerate(manuals):
+        content = doc.get("content") or ""
+        candidates.append(_Candidate("manual", doc, _relevance(doc, rank), content, _bigrams(content)))
+    for rank, issue in enumerate(issues):
+        rendered = render_issue(issue)
+        candidates.append(_Candidate("issue", issue, _relevance(issue, rank), rendered, _bigrams(rendered)))
+
+    remaining = {"manual": manual_tokens, "issue": issue_tokens}
+    selected: List[_Candidate] = []
+    dropped_redundant = dropped_budget = 0
+
+    while candidates:
+        scored = []
+        for candidate in candidates:
+            max_overlap = max((overlap(candidate.shingles, s.shingles) for s in selected), default=0.0)
+            scored.append((mmr_lambda * candidate.relevance - (1 - mmr_lambda) * max_overlap, max_overlap, candidate))
+        _, max_overlap, best = max(scored, key=lambda item: item[0])
+        candidates.remove(best)
+
+        if max_overlap >= redundancy:
+            dropped_redundant += 1
+            continue
+
+        if best.section == "manual":
+            limit = min(item_max_tokens, remaining["manual"] - counter(render_manual(best.source, "")))
+            excerpt = truncate_to_tokens(best.text, limit, counter) if limit >= MIN_EXCERPT_TOKENS else ""
+            if not excerpt:
+                dropped_budget += 1
+                continue
+            best.text = render_manual(best.source, excerpt)
+        cost = counter(best.text)
+        if cost > remaining[best.section]:
+            dropped_budget += 1
+            continue
+        remaining[best.section] -= cost
+        selected.append(best)
+
+    manual_lines = [c.text for c in selected if c.section == "manual"]
+    issue_lines = [c.text for c in selected if c.section == "issue"]
+    parts = []
+    if manual_lines:
+        parts.append("📚 DARI SERVICE MANUAL:")
+        parts.extend(manual_lines)
+    if issue_lines:
+        parts.append("\n⚠️ COMMON ISSUES TERKAIT:")
+        parts.extend(issue_lines)
+    text = "\n".join(parts) if parts else "Tidak ada data spesifik ditemukan."
+
+    return PackedContext(
+        text=text,
+        tokens=counter(text),
+        manuals=[c.source for c in selected if c.section == "manual"],
+        issues=[c.source for c in selected if c.section == "issue"],
+        dropped_redundant=dropped_redundant,
+        dropped_budget=dropped_budget,
+    )
+
+
+_stats = {"prompts": 0, "prompt_tokens_total": 0, "context_tokens_total": 0, "dropped_redundant": 0, "dropped_budget": 0}
+_stats_lock = threading.Lock()
+
+
+def record_prompt(prompt_tokens: int, packed: PackedContext):
+    """Log and aggregate the size of one diagnosis prompt"""
+    with _stats_lock:
+        _stats["prompts"] += 1
+        _stats["prompt_tokens_total"] += prompt_tokens
+        _stats["context_tokens_total"] += packed.tokens
+        _stats["dropped_redundant"] += packed.dropped_redundant
+        _stats["dropped_budget"] += packed.dropped_budget
+    approx = "" if counts_are_exact() else "~"
+    print(f"[PROMPT] {approx}{prompt_tokens} tokens (context {packed.tokens}: {len(packed.manuals)} manuals, "
+          f"{len(packed.issues)} issues; dropped {packed.dropped_redundant} redundant, {packed.dropped_budget} over budget)")
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    prompts = stats["prompts"] or 1
+    stats["prompt_tokens_avg"] = round(stats.pop("prompt_tokens_total") / prompts, 1)
+    stats["context_tokens_avg"] = round(stats.pop("context_tokens_total") / prompts, 1)
+    # Not loaded yet -> None (metrics must not trigger a download)
+    stats["tokenizer"] = tokenizer_name
+    # False: counts are an estimate, not the LLM's prompt tokens
+    stats["exact"] = counts_are_exact()
+    return stats
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Embedding Backends
+Pluggable query/document embedder for all-MiniLM-L6-v2 (384-dim, normalized)
+
+Backends (EMBEDDING_BACKEND):
+    torch      - sentence-transformers on PyTorch (default)
+    onnx       - ONNX Runtime + tokenizers, no PyTorch import
+    onnx-int8  - same, with the int8-quantized MiniLM export
+"""
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Intra-op threads for the model runtime; 0 keeps the library default
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Override the ONNX file inside the model repo (e.g. onnx/model_qint8_arm64.onnx)
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")
+# Query embeddings kept in memory (LRU); 0 disables the cache
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+# Micro-batching: concurrent encode calls arriving within the window share one forward pass
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "true").lower() == "true"
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "3"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+
+EMBEDDING_DIM = 384  # matches vector(384) columns in schema.sql
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2 max_seq_length
+
+ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+
+TextInput = Union[str, List[str]]
+
+
+def _hub_repo_id(model: str) -> str:
+    """sentence-transformers short names live under the sentence-transformers org"""
+    return model if "/" in model else f"sentence-transformers/{model}"
+
+
+class TorchEmbedder:
+    """sentence-transformers backend (original behaviour)"""
+
+    backend = "torch"
+
+    def __init__(self, model: str = EMBEDDING_MODEL, threads: int = EMBEDDING_THREADS):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model, device="cpu")
+
+    def encode(self, texts: TextInput, batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+class OnnxEmbedder:
+    """
+    ONNX Runtime backend
+
+    Reproduces the sentence-transformers pipeline for MiniLM: WordPiece
+    tokenization (truncate to 256), transformer forward pass, attention-masked
+    mean pooling, L2 normalization.
+    """
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        quantized: bool = False,
+        threads: int = EMBEDDING_THREADS,
+        onnx_file: str = EMBEDDING_ONNX_FILE,
+        model_dir: Optional[str] = None,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.backend = "onnx-int8" if quantized else "onnx"
+        onnx_file = onnx_file or ONNX_FILES[self.backend]
+
+        if model_dir:
+            tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+            model_path = os.path.join(model_dir, onnx_file)
+        else:
+            from huggingface_hub import hf_hub_download
+            repo_id = _hub_repo_id(model)
+            tokenizer_path = hf_hub_download(repo_id, "tokenizer.json")
+            model_path = hf_hub_download(repo_id, onnx_file)
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        outputs = [o.name for o in self.session.get_outputs()]
+        self.output_name = next(
+            (name for name in outputs if name in ("last_hidden_state", "token_embeddings")),
+            outputs[0]
+        )
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run([self.output_name], feeds)[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def encode(self, texts: TextInput, batch_size: int = 32) -> np.ndarray:
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+        vectors = np.vstack([
+            self._encode_batch(batch[i:i + batch_size])
+            for i in range(0, len(batch), batch_size)
+        ])
+        return vectors[0] if single else vectors
+
+
+def load_embedder(backend: str = EMBEDDING_BACKEND, model: str = EMBEDDING_MODEL, threads: int = EMBEDDING_THREADS):
+    """Create an embedder for the given backend name"""
+    if backend == "torch":
+        return TorchEmbedder(model, threads=threads)
+    if backend in ONNX_FILES:
+        return OnnxEmbedder(model, quantized=(backend == "onnx-int8"), threads=threads)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected torch, onnx or onnx-int8)")
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Return the process-wide embedder, loading it on first use"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                print(f"[EMBED] Loading {EMBEDDING_MODEL} ({EMBEDDING_BACKEND} backend)")
+                _embedder = load_embedder()
+    return _embedder
+
+
+class EmbeddingBatcher:
+    """
+    In-process micro-batching dispatcher
+
+    Callers block on encode(); a single dispatcher thread takes the first
+    pending text, keeps collecting for up to window_ms (or max_batch texts),
+    runs one batched forward pass and hands each caller its row. Identical
+    texts in a batch are encoded once.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        max_batch: int = EMBEDDING_MAX_BATCH,
+    ):
+        self._encode = encode
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.errors = 0
+        self._queue_wait_ms: deque = deque(maxlen=1000)
+        self._forward_ms: deque = deque(maxlen=1000)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the future resolves to its float32 vector"""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def encode_many(self, texts: List[str]) -> np.ndarray:
+        """Submit all texts at once so they fill whole batches (used for seeding)"""
+        futures = [self.submit(text) for text in texts]
+        if not futures:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        return np.vstack([f.result() for f in futures])
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the window, still take whatever is already queued
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = np.asarray(self._encode(texts), dtype=np.float32)
+                rows = dict(zip(texts, vectors))
+                for text, future, _ in batch:
+                    future.set_result(rows[text])
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finished = time.monotonic()
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+                self._forward_ms.append((finished - started) * 1000)
+                self._queue_wait_ms.extend((started - queued) * 1000 for _, _, queued in batch)
+
+    def get_stats(self) -> dict:
+        def percentile(samples, q):
+            return round(float(np.percentile(samples, q)), 2) if samples else 0.0
+
+        with self._stats_lock:
+            waits = list(self._queue_wait_ms)
+            forwards = list(self._forward_ms)
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "batches": self.batches,
+                "items": self.items,
+                "errors": self.errors,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_seen": self.max_batch_seen,
+                "queue_depth": self._queue.qsize(),
+                "queue_wait_ms": {"p50": percentile(waits, 50), "p95": percentile(waits, 95)},
+                "forward_ms": {"p50": percentile(forwards, 50), "p95": percentile(forwards, 95)},
+            }
+
+
+batcher = EmbeddingBatcher(lambda texts: get_embedder().encode(texts))
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """Encode many texts, through the batcher when EMBEDDING_BATCHING is on"""
+    if EMBEDDING_BATCHING:
+        return batcher.encode_many(texts)
+    return np.asarray(get_embedder().encode(texts), dtype=np.float32)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Cache key for a query
+
+    MiniLM's tokenizer lowercases and splits on whitespace, so texts that
+    differ only in case or spacing produce identical vectors.
+    """
+    return " ".join((text or "").lower().split())
+
+
+class EmbeddingCache:
+    """Bounded LRU of query vectors keyed on normalized text"""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        # Shared between requests, so callers must not modify it in place
+        vector.setflags(write=False)
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._vectors),
+                "max_entries": self.max_entries,
+            }
+
+
+embedding_cache = EmbeddingCache()
+
+
+def embed_query(text: str) -> np.ndarray:
+    """
+    Embedding for a single query, memoized across requests and agents
+
+    Returns a read-only float32 vector of EMBEDDING_DIM.
+    """
+    key = normalize_text(text)
+    vector = embedding_cache.get(key)
+    if vector is None:
+        if EMBEDDING_BATCHING:
+            vector = batcher.encode(key)
+        else:
+            vector = np.asarray(get_embedder().encode(key), dtype=np.float32)
+        embedding_cache.put(key, vector)
+    return vector
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Fast Answers
+Retrieval-only answers for the diagnostic graph: when the top common issue
+matches the complaint closely enough, its stored causes, checks, cost and
+urgency are rendered as the diagnosis directly and the LLM call is skipped.
+Every diagnosis is counted by source ("llm" or "fast_path") for /metrics.
+"""
+import os
+import threading
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FAST_ANSWER_ENABLED = os.getenv("FAST_ANSWER_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity of the top common issue
+FAST_ANSWER_THRESHOLD = float(os.getenv("FAST_ANSWER_THRESHOLD", "0.88"))
+# Required lead over the next issue; two close matches are left to the LLM
+FAST_ANSWER_MARGIN = float(os.getenv("FAST_ANSWER_MARGIN", "0.05"))
+
+SOURCE_LLM = "llm"
+SOURCE_FAST_PATH = "fast_path"
+
+URGENCY_LABELS = {
+    "low": "🟢 Preventif - bisa dijadwalkan saat servis berikutnya",
+    "medium": "🟡 Bisa ditunda - sebaiknya dicek dalam 1-2 minggu",
+    "high": "🟠 Segera - cek dalam beberapa hari",
+    "critical": "🔴 Sangat segera - hentikan pemakaian dan bawa ke bengkel",
+}
+
+_stats = {SOURCE_LLM: 0, SOURCE_FAST_PATH: 0}
+_stats_lock = threading.Lock()
+
+
+def select_fast_answer(
+    issues: List[dict],
+    threshold: float = FAST_ANSWER_THRESHOLD,
+    margin: float = FAST_ANSWER_MARGIN,
+    enabled: bool = FAST_ANSWER_ENABLED,
+) -> Optional[dict]:
+    """The common issue to answer from, or None when the LLM should diagnose"""
+    if not enabled or not issues:
+        return None
+    ranked = sorted(issues, key=lambda issue: issue.get("similarity") or 0.0, reverse=True)
+    top = ranked[0]
+    similarity = top.get("similarity") or 0.0
+    if similarity < threshold or not top.get("probable_cause"):
+        return None
+    if len(ranked) > 1 and similarity - (ranked[1].get("similarity") or 0.0) < margin:
+        return None
+    return top
+
+
+def _numbered(items: List[str]) -> str:
+    return "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+
+
+def render_fast_answer(issue: dict) -> str:
+    """Diagnosis text (without the response header/footer) for one common issue"""
+    parts = [f"*{issue.get('symptom', 'N/A')}*"]
+    if issue.get("symptom_detail"):
+        parts.append(issue["symptom_detail"])
+
+    parts.append(f"*Kemungkinan penyebab:*\n{_numbered(issue.get('probable_cause') or [])}")
+    if issue.get("diagnostic_steps"):
+        parts.append(f"*Langkah pengecekan:*\n{_numbered(issue['diagnostic_steps'])}")
+    if issue.get("part_codes"):
+        parts.append("*Part terkait:* " + ", ".join(issue["part_codes"]))
+
+    cost = issue.get("cost_estimate_idr") or {}
+    if cost:
+        parts.append(f"*Estimasi biaya:* Rp {cost.get('min', 0):,} - Rp {cost.get('max', 0):,}")
+    urgency = issue.get("urgency") or "medium"
+    parts.append(f"*Urgensi:* {URGENCY_LABELS.get(urgency, urgency)}")
+
+    return "\n\n".join(parts)
+
+
+def record_answer(source: str, issue: Optional[dict] = None):
+    with _stats_lock:
+        _stats[source] += 1
+    if issue is not None:
+        print(f"[FAST] Answered from common issue '{issue.get('symptom')}' (similarity={issue.get('similarity'):.3f})")
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats[SOURCE_LLM] + stats[SOURCE_FAST_PATH]
+    stats["fast_path_ratio"] = round(stats[SOURCE_FAST_PATH] / total, 3) if total else 0.0
+    stats["enabled"] = FAST_ANSWER_ENABLED
+    stats["threshold"] = FAST_ANSWER_THRESHOLD
+    return stats
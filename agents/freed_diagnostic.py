@@ -3,15 +3,24 @@
 Honda Freed Diagnostic Agent - LangGraph Implementation
 Handles diagnostic reasoning for Honda Freed GB3/GB4 (2008-2016)
 """
+import asyncio
 import os
-from typing import TypedDict, Annotated, List, Optional
+from typing import TypedDict, Annotated, AsyncIterator, List, Optional
 from operator import add
 from dotenv import load_dotenv
 
 from langgraph.graph import StateGraph, END
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, SystemMessage
-from sentence_transformers import SentenceTransformer
+from langchain_core.runnables import RunnableLambda
+
+from agents.context_packer import count_tokens, pack_context, record_prompt
+from agents.embeddings import embed_query, get_embedder
+from agents.fast_answer import SOURCE_FAST_PATH, SOURCE_LLM, record_answer, render_fast_answer, select_fast_answer
+from agents.keywords import analyze_message
+from agents.response_cache import get_response_cache
+from agents.streaming import stream_graph
+from database.vector_index import get_local_index
 
 load_dotenv()
 
@@ -22,7 +31,12 @@ llm = ChatGroq(
     temperature=0.3
 )
 
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+# One match_diagnostic_context RPC instead of two (set false for databases
+# without that function; the parallel per-table searches are used instead)
+COMBINED_RETRIEVAL = os.getenv("COMBINED_RETRIEVAL", "true").lower() == "true"
+
+# all-MiniLM-L6-v2 on the backend selected by EMBEDDING_BACKEND (torch/onnx/onnx-int8)
+embedder = get_embedder()
 
 
 class DiagnosticState(TypedDict):
@@ -30,12 +44,16 @@ class DiagnosticState(TypedDict):
     user_id: str
     message: str
     symptoms: List[str]
+    query_embedding: Optional[List[float]]
     vehicle_info: dict
-    retrieved_docs: List[dict]
-    common_issues: List[dict]
+    # Written by parallel retrieval branches; merged by concatenation
+    retrieved_docs: Annotated[List[dict], add]
+    common_issues: Annotated[List[dict], add]
     diagnosis: str
     recommendations: List[str]
     cost_estimate: dict
+    # "llm" or "fast_path" (see agents.fast_answer)
+    answer_source: str
     response: str
 
 
@@ -67,42 +85,32 @@ PANDUAN DIAGNOSA:
 Selalu jawab dalam Bahasa Indonesia dengan format yang jelas."""
 
 
-def extract_symptoms(state: DiagnosticState) -> DiagnosticState:
+def extract_symptoms(state: DiagnosticState) -> dict:
     """Extract symptoms from user message"""
-    message = state["message"].lower()
-
-    symptom_keywords = {
-        "getar": ["cvt judder", "mounting rusak", "balance shaft"],
-        "bunyi": ["ball joint", "tie rod", "bearing", "brake pad"],
-        "bocor": ["seal oli", "radiator", "water pump"],
-        "panas": ["thermostat", "radiator", "water pump", "kipas"],
-        "boros": ["filter udara kotor", "busi aus", "injector kotor"],
-        "susah_start": ["aki lemah", "starter", "fuel pump"],
-        "ac": ["freon habis", "kompresor", "kondensor", "evaporator"],
-        "rem": ["brake pad", "rotor", "master cylinder", "brake fluid"],
-        "oli": ["seal bocor", "gasket", "piston ring"],
-        "cvt": ["cvt fluid", "torque converter", "solenoid"],
-        "lampu": ["bohlam", "relay", "fuse", "alternator"],
-        "stir": ["power steering", "rack end", "tie rod"],
-    }
-
-    detected_symptoms = []
-    for keyword, related in symptom_keywords.items():
-        if keyword in message:
-            detected_symptoms.extend(related)
+    detected_symptoms = analyze_message(state["message"])["symptoms"]
 
     if not detected_symptoms:
         detected_symptoms = ["general_checkup"]
 
-    state["symptoms"] = list(set(detected_symptoms))
-    return state
+    return {"symptoms": detected_symptoms}
+
+
+def embed_message(state: DiagnosticState) -> dict:
+    """Embed the message once; both retrieval nodes reuse the vector"""
+    if state.get("query_embedding") is not None:
+        return {}
+    return {"query_embedding": embed_query(state["message"]).tolist()}
 
 
-def retrieve_service_docs(state: DiagnosticState) -> DiagnosticState:
+def retrieve_service_docs(state: DiagnosticState) -> dict:
     """Retrieve relevant service manual sections via vector search"""
-    from database.supabase_client import supabase
+    query_embedding = state["query_embedding"]
 
-    query_embedding = embedder.encode(state["message"]).tolist()
+    local = get_local_index()
+    if local:
+        return {"retrieved_docs": local.manuals.search(query_embedding, match_threshold=0.5, match_count=5)}
+
+    from database.supabase_client import supabase, vector_search_params
 
     try:
         # Vector similarity search on service manuals
@@ -111,23 +119,26 @@ def retrieve_service_docs(state: DiagnosticState) -> DiagnosticState:
             {
                 'query_embedding': query_embedding,
                 'match_threshold': 0.5,
-                'match_count': 5
+                'match_count': 5,
+                **vector_search_params()
             }
         ).execute()
 
-        state["retrieved_docs"] = result.data if result.data else []
+        return {"retrieved_docs": result.data if result.data else []}
     except Exception as e:
         print(f"Vector search error: {e}")
-        state["retrieved_docs"] = []
-
-    return state
+        return {"retrieved_docs": []}
 
 
-def retrieve_common_issues(state: DiagnosticState) -> DiagnosticState:
+def retrieve_common_issues(state: DiagnosticState) -> dict:
     """Retrieve matching common issues from database"""
-    from database.supabase_client import supabase
+    query_embedding = state["query_embedding"]
+
+    local = get_local_index()
+    if local:
+        return {"common_issues": local.issues.search(query_embedding, match_threshold=0.5, match_count=3)}
 
-    query_embedding = embedder.encode(state["message"]).tolist()
+    from database.supabase_client import supabase, vector_search_params
 
     try:
         result = supabase.rpc(
@@ -135,40 +146,43 @@ def retrieve_common_issues(state: DiagnosticState) -> DiagnosticState:
             {
                 'query_embedding': query_embedding,
                 'match_threshold': 0.5,
-                'match_count': 3
+                'match_count': 3,
+                **vector_search_params()
             }
         ).execute()
 
-        state["common_issues"] = result.data if result.data else []
+        return {"common_issues": result.data if result.data else []}
     except Exception as e:
         print(f"Common issues search error: {e}")
-        state["common_issues"] = []
+        return {"common_issues": []}
 
-    return state
 
+def retrieve_context(state: DiagnosticState) -> dict:
+    """Retrieve service manuals and common issues in one round-trip (or none, from the local index)"""
+    from database.supabase_client import match_diagnostic_context
 
-def generate_diagnosis(state: DiagnosticState) -> DiagnosticState:
-    """Generate diagnosis using LLM with retrieved context"""
-
-    context_parts = []
+    local = get_local_index()
+    search = local.search_context if local else match_diagnostic_context
 
-    if state["retrieved_docs"]:
-        context_parts.append("📚 DARI SERVICE MANUAL:")
-        for doc in state["retrieved_docs"][:3]:
-            context_parts.append(f"- {doc.get('section', 'N/A')}: {doc.get('content', '')[:500]}")
+    try:
+        context = search(
+            state["query_embedding"],
+            manual_threshold=0.5,
+            manual_count=5,
+            issue_threshold=0.5,
+            issue_count=3
+        )
+        return {"retrieved_docs": context["manuals"], "common_issues": context["issues"]}
+    except Exception as e:
+        # e.g. schema.sql not yet re-applied; fall back to the per-table RPCs
+        print(f"Combined retrieval error, using separate searches: {e}")
+        return {**retrieve_service_docs(state), **retrieve_common_issues(state)}
 
-    if state["common_issues"]:
-        context_parts.append("\n⚠️ COMMON ISSUES TERKAIT:")
-        for issue in state["common_issues"]:
-            causes = ", ".join(issue.get('probable_cause', []))
-            cost = issue.get('cost_estimate_idr', {})
-            context_parts.append(
-                f"- Gejala: {issue.get('symptom', 'N/A')}\n"
-                f"  Penyebab: {causes}\n"
-                f"  Estimasi: Rp {cost.get('min', 0):,} - Rp {cost.get('max', 0):,}"
-            )
 
-    context = "\n".join(context_parts) if context_parts else "Tidak ada data spesifik ditemukan."
+def build_diagnosis_messages(state: DiagnosticState) -> list:
+    """Build the LLM prompt from retrieved context (packed to a token budget, see agents.context_packer)"""
+    packed = pack_context(state["retrieved_docs"], state["common_issues"])
+    context = packed.text
 
     messages = [
         SystemMessage(content=FREED_SYSTEM_PROMPT),
@@ -190,18 +204,47 @@ Berikan diagnosa lengkap dengan:
 """)
     ]
 
-    response = llm.invoke(messages)
-    state["diagnosis"] = response.content
+    record_prompt(sum(count_tokens(m.content) for m in messages), packed)
+    return messages
 
-    return state
 
+def join_retrieval(state: DiagnosticState) -> dict:
+    """Join point of the parallel retrieval branches (routing needs a single source node)"""
+    return {}
+
+
+def route_answer(state: DiagnosticState) -> str:
+    """Skip the LLM when one common issue clearly matches the complaint"""
+    return "fast_answer" if select_fast_answer(state["common_issues"]) else "generate_diagnosis"
+
+
+def fast_answer(state: DiagnosticState) -> dict:
+    """Render the matched common issue as the diagnosis (no LLM call)"""
+    issue = select_fast_answer(state["common_issues"])
+    record_answer(SOURCE_FAST_PATH, issue)
+    return {"diagnosis": render_fast_answer(issue), "answer_source": SOURCE_FAST_PATH}
+
+
+def generate_diagnosis(state: DiagnosticState) -> dict:
+    """Generate diagnosis using LLM with retrieved context"""
+    response = llm.invoke(build_diagnosis_messages(state))
+    record_answer(SOURCE_LLM)
+    return {"diagnosis": response.content, "answer_source": SOURCE_LLM}
 
-def format_response(state: DiagnosticState) -> DiagnosticState:
-    """Format final response for WhatsApp"""
 
-    response = f"""🔧 *DIAGNOSA HONDA FREED*
+async def agenerate_diagnosis(state: DiagnosticState) -> dict:
+    """Async variant of generate_diagnosis, used when the graph runs via ainvoke"""
+    response = await llm.ainvoke(build_diagnosis_messages(state))
+    record_answer(SOURCE_LLM)
+    return {"diagnosis": response.content, "answer_source": SOURCE_LLM}
 
-{state["diagnosis"]}
+
+# Fixed text around the diagnosis (also sent as stream framing events)
+RESPONSE_HEADER = """🔧 *DIAGNOSA HONDA FREED*
+
+"""
+
+RESPONSE_FOOTER = """
 
 ---
 💡 _Diagnosa ini berdasarkan database 500+ kasus Honda Freed._
@@ -213,26 +256,53 @@ Ketik:
 • *STAGE [1/2/3]* - paket modifikasi lengkap
 """
 
-    state["response"] = response
-    return state
 
+def format_response(state: DiagnosticState) -> dict:
+    """Format final response for WhatsApp"""
+    return {"response": RESPONSE_HEADER + state["diagnosis"] + RESPONSE_FOOTER}
+
+
+def build_diagnostic_graph(combined: bool = COMBINED_RETRIEVAL) -> StateGraph:
+    """
+    Build the diagnostic workflow graph
 
-def build_diagnostic_graph() -> StateGraph:
-    """Build the diagnostic workflow graph"""
+    With combined retrieval one node fetches manuals and issues in a single
+    RPC. Otherwise the two vector searches run as parallel branches after
+    embed_message and join before routing. A close common-issue match goes
+    to fast_answer instead of generate_diagnosis. Nodes return partial
+    updates; list fields merge via their reducers.
+    """
     workflow = StateGraph(DiagnosticState)
 
     # Add nodes
     workflow.add_node("extract_symptoms", extract_symptoms)
-    workflow.add_node("retrieve_docs", retrieve_service_docs)
-    workflow.add_node("retrieve_issues", retrieve_common_issues)
-    workflow.add_node("generate_diagnosis", generate_diagnosis)
+    workflow.add_node("embed_message", embed_message)
+    if combined:
+        workflow.add_node("retrieve_context", retrieve_context)
+    else:
+        workflow.add_node("retrieve_docs", retrieve_service_docs)
+        workflow.add_node("retrieve_issues", retrieve_common_issues)
+        workflow.add_node("join_retrieval", join_retrieval)
+    workflow.add_node(
+        "generate_diagnosis",
+        RunnableLambda(generate_diagnosis, afunc=agenerate_diagnosis, name="generate_diagnosis")
+    )
+    workflow.add_node("fast_answer", fast_answer)
     workflow.add_node("format_response", format_response)
 
     # Define edges
     workflow.set_entry_point("extract_symptoms")
-    workflow.add_edge("extract_symptoms", "retrieve_docs")
-    workflow.add_edge("retrieve_docs", "retrieve_issues")
-    workflow.add_edge("retrieve_issues", "generate_diagnosis")
+    workflow.add_edge("extract_symptoms", "embed_message")
+    if combined:
+        workflow.add_edge("embed_message", "retrieve_context")
+        retrieved = "retrieve_context"
+    else:
+        workflow.add_edge("embed_message", "retrieve_docs")
+        workflow.add_edge("embed_message", "retrieve_issues")
+        workflow.add_edge(["retrieve_docs", "retrieve_issues"], "join_retrieval")
+        retrieved = "join_retrieval"
+    workflow.add_conditional_edges(retrieved, route_answer, ["fast_answer", "generate_diagnosis"])
+    workflow.add_edge("fast_answer", "format_response")
     workflow.add_edge("generate_diagnosis", "format_response")
     workflow.add_edge("format_response", END)
 
@@ -243,38 +313,129 @@ def build_diagnostic_graph() -> StateGraph:
 diagnostic_graph = build_diagnostic_graph()
 
 
-def process_freed_message(user_id: str, message: str) -> str:
-    """
-    Main entry point for diagnostic processing
-
-    Args:
-        user_id: WhatsApp user ID
-        message: User's message/complaint
-
-    Returns:
-        Formatted diagnostic response
-    """
-    initial_state: DiagnosticState = {
+def _initial_state(user_id: str, message: str, query_embedding: Optional[list] = None) -> DiagnosticState:
+    """Build the initial graph state for a message"""
+    return {
         "user_id": user_id,
         "message": message,
         "symptoms": [],
+        "query_embedding": query_embedding,
         "vehicle_info": {"model": "Honda Freed GB3/GB4", "year_range": "2008-2016"},
         "retrieved_docs": [],
         "common_issues": [],
         "diagnosis": "",
         "recommendations": [],
         "cost_estimate": {},
+        "answer_source": "",
         "response": ""
     }
 
-    try:
-        result = diagnostic_graph.invoke(initial_state)
-        return result["response"]
-    except Exception as e:
-        return f"""⚠️ *SYSTEM ERROR*
+
+def _error_response(e: Exception) -> str:
+    """Format a pipeline failure for WhatsApp"""
+    return f"""⚠️ *SYSTEM ERROR*
 
 Maaf, terjadi kesalahan dalam memproses permintaan Anda.
 Error: {str(e)}
 
 Silakan coba lagi atau hubungi admin.
 """
+
+
+def _lookup_embedding(lookup) -> Optional[list]:
+    """Vector computed by a missed semantic cache lookup, if any"""
+    if lookup is None or lookup.embedding is None:
+        return None
+    return lookup.embedding.tolist()
+
+
+def _log_cache_hit(lookup) -> None:
+    print(f"[CACHE] {lookup.tier} hit (similarity={lookup.similarity}) for '{lookup.key[:50]}'")
+
+
+def process_freed_message(user_id: str, message: str) -> str:
+    """
+    Main entry point for diagnostic processing
+
+    Repeated and near-duplicate complaints are answered from the response
+    cache (see agents.response_cache) without running the graph.
+
+    Args:
+        user_id: WhatsApp user ID
+        message: User's message/complaint
+
+    Returns:
+        Formatted diagnostic response
+    """
+    try:
+        cache = get_response_cache()
+        lookup = cache.lookup(message) if cache else None
+        if lookup and lookup.hit:
+            _log_cache_hit(lookup)
+            return lookup.response
+
+        result = diagnostic_graph.invoke(_initial_state(user_id, message, _lookup_embedding(lookup)))
+        if lookup:
+            cache.store(lookup, result["response"])
+        return result["response"]
+    except Exception as e:
+        return _error_response(e)
+
+
+async def aprocess_freed_message(user_id: str, message: str) -> str:
+    """
+    Async entry point for diagnostic processing
+
+    Sync nodes (Supabase, embeddings) and the cache lookup and store run on
+    the loop's default executor; the LLM node awaits the Groq API directly.
+    """
+    try:
+        cache = get_response_cache()
+        lookup = None
+        if cache:
+            loop = asyncio.get_running_loop()
+            lookup = await loop.run_in_executor(None, cache.lookup, message)
+            if lookup.hit:
+                _log_cache_hit(lookup)
+                return lookup.response
+
+        result = await diagnostic_graph.ainvoke(_initial_state(user_id, message, _lookup_embedding(lookup)))
+        if lookup:
+            await loop.run_in_executor(None, cache.store, lookup, result["response"])
+        return result["response"]
+    except Exception as e:
+        return _error_response(e)
+
+
+async def astream_freed_message(user_id: str, message: str) -> AsyncIterator[dict]:
+    """
+    Streaming entry point for diagnostic processing (see agents.streaming)
+
+    A cache hit yields only the done event. The final response is cached
+    before done is sent, so a client that disconnects afterwards still
+    warms the cache.
+    """
+    try:
+        cache = get_response_cache()
+        lookup = None
+        if cache:
+            loop = asyncio.get_running_loop()
+            lookup = await loop.run_in_executor(None, cache.lookup, message)
+            if lookup.hit:
+                _log_cache_hit(lookup)
+                yield {"event": "done", "response": lookup.response, "cached": True}
+                return
+
+        events = stream_graph(
+            diagnostic_graph,
+            _initial_state(user_id, message, _lookup_embedding(lookup)),
+            llm_node="generate_diagnosis",
+            header=lambda state: RESPONSE_HEADER,
+            footer=lambda state: RESPONSE_FOOTER,
+        )
+        async for event in events:
+            if event["event"] == "done" and lookup:
+                await loop.run_in_executor(None, cache.store, lookup, event["response"])
+            yield event
+    except Exception as e:
+        yield {"event": "error", "response": _error_response(e)}
@@ -4,12 +4,20 @@ Honda Freed Modification Agent - LangGraph Implementation
 Handles modification planning for Honda Freed GB3/GB4 (2008-2016)
 """
 import os
-from typing import TypedDict, List, Optional
+import time
+from typing import TypedDict, AsyncIterator, List, Optional
 from dotenv import load_dotenv
 
 from langgraph.graph import StateGraph, END
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
+
+from agents.keywords import analyze_message
+from agents.parts_optimizer import plan_build
+from agents.stage_plans import StagePlan, canonical_request, get_stage_plans, plan_key
+from agents.streaming import stream_graph
+from database.catalog import catalog
 
 load_dotenv()
 
@@ -28,9 +36,14 @@ class ModificationState(TypedDict):
     budget: Optional[int]
     focus_area: str  # engine, suspension, exterior, interior, audio
     available_parts: List[dict]
+    # Best build within the budget (agents.parts_optimizer), when a budget was given
+    optimized_build: Optional[dict]
     stage_preset: Optional[dict]
     modification_plan: str
     total_cost: dict
+    # (stage, focus_area, budget bucket) for plain stage requests (see agents.stage_plans)
+    plan_key: Optional[tuple]
+    cached_plan: Optional[StagePlan]
     response: str
 
 
@@ -87,53 +100,55 @@ Selalu berikan rekomendasi dalam Bahasa Indonesia dengan format yang jelas."""
 
 def parse_request(state: ModificationState) -> ModificationState:
     """Parse modification request from user message"""
-    message = state["message"].lower()
+    features = analyze_message(state["message"])
 
     # Detect stage request
-    if "stage 1" in message or "stage1" in message:
-        state["requested_stage"] = 1
-    elif "stage 2" in message or "stage2" in message:
-        state["requested_stage"] = 2
-    elif "stage 3" in message or "stage3" in message:
-        state["requested_stage"] = 3
+    if features["stage"]:
+        state["requested_stage"] = features["stage"]
 
     # Detect focus area
-    focus_keywords = {
-        "engine": ["mesin", "engine", "power", "hp", "turbo", "supercharger", "intake", "exhaust"],
-        "suspension": ["kaki", "suspension", "coilover", "per", "shockbreaker", "handling"],
-        "exterior": ["body", "bodykit", "aero", "spoiler", "widebody", "exterior"],
-        "interior": ["interior", "jok", "seat", "dashboard", "racing seat"],
-        "audio": ["audio", "speaker", "subwoofer", "amplifier", "head unit"],
-        "brakes": ["rem", "brake", "brembo", "caliper", "rotor"],
-    }
-
-    state["focus_area"] = "engine"  # default
-    for area, keywords in focus_keywords.items():
-        if any(kw in message for kw in keywords):
-            state["focus_area"] = area
-            break
+    state["focus_area"] = features["focus_area"] or "engine"  # default
 
     # Detect budget
-    import re
-    budget_match = re.search(r'(\d+)\s*(jt|juta|jt|million)', message)
-    if budget_match:
-        state["budget"] = int(budget_match.group(1)) * 1_000_000
+    if features["budget"]:
+        state["budget"] = features["budget"]
+
+    stage_plans = get_stage_plans()
+    key = plan_key(state["message"], features) if stage_plans else None
+    if key:
+        state["cached_plan"] = stage_plans.get(key)
+        if state["cached_plan"] or key[2] == state["budget"]:
+            state["plan_key"] = key
+        else:
+            # Bucket plans are generated for the bucket floor: plan this request live with the
+            # user's own budget and let the worker build the bucket plan for next time
+            stage_plans.request(key)
 
     return state
 
 
-def retrieve_stage_preset(state: ModificationState) -> ModificationState:
-    """Retrieve stage preset from database"""
-    from database.supabase_client import supabase
+def route_plan(state: ModificationState) -> str:
+    """Serve a cached stage plan, or retrieve and generate"""
+    return "cached_plan" if state["cached_plan"] else "retrieve_stage"
+
+
+def use_cached_plan(state: ModificationState) -> ModificationState:
+    """Fill the plan, preset and cost from the stage plan cache (no LLM call)"""
+    plan = state["cached_plan"]
+    state["stage_preset"] = plan.stage_preset
+    state["modification_plan"] = plan.modification_plan
+    state["total_cost"] = plan.total_cost
+    print(f"[PLAN] Cached stage plan {state['plan_key']} (catalog version {plan.catalog_version})")
+    return state
 
+
+def retrieve_stage_preset(state: ModificationState) -> ModificationState:
+    """Retrieve stage preset from the catalog store"""
     if state["requested_stage"]:
         try:
-            result = supabase.table("stage_presets").select("*").eq(
-                "stage", state["requested_stage"]
-            ).execute()
-
-            if result.data:
-                state["stage_preset"] = result.data[0]
+            preset = catalog.get().stage(state["requested_stage"])
+            if preset:
+                state["stage_preset"] = preset
         except Exception as e:
             print(f"Stage preset error: {e}")
 
@@ -141,22 +156,15 @@ def retrieve_stage_preset(state: ModificationState) -> ModificationState:
 
 
 def retrieve_parts(state: ModificationState) -> ModificationState:
-    """Retrieve matching parts from catalog"""
-    from database.supabase_client import supabase
-
+    """Retrieve matching parts from the catalog store"""
     try:
-        query = supabase.table("modification_catalog").select("*")
-
-        # Filter by focus area category if available
-        if state["focus_area"]:
-            query = query.ilike("category", f"%{state['focus_area']}%")
-
-        # Filter by stage if requested
-        if state["requested_stage"]:
-            query = query.lte("min_stage", state["requested_stage"])
-
-        result = query.limit(20).execute()
-        state["available_parts"] = result.data if result.data else []
+        state["available_parts"] = catalog.get().parts_for(
+            # Filter by focus area category if available
+            category_contains=state["focus_area"] or None,
+            # Filter by stage if requested
+            max_stage=state["requested_stage"] or None,
+            limit=20
+        )
 
     except Exception as e:
         print(f"Parts retrieval error: {e}")
@@ -165,11 +173,46 @@ def retrieve_parts(state: ModificationState) -> ModificationState:
     return state
 
 
-def generate_modification_plan(state: ModificationState) -> ModificationState:
-    """Generate modification plan using LLM"""
+def optimize_parts(state: ModificationState) -> ModificationState:
+    """Pick the best build within the user's budget (deterministic, no LLM)"""
+    if state["budget"]:
+        try:
+            build = plan_build(catalog.get(), state["budget"], category=state["focus_area"],
+                               max_stage=state["requested_stage"] or None)
+            if build.parts:
+                state["optimized_build"] = build.to_dict()
+        except Exception as e:
+            print(f"Parts optimizer error: {e}")
+
+    return state
+
+
+def _build_info(build: dict) -> str:
+    """The optimizer's build as a fixed part list for the prompt"""
+    lines = ["🧮 BUILD OPTIMAL DALAM BUDGET (sudah dihitung, WAJIB dipakai apa adanya):"]
+    for part in build["parts"]:
+        hp = part["hp_gain"]
+        gain = f" | +{hp[0]}-{hp[1]} HP" if hp else ""
+        lines.append(
+            f"- {part['part_name']} ({part.get('brand') or 'N/A'}): Rp {part['price_idr']:,} "
+            f"+ pasang Rp {part['install_idr']:,}{gain} | Status: {part.get('legal_status') or 'N/A'}"
+        )
+    hp_low, hp_high = build["estimated_hp"]
+    lines.append(
+        f"TOTAL: Rp {build['total_cost_idr']:,} dari budget Rp {build['budget_idr']:,} "
+        f"| Estimasi power: {hp_low}-{hp_high} HP"
+    )
+    lines.append("Jangan menambah, mengganti atau menghapus part dari daftar ini; jelaskan urutan pemasangan dan alasannya.")
+    return "\n".join(lines) + "\n"
+
+
+def build_plan_messages(state: ModificationState) -> list:
+    """Build the LLM prompt for a modification plan"""
 
     parts_info = ""
-    if state["available_parts"]:
+    if state["optimized_build"]:
+        parts_info = _build_info(state["optimized_build"])
+    elif state["available_parts"]:
         parts_info = "📦 PARTS TERSEDIA DI KATALOG:\n"
         for part in state["available_parts"][:15]:
             price = part.get('price_range_idr', {})
@@ -196,11 +239,14 @@ Budget Range: Rp {cost.get('min', 0):,} - Rp {cost.get('max', 0):,}
     if state["budget"]:
         budget_info = f"\n💰 BUDGET USER: Rp {state['budget']:,}"
 
+    # Cacheable requests use the canonical wording so the plan fits every user with the same key
+    request = canonical_request(state["plan_key"]) if state["plan_key"] else state["message"]
+
     messages = [
         SystemMessage(content=MODIFICATION_SYSTEM_PROMPT),
         HumanMessage(content=f"""
 REQUEST USER:
-{state["message"]}
+{request}
 
 {stage_info}
 {budget_info}
@@ -219,26 +265,45 @@ Buatkan modification plan yang detail dengan:
 """)
     ]
 
-    response = llm.invoke(messages)
+    return messages
+
+
+def generate_modification_plan(state: ModificationState) -> ModificationState:
+    """Generate modification plan using LLM"""
+    response = llm.invoke(build_plan_messages(state))
+    state["modification_plan"] = response.content
+
+    return state
+
+
+async def agenerate_modification_plan(state: ModificationState) -> ModificationState:
+    """Async variant of generate_modification_plan, used when the graph runs via ainvoke"""
+    response = await llm.ainvoke(build_plan_messages(state))
     state["modification_plan"] = response.content
 
     return state
 
 
 def calculate_total_cost(state: ModificationState) -> ModificationState:
-    """Calculate total modification cost"""
+    """Calculate total modification cost (of the optimized build when there is one)"""
 
     total_min = 0
     total_max = 0
 
-    for part in state["available_parts"]:
-        price = part.get('price_range_idr', {})
+    build = state["optimized_build"]
+    parts = build["parts"] if build else state["available_parts"]
+    for part in parts:
+        price = part.get('price_range_idr') or {}
         total_min += price.get('min', 0)
         total_max += price.get('max', 0)
 
-    # Add installation estimate (20-30% of parts cost)
-    install_min = int(total_min * 0.2)
-    install_max = int(total_max * 0.3)
+    if build:
+        # Labor from each part's installation time
+        install_min = install_max = build["install_cost_idr"]
+    else:
+        # Add installation estimate (20-30% of parts cost)
+        install_min = int(total_min * 0.2)
+        install_max = int(total_max * 0.3)
 
     state["total_cost"] = {
         "parts_min": total_min,
@@ -252,14 +317,49 @@ def calculate_total_cost(state: ModificationState) -> ModificationState:
     return state
 
 
-def format_response(state: ModificationState) -> ModificationState:
-    """Format final response for WhatsApp"""
+def _stage_plan(state: ModificationState, catalog_version: int) -> StagePlan:
+    return StagePlan(
+        modification_plan=state["modification_plan"],
+        total_cost=state["total_cost"],
+        stage_preset=state["stage_preset"],
+        catalog_version=catalog_version,
+        generated_at=time.time(),
+    )
+
+
+def store_plan(state: ModificationState) -> ModificationState:
+    """Cache a freshly generated plan for a plain stage request (plan_key is only set when the budget matches the key)"""
+    stage_plans = get_stage_plans()
+    if stage_plans and state["plan_key"]:
+        stage_plans.store(state["plan_key"], _stage_plan(state, catalog.get().version))
+    return state
+
+
+def generate_stage_plan(key: tuple) -> StagePlan:
+    """Generate one cached plan outside a request (stage plan cache worker)"""
+    stage, focus_area, budget = key
+    version = catalog.get().version
+    state = _initial_state("stage-plans", canonical_request(key))
+    state.update(requested_stage=stage, focus_area=focus_area, budget=budget, plan_key=key)
+    for node in (retrieve_stage_preset, retrieve_parts, optimize_parts, generate_modification_plan, calculate_total_cost):
+        state = node(state)
+    return _stage_plan(state, version)
 
+
+def response_header(state: ModificationState) -> str:
+    """Text before the generated plan (needs only the parsed request)"""
     stage_header = ""
     if state["requested_stage"]:
         stage_names = {1: "Street Sleeper", 2: "Weekend Warrior", 3: "Track Monster"}
         stage_header = f"*STAGE {state['requested_stage']} - {stage_names.get(state['requested_stage'], '')}*\n\n"
 
+    return f"""🏎️ *MODIFICATION PLAN HONDA FREED*
+{stage_header}
+"""
+
+
+def response_footer(state: ModificationState) -> str:
+    """Text after the generated plan (cost summary and menu)"""
     cost = state.get("total_cost", {})
     cost_summary = ""
     if cost:
@@ -271,9 +371,7 @@ Install: Rp {cost.get('install_min', 0):,} - Rp {cost.get('install_max', 0):,}
 *TOTAL: Rp {cost.get('total_min', 0):,} - Rp {cost.get('total_max', 0):,}*
 """
 
-    response = f"""🏎️ *MODIFICATION PLAN HONDA FREED*
-{stage_header}
-{state["modification_plan"]}
+    return f"""
 {cost_summary}
 ---
 ⚠️ _Modifikasi dapat membatalkan garansi pabrikan._
@@ -285,29 +383,46 @@ Ketik:
 • *DIAGNOSA [keluhan]* - diagnosa masalah
 """
 
-    state["response"] = response
+
+def format_response(state: ModificationState) -> ModificationState:
+    """Format final response for WhatsApp"""
+    state["response"] = response_header(state) + state["modification_plan"] + response_footer(state)
     return state
 
 
 def build_modification_graph() -> StateGraph:
-    """Build the modification workflow graph"""
+    """
+    Build the modification workflow graph
+
+    Plain stage requests with a cached plan skip retrieval and the LLM;
+    the ones without get generated as usual and stored.
+    """
     workflow = StateGraph(ModificationState)
 
     # Add nodes
     workflow.add_node("parse_request", parse_request)
+    workflow.add_node("cached_plan", use_cached_plan)
     workflow.add_node("retrieve_stage", retrieve_stage_preset)
     workflow.add_node("retrieve_parts", retrieve_parts)
-    workflow.add_node("generate_plan", generate_modification_plan)
+    workflow.add_node("optimize_parts", optimize_parts)
+    workflow.add_node(
+        "generate_plan",
+        RunnableLambda(generate_modification_plan, afunc=agenerate_modification_plan, name="generate_plan")
+    )
     workflow.add_node("calculate_cost", calculate_total_cost)
+    workflow.add_node("store_plan", store_plan)
     workflow.add_node("format_response", format_response)
 
     # Define edges
     workflow.set_entry_point("parse_request")
-    workflow.add_edge("parse_request", "retrieve_stage")
+    workflow.add_conditional_edges("parse_request", route_plan, ["cached_plan", "retrieve_stage"])
+    workflow.add_edge("cached_plan", "format_response")
     workflow.add_edge("retrieve_stage", "retrieve_parts")
-    workflow.add_edge("retrieve_parts", "generate_plan")
+    workflow.add_edge("retrieve_parts", "optimize_parts")
+    workflow.add_edge("optimize_parts", "generate_plan")
     workflow.add_edge("generate_plan", "calculate_cost")
-    workflow.add_edge("calculate_cost", "format_response")
+    workflow.add_edge("calculate_cost", "store_plan")
+    workflow.add_edge("store_plan", "format_response")
     workflow.add_edge("format_response", END)
 
     return workflow.compile()
@@ -316,37 +431,33 @@ def build_modification_graph() -> StateGraph:
 # Compiled graph instance
 modification_graph = build_modification_graph()
 
+# Stage plans are (re)generated in the background after each catalog change
+if get_stage_plans():
+    get_stage_plans().attach(catalog, generate_stage_plan)
 
-def process_modification_request(user_id: str, message: str, vehicle_context: dict = None) -> str:
-    """
-    Main entry point for modification planning
-
-    Args:
-        user_id: WhatsApp user ID
-        message: User's modification request
-        vehicle_context: Optional vehicle context dict
 
-    Returns:
-        Formatted modification plan response
-    """
-    initial_state: ModificationState = {
+def _initial_state(user_id: str, message: str) -> ModificationState:
+    """Build the initial graph state for a request"""
+    return {
         "user_id": user_id,
         "message": message,
         "requested_stage": None,
         "budget": None,
         "focus_area": "engine",
         "available_parts": [],
+        "optimized_build": None,
         "stage_preset": None,
         "modification_plan": "",
         "total_cost": {},
+        "plan_key": None,
+        "cached_plan": None,
         "response": ""
     }
 
-    try:
-        result = modification_graph.invoke(initial_state)
-        return result["response"]
-    except Exception as e:
-        return f"""⚠️ *SYSTEM ERROR*
+
+def _error_response(e: Exception) -> str:
+    """Format a pipeline failure for WhatsApp"""
+    return f"""⚠️ *SYSTEM ERROR*
 
 Maaf, terjadi kesalahan dalam memproses permintaan modifikasi.
 Error: {str(e)}
@@ -355,15 +466,61 @@ Silakan coba lagi atau hubungi admin.
 """
 
 
+def process_modification_request(user_id: str, message: str, vehicle_context: dict = None) -> str:
+    """
+    Main entry point for modification planning
+
+    Args:
+        user_id: WhatsApp user ID
+        message: User's modification request
+        vehicle_context: Optional vehicle context dict
+
+    Returns:
+        Formatted modification plan response
+    """
+    try:
+        result = modification_graph.invoke(_initial_state(user_id, message))
+        return result["response"]
+    except Exception as e:
+        return _error_response(e)
+
+
+async def aprocess_modification_request(user_id: str, message: str, vehicle_context: dict = None) -> str:
+    """
+    Async entry point for modification planning
+
+    Sync nodes (Supabase lookups) run on the loop's default executor;
+    the LLM node awaits the Groq API directly.
+    """
+    try:
+        result = await modification_graph.ainvoke(_initial_state(user_id, message))
+        return result["response"]
+    except Exception as e:
+        return _error_response(e)
+
+
+async def astream_modification_request(user_id: str, message: str) -> AsyncIterator[dict]:
+    """Streaming entry point for modification planning (see agents.streaming)"""
+    try:
+        events = stream_graph(
+            modification_graph,
+            _initial_state(user_id, message),
+            llm_node="generate_plan",
+            header=response_header,
+            footer=response_footer,
+        )
+        async for event in events:
+            yield event
+    except Exception as e:
+        yield {"event": "error", "response": _error_response(e)}
+
+
 def get_stage_summary(stage: int) -> str:
     """Get quick summary of a modification stage"""
-    from database.supabase_client import supabase
-
     try:
-        result = supabase.table("stage_presets").select("*").eq("stage", stage).execute()
+        preset = catalog.get().stage(stage)
 
-        if result.data:
-            preset = result.data[0]
+        if preset:
             cost = preset.get('estimated_cost_idr', {})
             return f"""🎯 *STAGE {stage} - {preset.get('stage_name')}*
 
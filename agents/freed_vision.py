@@ -3,15 +3,43 @@
 Honda Freed Vision Agent - Image-based Diagnostics
 Uses Groq's vision model to analyze car images for diagnostics
 """
+import asyncio
 import os
-import base64
+from typing import BinaryIO, Callable
 from dotenv import load_dotenv
-from groq import Groq
+from groq import AsyncGroq, BadRequestError, Groq, RateLimitError
+
+from agents.image_cache import get_image_cache
+from agents.image_preprocess import IMAGE_MAX_INPUT_BYTES, ImageRejected, prepare_base64_image, prepare_image
+from services.rate_limit import RateLimiter
 
 load_dotenv()
 
-# Initialize Groq client
+VISION_MODEL = "llama-3.2-90b-vision-preview"  # Groq's vision model
+VISION_MAX_TOKENS = 1500
+
+# Groq quota for the vision model; retries are ours, so the SDK's are disabled
+GROQ_VISION_RPM = float(os.getenv("GROQ_VISION_RPM", "30"))
+GROQ_VISION_TPM = float(os.getenv("GROQ_VISION_TPM", "0"))  # 0 disables the token budget
+# Charged against GROQ_VISION_TPM per call: prompt + image (<= IMAGE_MAX_EDGE) + max output
+VISION_TOKENS_PER_CALL = int(os.getenv("VISION_TOKENS_PER_CALL", "3000"))
+VISION_MAX_CONCURRENCY = int(os.getenv("VISION_MAX_CONCURRENCY", "4"))
+VISION_RETRIES = int(os.getenv("VISION_RETRIES", "3"))
+
+# Shown in error replies; the limit enforced by agents.image_preprocess
+MAX_UPLOAD_MB = IMAGE_MAX_INPUT_BYTES // (1024 * 1024)
+
+# Initialize Groq clients (sync for process_image_diagnosis, async for the API)
 client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+async_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+
+vision_limiter = RateLimiter(
+    "groq_vision",
+    concurrency=VISION_MAX_CONCURRENCY,
+    requests_per_minute=GROQ_VISION_RPM,
+    tokens_per_minute=GROQ_VISION_TPM,
+    retries=VISION_RETRIES,
+)
 
 VISION_SYSTEM_PROMPT = """Kamu adalah mekanik ahli Honda Freed GB3/GB4 (2008-2016) dengan kemampuan visual diagnosis.
 
@@ -45,58 +73,34 @@ Jika gambar tidak jelas atau bukan bagian mobil, minta user untuk mengirim ulang
 Selalu jawab dalam Bahasa Indonesia dengan format yang jelas dan mudah dipahami."""
 
 
-def process_image_diagnosis(user_id: str, message: str, image_base64: str) -> str:
-    """
-    Process image for car diagnostics using vision model
-
-    Args:
-        user_id: User identifier
-        message: Optional text message/context from user
-        image_base64: Base64 encoded image data
-
-    Returns:
-        Formatted diagnostic response
-    """
-    try:
-        # Prepare the image for the API
-        # Groq expects base64 image in data URL format
-        image_url = f"data:image/jpeg;base64,{image_base64}"
-
-        # Create the message with image
-        messages = [
-            {
-                "role": "system",
-                "content": VISION_SYSTEM_PROMPT
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": image_url
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": f"Tolong analisa gambar ini. Konteks dari user: {message}"
+def build_vision_messages(message: str, image_url: str) -> list:
+    """System prompt plus the user's image and context"""
+    return [
+        {
+            "role": "system",
+            "content": VISION_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url
                     }
-                ]
-            }
-        ]
+                },
+                {
+                    "type": "text",
+                    "text": f"Tolong analisa gambar ini. Konteks dari user: {message}"
+                }
+            ]
+        }
+    ]
 
-        # Call Groq vision model
-        response = client.chat.completions.create(
-            model="llama-3.2-90b-vision-preview",  # Groq's vision model
-            messages=messages,
-            temperature=0.3,
-            max_tokens=1500
-        )
 
-        diagnosis = response.choices[0].message.content
-
-        # Format the response
-        formatted_response = f"""📷 *DIAGNOSA VISUAL HONDA FREED*
+def format_vision_response(diagnosis: str) -> str:
+    """Format final response for WhatsApp"""
+    return f"""📷 *DIAGNOSA VISUAL HONDA FREED*
 
 {diagnosis}
 
@@ -106,34 +110,136 @@ _Untuk kepastian, kunjungi bengkel untuk pemeriksaan langsung._
 
 Ketik keluhan tambahan atau kirim foto lain untuk analisa lebih lanjut!
 """
-        return formatted_response
 
-    except Exception as e:
-        error_msg = str(e)
-        print(f"[VISION] Error processing image: {error_msg}")
 
-        # Check for specific error types
-        if "rate_limit" in error_msg.lower():
-            return """⚠️ *SISTEM SIBUK*
+def _error_response(e: Exception) -> str:
+    """User-facing message for a failed image diagnosis"""
+    if isinstance(e, ImageRejected):
+        print(f"[VISION] Image rejected: {e}")
+        return f"""⚠️ *GAMBAR TIDAK VALID*
+
+Maaf, gambar tidak dapat diproses: {e}.
+Pastikan:
+• Format: JPG, PNG, atau WEBP
+• Ukuran: Maksimal {MAX_UPLOAD_MB}MB
+• Gambar jelas dan tidak blur
+
+Silakan kirim ulang gambar yang lebih jelas."""
+
+    print(f"[VISION] Error processing image: {e}")
+
+    if isinstance(e, RateLimitError):
+        return """⚠️ *SISTEM SIBUK*
 
 Maaf, terlalu banyak permintaan saat ini.
 Silakan coba lagi dalam beberapa detik.
 
 Atau ketik keluhan Anda secara teks untuk diagnosa alternatif."""
 
-        if "invalid" in error_msg.lower() or "image" in error_msg.lower():
-            return """⚠️ *GAMBAR TIDAK VALID*
+    if isinstance(e, BadRequestError):
+        return f"""⚠️ *GAMBAR TIDAK VALID*
 
 Maaf, gambar tidak dapat diproses. Pastikan:
 • Format: JPG, PNG, atau WEBP
-• Ukuran: Maksimal 5MB
+• Ukuran: Maksimal {MAX_UPLOAD_MB}MB
 • Gambar jelas dan tidak blur
 
 Silakan kirim ulang gambar yang lebih jelas."""
 
-        return f"""⚠️ *TERJADI KESALAHAN*
+    return f"""⚠️ *TERJADI KESALAHAN*
 
 Maaf, gagal memproses gambar.
 Silakan coba lagi atau ketik keluhan Anda secara teks.
 
 Ketik *HELP* untuk panduan penggunaan."""
+
+
+def process_image_diagnosis(user_id: str, message: str, image_base64: str) -> str:
+    """
+    Process image for car diagnostics using vision model
+
+    Blocking variant (sync Groq client, SDK retries); the API uses
+    aprocess_image_diagnosis.
+
+    Args:
+        user_id: User identifier
+        message: Optional text message/context from user
+        image_base64: Base64 encoded image data
+
+    Returns:
+        Formatted diagnostic response
+    """
+    try:
+        # Decode, strip EXIF and downsize once; Groq expects a data URL
+        prepared = prepare_base64_image(image_base64)
+        cache = get_image_cache()
+        cached = cache.lookup(prepared.dhash, message) if cache else None
+        if cached:
+            return cached
+
+        response = client.chat.completions.create(
+            model=VISION_MODEL,
+            messages=build_vision_messages(message, prepared.data_url),
+            temperature=0.3,
+            max_tokens=VISION_MAX_TOKENS
+        )
+        formatted = format_vision_response(response.choices[0].message.content)
+        if cache:
+            cache.store(prepared.dhash, message, formatted)
+        return formatted
+    except Exception as e:
+        return _error_response(e)
+
+
+async def aprocess_image_diagnosis(user_id: str, message: str, image_base64: str) -> str:
+    """
+    Async entry point for image diagnostics
+
+    Preprocessing runs on the loop's default executor; the Groq call goes
+    through vision_limiter (concurrency cap, RPM/TPM buckets, retries on
+    429/5xx honoring Retry-After).
+    """
+    return await _adiagnose(message, prepare_base64_image, image_base64)
+
+
+async def aprocess_image_upload(user_id: str, message: str, image_file: BinaryIO) -> str:
+    """
+    Async entry point for a binary (multipart) upload
+
+    image_file is read in place (e.g. the request's spooled temp file), so
+    no base64 copy of the original upload is ever built.
+    """
+    return await _adiagnose(message, prepare_image, image_file)
+
+
+async def _adiagnose(message: str, prepare: Callable, source) -> str:
+    """
+    Preprocess the image, then make one rate-limited Groq vision call
+
+    Copies of an already-diagnosed photo (same prompt, perceptual hash
+    within a few bits) are answered from the image cache.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(None, prepare, source)
+        cache = get_image_cache()
+        cached = cache.lookup(prepared.dhash, message) if cache else None
+        if cached:
+            return cached
+        messages = build_vision_messages(message, prepared.data_url)
+
+        response = await vision_limiter.call(
+            lambda: async_client.chat.completions.create(
+                model=VISION_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=VISION_MAX_TOKENS
+            ),
+            tokens=VISION_TOKENS_PER_CALL
+        )
+        formatted = format_vision_response(response.choices[0].message.content)
+        if cache:
+            cache.store(prepared.dhash, message, formatted)
+        return formatted
+    except Exception as e:
+        return _error_response(e)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Vision Response Cache
+Caches vision diagnoses by perceptual hash (dHash of the decoded image) plus
+the normalized text prompt. Lookups accept hashes within
+IMAGE_CACHE_MAX_DISTANCE bits, so re-compressed or resized copies of a
+forwarded photo hit the cache. Entries are LRU/TTL bounded.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from agents.response_cache import normalize_message
+
+load_dotenv()
+
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "256"))
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", str(6 * 3600)))
+# Max differing bits (of 64) for a match; JPEG re-compression typically moves 0-3
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "4"))
+
+HASH_BITS = 64
+# Near-uniform images (dark dashboard shots, blank frames) hash to almost all
+# 0s or 1s and would match each other; they are never cached
+MIN_HASH_ENTROPY_BITS = 8
+
+
+def _bands(max_distance: int) -> List[Tuple[int, int]]:
+    """
+    Split the hash into max_distance + 1 bit ranges (shift, mask)
+
+    By pigeonhole, two hashes within max_distance bits agree exactly on at
+    least one band, so the band index finds every candidate.
+    """
+    count = min(HASH_BITS, max_distance + 1)
+    edges = [round(i * HASH_BITS / count) for i in range(count + 1)]
+    return [(edges[i], (1 << (edges[i + 1] - edges[i])) - 1) for i in range(count)]
+
+
+@dataclass
+class ImageCacheEntry:
+    image_hash: int
+    prompt: str
+    response: str
+    created_at: float
+    hits: int = 0
+
+
+class ImageDiagnosisCache:
+    """LRU/TTL cache of vision responses with banded Hamming-distance lookup"""
+
+    def __init__(
+        self,
+        max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+        ttl: float = IMAGE_CACHE_TTL,
+        max_distance: int = IMAGE_CACHE_MAX_DISTANCE,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._bands = _bands(max_distance)
+        self._entries: "OrderedDict[Tuple[int, str], ImageCacheEntry]" = OrderedDict()
+        # (band number, band value, prompt) -> entry keys
+        self._index: Dict[Tuple[int, int, str], Set[Tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    @staticmethod
+    def cacheable(image_hash: Optional[int]) -> bool:
+        if image_hash is None:
+            return False
+        ones = bin(image_hash).count("1")
+        return MIN_HASH_ENTROPY_BITS <= ones <= HASH_BITS - MIN_HASH_ENTROPY_BITS
+
+    def _band_keys(self, image_hash: int, prompt: str):
+        for number, (shift, mask) in enumerate(self._bands):
+            yield number, (image_hash >> shift) & mask, prompt
+
+    def _remove(self, key: Tuple[int, str]):
+        entry = self._entries.pop(key)
+        for band_key in self._band_keys(entry.image_hash, entry.prompt):
+            keys = self._index.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[band_key]
+
+    def lookup(self, image_hash: Optional[int], message: str) -> Optional[str]:
+        """Cached response for a visually near-identical image with the same prompt"""
+        if not self.cacheable(image_hash):
+            self.skipped += 1
+            return None
+        prompt = normalize_message(message)
+        now = time.time()
+
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(image_hash, prompt):
+                candidates |= self._index.get(band_key, set())
+
+            best, best_distance = None, None
+            for key in candidates:
+                entry = self._entries[key]
+                if now - entry.created_at > self.ttl:
+                    self._remove(key)
+                    continue
+                distance = bin(entry.image_hash ^ image_hash).count("1")
+                if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                    best, best_distance = key, distance
+
+            if best is None:
+                self.misses += 1
+                return None
+            entry = self._entries[best]
+            entry.hits += 1
+            self._entries.move_to_end(best)
+            self.hits += 1
+            if best_distance:
+                self.near_hits += 1
+            print(f"[IMAGE_CACHE] Hit at distance {best_distance} for '{prompt[:40]}'")
+            return entry.response
+
+    def store(self, image_hash: Optional[int], message: str, response: str):
+        if not self.cacheable(image_hash):
+            return
+        prompt = normalize_message(message)
+        key = (image_hash, prompt)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = ImageCacheEntry(image_hash, prompt, response, time.time())
+            for band_key in self._band_keys(image_hash, prompt):
+                self._index.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._index.clear()
+            return count
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "skipped_low_detail": self.skipped,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "max_distance": self.max_distance,
+            }
+
+
+_cache: Optional[ImageDiagnosisCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> Optional[ImageDiagnosisCache]:
+    """Shared cache, or None when IMAGE_CACHE_ENABLED is false"""
+    global _cache
+    if not IMAGE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageDiagnosisCache()
+    return _cache
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Image Preprocessing
+Normalizes user photos before vision inference: decode once, sniff the real
+format, apply and strip EXIF, downsize to IMAGE_MAX_EDGE and re-encode as
+JPEG at IMAGE_JPEG_QUALITY. Oversize or undecodable inputs are rejected
+before any model call.
+"""
+import base64
+import binascii
+import io
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
+
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+
+load_dotenv()
+
+# Decoded upload size limit
+IMAGE_MAX_INPUT_BYTES = int(os.getenv("IMAGE_MAX_INPUT_BYTES", str(10 * 1024 * 1024)))
+# Longest edge sent to the vision model; larger photos only cost upload time and tokens
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1280"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# Decompression-bomb guard (a small file can declare a huge canvas)
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+
+# Magic bytes -> format name
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+SUPPORTED_FORMATS = {"jpeg", "png", "gif", "bmp", "webp"}
+
+
+class ImageRejected(ValueError):
+    """Input that should not reach the vision model; str() is safe to show users"""
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    source_format: str
+    source_bytes: int
+    elapsed_ms: float
+    # 64-bit difference hash of the decoded image (see dhash)
+    dhash: Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.source_bytes - self.size
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode()}"
+
+
+_stats = {"processed": 0, "rejected": 0, "bytes_in": 0, "bytes_out": 0}
+_stats_lock = threading.Lock()
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """Real image format from the leading bytes (the client's label is not trusted)"""
+    for signature, name in _SIGNATURES:
+        if data.startswith(signature):
+            return name
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "heic"
+    return None
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """
+    Difference hash: one bit per horizontally adjacent pixel pair of a
+    (size+1) x size grayscale thumbnail. Re-compressed or resized copies of
+    a photo land within a few bits of each other.
+    """
+    pixels = image.convert("L").resize((size + 1, size), Image.LANCZOS, reducing_gap=2.0).tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def decode_base64(image_base64: str) -> bytes:
+    """Base64 (optionally a data: URL) to bytes, rejecting oversize input before decoding"""
+    if image_base64.startswith("data:"):
+        image_base64 = image_base64.partition(",")[2]
+    # 4 base64 characters per 3 bytes
+    if len(image_base64) * 3 // 4 > IMAGE_MAX_INPUT_BYTES + 2:
+        raise ImageRejected(f"Ukuran gambar melebihi {IMAGE_MAX_INPUT_BYTES // (1024 * 1024)}MB")
+    try:
+        return base64.b64decode(image_base64, validate=False)
+    except (binascii.Error, ValueError):
+        raise ImageRejected("Data gambar tidak valid")
+
+
+def _reject(reason: str):
+    with _stats_lock:
+        _stats["rejected"] += 1
+    raise ImageRejected(reason)
+
+
+def prepare_image(
+    data: Union[bytes, BinaryIO],
+    max_edge: int = IMAGE_MAX_EDGE,
+    quality: int = IMAGE_JPEG_QUALITY,
+) -> PreparedImage:
+    """
+    Decode, orient, downsize and re-encode one image as EXIF-free JPEG
+
+    Args:
+        data: Image bytes, or a seekable file (e.g. a spooled upload) read in place
+
+    Raises:
+        ImageRejected: too large, unknown/unsupported format or undecodable
+    """
+    start = time.perf_counter()
+    if isinstance(data, (bytes, bytearray)):
+        source, source_bytes = io.BytesIO(data), len(data)
+    else:
+        source = data
+        source_bytes = source.seek(0, io.SEEK_END)
+        source.seek(0)
+    if source_bytes > IMAGE_MAX_INPUT_BYTES:
+        _reject(f"Ukuran gambar melebihi {IMAGE_MAX_INPUT_BYTES // (1024 * 1024)}MB")
+
+    source_format = sniff_format(source.read(16))
+    source.seek(0)
+    if source_format not in SUPPORTED_FORMATS:
+        _reject("Format gambar tidak didukung (gunakan JPG, PNG atau WEBP)")
+
+    try:
+        image = Image.open(source)
+        if image.width * image.height > IMAGE_MAX_PIXELS:
+            _reject("Resolusi gambar terlalu besar")
+        # JPEG: let the decoder downscale by 1/2-1/8 while decoding (much less work for phone photos)
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white instead of black
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=3.0)
+
+        output = io.BytesIO()
+        # No exif= argument: metadata (GPS, device) is dropped
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+        image_hash = dhash(image)
+    except ImageRejected:
+        raise
+    except Exception as e:
+        print(f"[IMAGE] Decode failed: {e}")
+        _reject("Gambar tidak dapat dibaca")
+
+    prepared = PreparedImage(
+        data=output.getvalue(),
+        mime_type="image/jpeg",
+        width=image.width,
+        height=image.height,
+        source_format=source_format,
+        source_bytes=source_bytes,
+        elapsed_ms=(time.perf_counter() - start) * 1000,
+        dhash=image_hash,
+    )
+    with _stats_lock:
+        _stats["processed"] += 1
+        _stats["bytes_in"] += prepared.source_bytes
+        _stats["bytes_out"] += prepared.size
+
+    print(f"[IMAGE] {source_format} {prepared.source_bytes / 1024:.0f} KB -> jpeg {prepared.width}x{prepared.height} "
+          f"{prepared.size / 1024:.0f} KB (saved {prepared.saved_bytes / 1024:.0f} KB) in {prepared.elapsed_ms:.0f} ms")
+    return prepared
+
+
+def prepare_base64_image(image_base64: str, **kwargs) -> PreparedImage:
+    """prepare_image() for a base64 upload"""
+    try:
+        data = decode_base64(image_base64)
+    except ImageRejected:
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise
+    return prepare_image(data, **kwargs)
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    stats["max_edge"] = IMAGE_MAX_EDGE
+    return stats
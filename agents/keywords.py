@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Keyword Matcher
+Single-pass intent, symptom, focus-area, stage and budget detection shared by
+the router and the agents. All keyword lists compile into one token-level
+automaton at import; each message is lowercased, tokenized and scanned once.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+# Keyword syntax (matched against whole tokens, never inside a word):
+#   "rem"           whole word, optionally followed by an enclitic (remnya, remku)
+#   "modif*"        word prefix (modif, modifikasi, modifan)
+#   "check engine"  phrase of consecutive words (spaces or hyphens between)
+
+GREETING_KEYWORDS = ["halo", "helo", "hai", "hi", "hello", "selamat", "pagi", "siang", "sore", "malam"]
+
+MOD_KEYWORDS = [
+    "modif*", "upgrade*", "ganti", "pasang*",
+    "turbo*", "supercharger", "exhaust", "intake", "header",
+    "coilover", "velg", "suspension",
+    "stage", "tune*", "tuning", "ecu", "hondata", "bodykit", "aero*"
+]
+
+# Parts that are both modification targets and common complaint subjects.
+# They route to modification only when no diagnostic keyword is present
+# ("upgrade rem" / "rem brembo" vs "rem bunyi decit").
+COMPONENT_KEYWORDS = ["rem", "brake*"]
+
+BENGKEL_KEYWORDS = ["bengkel", "workshop", "servis", "service", "lokasi", "alamat", "rekomendasi bengkel"]
+
+DIAGNOSTIC_KEYWORDS = [
+    "masalah", "rusak", "bunyi*", "getar*", "bergetar", "bocor*", "panas*",
+    "overheat*", "mati", "susah", "boros", "lemah", "error*",
+    "warning", "check engine", "ac", "dingin", "stir",
+    "cvt", "transmisi", "kopling", "oli", "bensin", "solar",
+    "aki", "starter", "alternator", "radiator", "knalpot",
+    "kenapa", "mengapa", "apa penyebab", "diagnosa", "cek"
+]
+
+HELP_KEYWORDS = ["help", "bantuan", "cara", "bagaimana", "info", "apa itu", "menu"]
+
+# Symptom keyword -> components to suspect (used by the diagnostic agent)
+SYMPTOM_KEYWORDS = {
+    "getar": ["getar*", "bergetar"],
+    "bunyi": ["bunyi*"],
+    "bocor": ["bocor*"],
+    "panas": ["panas*", "overheat*"],
+    "boros": ["boros"],
+    "susah_start": ["susah start", "susah hidup", "susah nyala"],
+    "ac": ["ac"],
+    "rem": ["rem"],
+    "oli": ["oli"],
+    "cvt": ["cvt"],
+    "lampu": ["lampu"],
+    "stir": ["stir"],
+}
+
+SYMPTOM_CAUSES = {
+    "getar": ["cvt judder", "mounting rusak", "balance shaft"],
+    "bunyi": ["ball joint", "tie rod", "bearing", "brake pad"],
+    "bocor": ["seal oli", "radiator", "water pump"],
+    "panas": ["thermostat", "radiator", "water pump", "kipas"],
+    "boros": ["filter udara kotor", "busi aus", "injector kotor"],
+    "susah_start": ["aki lemah", "starter", "fuel pump"],
+    "ac": ["freon habis", "kompresor", "kondensor", "evaporator"],
+    "rem": ["brake pad", "rotor", "master cylinder", "brake fluid"],
+    "oli": ["seal bocor", "gasket", "piston ring"],
+    "cvt": ["cvt fluid", "torque converter", "solenoid"],
+    "lampu": ["bohlam", "relay", "fuse", "alternator"],
+    "stir": ["power steering", "rack end", "tie rod"],
+}
+
+# Focus areas in priority order: the first area with a match wins
+FOCUS_KEYWORDS = {
+    "engine": ["mesin", "engine", "power", "hp", "turbo*", "supercharger", "intake", "exhaust"],
+    "suspension": ["kaki", "suspension", "coilover", "per", "shockbreaker", "handling"],
+    "exterior": ["body", "bodykit", "aero*", "spoiler", "widebody", "exterior"],
+    "interior": ["interior", "jok", "seat", "dashboard", "racing seat"],
+    "audio": ["audio", "speaker", "subwoofer", "amplifier", "head unit"],
+    "brakes": ["rem", "brake*", "brembo", "caliper", "rotor"],
+}
+
+# Decimal numbers stay one token so "7.5jt" parses as 7.5 juta
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)+[a-z]*|[a-z0-9]+")
+ENCLITICS = ("nya", "ku", "mu", "lah", "kah")
+STAGE_TOKENS = {"stage1": 1, "stage2": 2, "stage3": 3}
+STAGE_NUMBERS = {"1": 1, "2": 2, "3": 3}
+BUDGET_UNITS = ("juta", "jt", "million")
+
+
+class MessageFeatures(TypedDict):
+    """Everything the router and agents read from a message"""
+    intent: str
+    symptoms: List[str]
+    symptom_keys: List[str]
+    focus_area: Optional[str]
+    stage: Optional[int]
+    budget: Optional[int]
+    matched: List[str]
+
+
+def _build_roles() -> Dict[str, set]:
+    """Map every keyword spec to the set of (kind, value) roles it carries"""
+    roles: Dict[str, set] = {}
+
+    def tag(keywords, role):
+        for keyword in keywords:
+            roles.setdefault(keyword, set()).add(role)
+
+    tag(GREETING_KEYWORDS, ("greeting", None))
+    tag(MOD_KEYWORDS, ("mod", None))
+    tag(COMPONENT_KEYWORDS, ("component", None))
+    tag(BENGKEL_KEYWORDS, ("bengkel", None))
+    tag(DIAGNOSTIC_KEYWORDS, ("diag", None))
+    tag(HELP_KEYWORDS, ("help", None))
+    for key, keywords in SYMPTOM_KEYWORDS.items():
+        tag(keywords, ("symptom", key))
+    for area, keywords in FOCUS_KEYWORDS.items():
+        tag(keywords, ("focus", area))
+
+    # A phrase consumes its words, so it inherits their roles
+    # ("check engine" still counts as focus 'engine')
+    for phrase in [k for k in roles if " " in k]:
+        for word in phrase.split():
+            for keyword in (word, word + "*"):
+                roles[phrase] |= roles.get(keyword, set())
+
+    return roles
+
+
+class _Automaton:
+    """Token-level keyword automaton: exact words, word prefixes and phrases"""
+
+    def __init__(self, roles: Dict[str, set]):
+        self.words: Dict[str, frozenset] = {}
+        self.stems: Dict[str, frozenset] = {}
+        self.phrases: Dict[str, List[Tuple[Tuple[str, ...], frozenset]]] = {}
+
+        for keyword, keyword_roles in roles.items():
+            keyword_roles = frozenset(keyword_roles)
+            if " " in keyword:
+                words = tuple(keyword.split())
+                self.phrases.setdefault(words[0], []).append((words, keyword_roles))
+            elif keyword.endswith("*"):
+                self.stems[keyword[:-1]] = keyword_roles
+            else:
+                self.words[keyword] = keyword_roles
+
+        # Longest phrase first so "rekomendasi bengkel" beats shorter ones
+        for candidates in self.phrases.values():
+            candidates.sort(key=lambda item: -len(item[0]))
+        self.stem_lengths = sorted({len(stem) for stem in self.stems}, reverse=True)
+
+        # Vocabulary is small and repetitive; memoize per-token lookups
+        self.word_roles = lru_cache(maxsize=16384)(self._word_roles)
+
+    def _word_roles(self, token: str) -> Optional[frozenset]:
+        """Roles for a single token (exact word, word + enclitic, or stem)"""
+        found = self.words.get(token)
+        if found is not None:
+            return found
+        for suffix in ENCLITICS:
+            if token.endswith(suffix) and token[:-len(suffix)] in self.words:
+                return self.words[token[:-len(suffix)]]
+        for length in self.stem_lengths:
+            if len(token) >= length and token[:length] in self.stems:
+                return self.stems[token[:length]]
+        return None
+
+    def scan(self, tokens: List[str]):
+        """Yield (matched text, roles) for every keyword hit, left to right"""
+        i = 0
+        count = len(tokens)
+        phrases = self.phrases
+        word_roles = self.word_roles
+        while i < count:
+            token = tokens[i]
+
+            if token in phrases:
+                phrase_hit = None
+                for words, phrase_roles in phrases[token]:
+                    if tuple(tokens[i:i + len(words)]) == words:
+                        phrase_hit = (words, phrase_roles)
+                        break
+                if phrase_hit:
+                    yield " ".join(phrase_hit[0]), phrase_hit[1]
+                    i += len(phrase_hit[0])
+                    continue
+
+            roles = word_roles(token)
+            if roles is not None:
+                yield token, roles
+            i += 1
+
+
+_AUTOMATON = _Automaton(_build_roles())
+
+
+def _parse_stage(tokens: List[str], i: int) -> Optional[int]:
+    """Stage number for 'stage1' or 'stage 1' at token i"""
+    token = tokens[i]
+    if token in STAGE_TOKENS:
+        return STAGE_TOKENS[token]
+    if token == "stage" and i + 1 < len(tokens):
+        return STAGE_NUMBERS.get(tokens[i + 1])
+    return None
+
+
+def _parse_budget(tokens: List[str], i: int) -> Optional[int]:
+    """Budget in IDR for '10jt', '7.5 juta', '15 million' or '10jtan' at token i"""
+    token = tokens[i]
+    if not token[0].isdigit():
+        return None
+
+    number = token.rstrip("abcdefghijklmnopqrstuvwxyz")
+    unit = token[len(number):]
+    if not unit and i + 1 < len(tokens):
+        unit = tokens[i + 1]
+    # Like the original regex, the unit may carry a suffix ("10jtan", "20 jutaan")
+    if not unit.startswith(BUDGET_UNITS):
+        return None
+    try:
+        return int(float(number.replace(",", ".")) * 1_000_000)
+    except ValueError:
+        # Thousands separators ("10.000.000 juta") are not a budget we can trust
+        return None
+
+
+def _decide_intent(message_lower: str, kinds: set) -> str:
+    """Apply the routing precedence to the matched keyword kinds"""
+    task_kinds = {"stage", "mod", "component", "bengkel", "diag"}
+    if "greeting" in kinds and len(message_lower) < 30 and not kinds & task_kinds:
+        return "greeting"
+    if "stage" in kinds:
+        return "stage"
+    if "mod" in kinds or ("component" in kinds and "diag" not in kinds):
+        return "modification"
+    if "bengkel" in kinds:
+        return "bengkel"
+    if "diag" in kinds:
+        return "diagnostic"
+    if "help" in kinds:
+        return "help"
+    # Default to diagnostic for unknown queries about the car
+    return "diagnostic"
+
+
+@lru_cache(maxsize=2048)
+def _analyze(message_lower: str) -> tuple:
+    tokens = TOKEN_PATTERN.findall(message_lower)
+
+    kinds = set()
+    symptom_keys: List[str] = []
+    focus_areas = set()
+    matched = []
+
+    for text, roles in _AUTOMATON.scan(tokens):
+        matched.append(text)
+        for kind, value in roles:
+            kinds.add(kind)
+            if kind == "symptom" and value not in symptom_keys:
+                symptom_keys.append(value)
+            elif kind == "focus":
+                focus_areas.add(value)
+
+    # Stage and budget only ever start at 'stage*' or numeric tokens
+    stage = None
+    budget = None
+    for i, token in enumerate(tokens):
+        if stage is None and token.startswith("stage"):
+            stage = _parse_stage(tokens, i)
+        elif budget is None and token[0].isdigit():
+            budget = _parse_budget(tokens, i)
+    if stage is not None:
+        kinds.add("stage")
+
+    focus_area = next((area for area in FOCUS_KEYWORDS if area in focus_areas), None)
+
+    symptoms: List[str] = []
+    for key in symptom_keys:
+        for cause in SYMPTOM_CAUSES[key]:
+            if cause not in symptoms:
+                symptoms.append(cause)
+
+    return (
+        _decide_intent(message_lower, kinds),
+        tuple(symptoms),
+        tuple(symptom_keys),
+        focus_area,
+        stage,
+        budget,
+        tuple(matched),
+    )
+
+
+def analyze_message(message: str) -> MessageFeatures:
+    """
+    Scan a message once and extract routing and agent features
+
+    Results are memoized per message, so the router and the agent that
+    handles the same message share one scan.
+
+    Args:
+        message: Raw user message
+
+    Returns:
+        MessageFeatures with intent, symptoms (suspected components),
+        symptom_keys, focus_area (None if no focus keyword), stage, budget (IDR)
+    """
+    intent, symptoms, symptom_keys, focus_area, stage, budget, matched = _analyze((message or "").lower())
+    return {
+        "intent": intent,
+        "symptoms": list(symptoms),
+        "symptom_keys": list(symptom_keys),
+        "focus_area": focus_area,
+        "stage": stage,
+        "budget": budget,
+        "matched": list(matched),
+    }
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Parts Optimizer
+Deterministic budget builds over modification_catalog: a multiple-choice
+knapsack that picks at most one part per subcategory (one intake, one
+exhaust, one tune, ...) to maximize expected power gain within a budget,
+respecting min_stage, compatibility and legal status. Costs include
+installation. Used for /plan and as the fixed part list the modification
+agent's LLM writes its plan around.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from database.catalog import hp_gain, price_bounds, torque_gain
+
+load_dotenv()
+
+# Stock L15A
+STOCK_HP = 117
+STOCK_TORQUE_NM = 146
+
+# Which end of price_range_idr a build is costed at; "max" keeps every build under budget
+PLAN_PRICE_BASIS = os.getenv("PLAN_PRICE_BASIS", "max")
+# Installation labor per installation_time_hours; parts without hours use PLAN_INSTALL_FACTOR x price
+PLAN_LABOR_RATE_IDR = int(os.getenv("PLAN_LABOR_RATE_IDR", "300000"))
+PLAN_INSTALL_FACTOR = float(os.getenv("PLAN_INSTALL_FACTOR", "0.25"))
+# HP-equivalent of 1 Nm in the objective (torque breaks ties between similar HP gains)
+PLAN_TORQUE_WEIGHT = float(os.getenv("PLAN_TORQUE_WEIGHT", "0.2"))
+# Default legal statuses for builds (Track Only parts are opt-in)
+PLAN_LEGAL_STATUSES = tuple(s.strip() for s in os.getenv("PLAN_LEGAL_STATUSES", "Street Legal,Gray Area").split(",") if s.strip())
+
+# Knapsack capacity resolution; costs round up to it, so builds never exceed the budget
+PRICE_STEP_IDR = 100_000
+
+
+@dataclass
+class PlannedPart:
+    part: dict
+    hp: tuple
+    torque: tuple
+    price: int
+    install: int
+
+    @property
+    def cost(self) -> int:
+        return self.price + self.install
+
+    @property
+    def value(self) -> float:
+        hp = sum(self.hp) / 2 if self.hp[0] is not None else 0.0
+        torque = sum(self.torque) / 2 if self.torque[0] is not None else 0.0
+        return hp + PLAN_TORQUE_WEIGHT * torque
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.part.get("id"),
+            "part_name": self.part.get("part_name"),
+            "brand": self.part.get("brand"),
+            "category": self.part.get("category"),
+            "subcategory": self.part.get("subcategory"),
+            "min_stage": self.part.get("min_stage"),
+            "legal_status": self.part.get("legal_status"),
+            "price_range_idr": self.part.get("price_range_idr"),
+            "hp_gain": list(self.hp) if self.hp[0] is not None else None,
+            "torque_gain_nm": list(self.torque) if self.torque[0] is not None else None,
+            "price_idr": self.price,
+            "install_idr": self.install,
+            "cost_idr": self.cost,
+        }
+
+
+@dataclass
+class Build:
+    budget: int
+    parts: List[PlannedPart] = field(default_factory=list)
+    candidates: int = 0
+    elapsed_ms: float = 0.0
+
+    @property
+    def parts_cost(self) -> int:
+        return sum(p.price for p in self.parts)
+
+    @property
+    def install_cost(self) -> int:
+        return sum(p.install for p in self.parts)
+
+    @property
+    def total_cost(self) -> int:
+        return self.parts_cost + self.install_cost
+
+    def gain(self, attribute: str) -> tuple:
+        ranges = [getattr(p, attribute) for p in self.parts if getattr(p, attribute)[0] is not None]
+        return sum(r[0] for r in ranges), sum(r[1] for r in ranges)
+
+    def to_dict(self) -> dict:
+        hp_low, hp_high = self.gain("hp")
+        torque_low, torque_high = self.gain("torque")
+        return {
+            "budget_idr": self.budget,
+            "price_basis": PLAN_PRICE_BASIS,
+            "parts": [p.to_dict() for p in self.parts],
+            "parts_cost_idr": self.parts_cost,
+            "install_cost_idr": self.install_cost,
+            "total_cost_idr": self.total_cost,
+            "remaining_idr": self.budget - self.total_cost,
+            "hp_gain": [hp_low, hp_high],
+            "torque_gain_nm": [torque_low, torque_high],
+            "estimated_hp": [STOCK_HP + hp_low, STOCK_HP + hp_high],
+            "estimated_torque_nm": [STOCK_TORQUE_NM + torque_low, STOCK_TORQUE_NM + torque_high],
+            "candidates": self.candidates,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+        }
+
+
+def planned_part(part: dict, price_basis: str = PLAN_PRICE_BASIS) -> Optional[PlannedPart]:
+    """Numeric view of a catalog row, or None when it has no price"""
+    low, high = price_bounds(part)
+    if low is None and high is None:
+        return None
+    low, high = low if low is not None else high, high if high is not None else low
+    price = {"min": low, "max": high}.get(price_basis, (low + high) // 2)
+
+    hours = part.get("installation_time_hours")
+    install = int(hours * PLAN_LABOR_RATE_IDR) if hours is not None else int(price * PLAN_INSTALL_FACTOR)
+    return PlannedPart(part=part, hp=hp_gain(part), torque=torque_gain(part), price=price, install=install)
+
+
+def optimize_build(
+    parts: Iterable[dict],
+    budget: int,
+    price_basis: str = PLAN_PRICE_BASIS,
+) -> Build:
+    """
+    Best build within budget: at most one part per subcategory, maximum expected gain
+
+    parts should already be filtered (stage, compatibility, legal status);
+    parts without a numeric hp/torque gain are not candidates. Among builds
+    with the same gain the cheapest wins.
+    """
+    start = time.perf_counter()
+    groups = {}
+    for part in parts:
+        planned = planned_part(part, price_basis)
+        if planned is None or planned.value <= 0 or planned.cost > budget:
+            continue
+        groups.setdefault(part.get("subcategory") or part.get("category") or "", []).append(planned)
+
+    build = Build(budget=budget, candidates=sum(len(g) for g in groups.values()))
+    if not groups:
+        build.elapsed_ms = (time.perf_counter() - start) * 1000
+        return build
+
+    def weight(planned: PlannedPart) -> int:
+        return -(-planned.cost // PRICE_STEP_IDR)  # round up
+
+    capacity = min(budget // PRICE_STEP_IDR, sum(max(weight(p) for p in g) for g in groups.values()))
+    # best[c]: max value with cost <= c steps; choice[g][c]: item picked for group g at c (-1: none)
+    best = [0.0] * (capacity + 1)
+    choices = []
+    group_items = list(groups.values())
+    for items in group_items:
+        updated = best[:]
+        choice = [-1] * (capacity + 1)
+        for index, planned in enumerate(items):
+            w, v = weight(planned), planned.value
+            for c in range(w, capacity + 1):
+                candidate = best[c - w] + v
+                if candidate > updated[c] + 1e-9:
+                    updated[c] = candidate
+                    choice[c] = index
+        best = updated
+        choices.append(choice)
+
+    # Cheapest capacity reaching the best value, then walk the choices back
+    top = max(best)
+    c = next(c for c, value in enumerate(best) if value >= top - 1e-9)
+    for items, choice in zip(reversed(group_items), reversed(choices)):
+        index = choice[c]
+        if index >= 0:
+            build.parts.append(items[index])
+            c -= weight(items[index])
+    build.parts.sort(key=lambda p: (p.part.get("min_stage") or 0, p.part.get("subcategory") or ""))
+
+    build.elapsed_ms = (time.perf_counter() - start) * 1000
+    return build
+
+
+def plan_build(
+    snapshot,
+    budget: int,
+    category: Optional[str] = None,
+    max_stage: Optional[int] = None,
+    compatibility: Optional[Iterable[str]] = None,
+    legal_statuses: Optional[Iterable[str]] = PLAN_LEGAL_STATUSES,
+    price_basis: str = PLAN_PRICE_BASIS,
+) -> Build:
+    """optimize_build() over the catalog snapshot's parts matching the /parts filters"""
+    parts = snapshot.search_parts(
+        category=category,
+        max_stage=max_stage,
+        compatibility=compatibility,
+        legal_statuses=legal_statuses,
+    )
+    build = optimize_build(parts, budget, price_basis)
+    print(f"[OPTIMIZER] Budget Rp {budget:,}: {len(build.parts)} of {build.candidates} candidates, "
+          f"Rp {build.total_cost:,}, +{build.gain('hp')[0]}-{build.gain('hp')[1]} HP in {build.elapsed_ms:.1f} ms")
+    return build
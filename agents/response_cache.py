@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Diagnostic Response Cache
+Two-tier cache in front of the diagnostic graph: exact match on the
+normalized message, then near-duplicate match by query-embedding cosine.
+Entries are LRU/TTL bounded in memory, with an optional SQLite tier
+(RESPONSE_CACHE_DB) that survives restarts.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from agents.keywords import TOKEN_PATTERN, analyze_message
+
+load_dotenv()
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+# Cosine similarity for a near-duplicate hit; 0 disables the semantic tier
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+# Path to a SQLite file for the persistent tier; empty keeps the cache in memory only
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "")
+
+EXACT = "exact"
+SEMANTIC = "semantic"
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(TOKEN_PATTERN.findall((message or "").lower()))
+
+
+def _default_embed(text: str) -> np.ndarray:
+    # Shared query-embedding cache, so the graph reuses this vector on a miss
+    from agents.embeddings import embed_query
+    return embed_query(text)
+
+
+@dataclass
+class CacheEntry:
+    response: str
+    embedding: Optional[np.ndarray]
+    symptom_keys: Tuple[str, ...]
+    created_at: float
+    hits: int = 0
+
+
+@dataclass
+class CacheLookup:
+    """Result of a lookup; carries the key and embedding so a miss can be stored without re-embedding"""
+    key: str
+    response: Optional[str] = None
+    tier: Optional[str] = None
+    similarity: Optional[float] = None
+    embedding: Optional[np.ndarray] = None
+    symptom_keys: Tuple[str, ...] = field(default_factory=tuple)
+    generation: int = 0
+
+    @property
+    def hit(self) -> bool:
+        return self.response is not None
+
+
+class _SqliteTier:
+    """Write-through persistent tier; read back into memory at startup"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                embedding BLOB,
+                symptom_keys TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self.conn.commit()
+
+    def load(self, max_entries: int, ttl: float) -> List[tuple]:
+        """Non-expired rows, least recently used first"""
+        self.conn.execute("DELETE FROM response_cache WHERE created_at < ?", (time.time() - ttl,))
+        self.conn.commit()
+        rows = self.conn.execute(
+            "SELECT key, response, embedding, symptom_keys, created_at FROM response_cache "
+            "ORDER BY last_used DESC LIMIT ?",
+            (max_entries,)
+        ).fetchall()
+        return list(reversed(rows))
+
+    def put(self, key: str, entry: CacheEntry, max_entries: int):
+        blob = entry.embedding.astype(np.float32).tobytes() if entry.embedding is not None else None
+        self.conn.execute(
+            "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (key, entry.response, blob, ",".join(entry.symptom_keys), entry.created_at, time.time())
+        )
+        self.conn.execute(
+            "DELETE FROM response_cache WHERE key NOT IN "
+            "(SELECT key FROM response_cache ORDER BY last_used DESC LIMIT ?)",
+            (max_entries,)
+        )
+        self.conn.commit()
+
+    def touch(self, key: str):
+        self.conn.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+
+    def delete(self, key: str):
+        self.conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+        self.conn.commit()
+
+    def clear(self) -> int:
+        count = self.conn.execute("DELETE FROM response_cache").rowcount
+        self.conn.commit()
+        return count
+
+    def close(self):
+        self.conn.close()
+
+
+class ResponseCache:
+    """
+    Two-tier diagnostic response cache
+
+    A semantic hit additionally requires the same detected symptom keys, so
+    "rem bunyi" never answers "rem tidak pakem" even if the vectors are close.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: float = RESPONSE_CACHE_TTL,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+        db_path: str = RESPONSE_CACHE_DB,
+        embed: Callable[[str], np.ndarray] = _default_embed,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed = embed
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Stacked embeddings for the semantic tier, rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        # Bumped by invalidate() so answers computed before it are not stored
+        self._generation = 0
+        self._stats = {
+            "exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0,
+            "evictions": 0, "expired": 0, "invalidations": 0,
+        }
+
+        self._disk = _SqliteTier(db_path) if db_path else None
+        if self._disk:
+            for key, response, blob, symptom_keys, created_at in self._disk.load(max_entries, ttl):
+                embedding = np.frombuffer(blob, dtype=np.float32) if blob else None
+                keys = tuple(k for k in symptom_keys.split(",") if k)
+                self._entries[key] = CacheEntry(response, embedding, keys, created_at)
+            print(f"[CACHE] Loaded {len(self._entries)} responses from {db_path}")
+
+    def _expired(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.created_at > self.ttl
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        self._matrix = None
+        if self._disk:
+            self._disk.delete(key)
+
+    def _semantic_match(self, embedding: np.ndarray, symptom_keys: Tuple[str, ...]) -> Tuple[Optional[str], float]:
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e.embedding is not None]
+            self._matrix = (
+                np.vstack([self._entries[k].embedding for k in self._matrix_keys])
+                if self._matrix_keys else np.zeros((0, embedding.shape[0]), dtype=np.float32)
+            )
+        if not self._matrix_keys:
+            return None, 0.0
+
+        # Embeddings are L2-normalized, so the dot product is the cosine
+        scores = self._matrix @ embedding.astype(np.float32)
+        for index in np.argsort(-scores):
+            score = float(scores[index])
+            if score < self.similarity:
+                break
+            key = self._matrix_keys[index]
+            entry = self._entries.get(key)
+            if entry and entry.symptom_keys == symptom_keys:
+                return key, score
+        return None, 0.0
+
+    def lookup(self, message: str) -> CacheLookup:
+        """Exact tier first, then the semantic tier (embeds the message once)"""
+        key = normalize_message(message)
+        result = CacheLookup(key=key, generation=self._generation)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._expired(entry):
+                self._drop(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry:
+                return self._hit(result, key, entry, EXACT, 1.0)
+
+        result.symptom_keys = tuple(analyze_message(message)["symptom_keys"])
+        if self.similarity <= 0:
+            with self._lock:
+                self._stats["misses"] += 1
+            return result
+
+        # Embedding runs outside the lock; it is the slow part of a miss
+        result.embedding = np.asarray(self.embed(message), dtype=np.float32)
+
+        with self._lock:
+            match_key, score = self._semantic_match(result.embedding, result.symptom_keys)
+            entry = self._entries.get(match_key) if match_key else None
+            if entry and self._expired(entry):
+                self._drop(match_key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry:
+                return self._hit(result, match_key, entry, SEMANTIC, score)
+            self._stats["misses"] += 1
+        return result
+
+    def _hit(self, result: CacheLookup, key: str, entry: CacheEntry, tier: str, score: float) -> CacheLookup:
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self._stats[f"{tier}_hits"] += 1
+        if self._disk:
+            self._disk.touch(key)
+        result.response = entry.response
+        result.tier = tier
+        result.similarity = round(score, 4)
+        return result
+
+    def store(self, lookup: CacheLookup, response: str):
+        """Cache the response for a missed lookup"""
+        entry = CacheEntry(
+            response=response,
+            embedding=lookup.embedding,
+            symptom_keys=lookup.symptom_keys,
+            created_at=time.time(),
+        )
+        with self._lock:
+            if lookup.generation != self._generation:
+                return
+            self._entries[lookup.key] = entry
+            self._entries.move_to_end(lookup.key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._matrix = None
+            self._stats["stores"] += 1
+            if self._disk:
+                self._disk.put(lookup.key, entry, self.max_entries)
+
+    def invalidate(self) -> int:
+        """Drop every cached response (e.g. after the knowledge base is re-seeded)"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._matrix = None
+            self._generation += 1
+            if self._disk:
+                count = max(count, self._disk.clear())
+            self._stats["invalidations"] += 1
+        print(f"[CACHE] Invalidated {count} cached responses")
+        return count
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["persistent"] = self._disk is not None
+        stats["similarity_threshold"] = self.similarity
+        return stats
+
+    def close(self):
+        if self._disk:
+            self._disk.close()
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache, or None when RESPONSE_CACHE_ENABLED=false"""
+    global _cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
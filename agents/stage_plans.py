@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Stage Plan Cache
+Modification plans for plain stage requests ("Stage 1", "stage 2 budget
+30jt") keyed by (stage, focus_area, budget bucket) and tagged with the
+catalog version they were generated from. Plans for every stage preset
+are generated in the background once the catalog is loaded; when
+modification_catalog or stage_presets change, cached plans keep serving
+while a background pass regenerates them.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from agents.keywords import BUDGET_UNITS, ENCLITICS, TOKEN_PATTERN, analyze_message
+
+load_dotenv()
+
+STAGE_PLAN_CACHE_ENABLED = os.getenv("STAGE_PLAN_CACHE_ENABLED", "true").lower() == "true"
+# Focus areas generated for every stage after a catalog load (others are cached on first request)
+STAGE_PLAN_PRECOMPUTE_FOCUS = [f.strip() for f in os.getenv("STAGE_PLAN_PRECOMPUTE_FOCUS", "engine").split(",") if f.strip()]
+# Filler words allowed in a cacheable request ("stage 1 detail dong"); any other word bypasses the cache
+STAGE_PLAN_FILLER_WORDS = {w.strip() for w in os.getenv(
+    "STAGE_PLAN_FILLER_WORDS",
+    "dong,ya,yah,deh,sih,nih,kak,min,gan,bro,tolong,minta,mau,pengen,ingin,detail,lengkap,info,"
+    "rekomendasi,saran,paket,plan,rencana,modif,modifikasi,buat,untuk,honda,freed,fokus"
+).split(",") if w.strip()}
+
+# Budget bucket floors (IDR). A plan is generated for the floor, so it fits
+# every budget in its bucket; budgets below the first floor are not cached.
+BUDGET_BUCKETS_IDR = (5_000_000, 10_000_000, 15_000_000, 25_000_000, 45_000_000, 60_000_000, 120_000_000)
+
+# Words that only restate the stage/budget part of a request
+_REQUEST_WORDS = {"stage", "budget", "dana", "bujet", "rp", *BUDGET_UNITS}
+# Bare focus categories; part-level focus words ("turbo", "coilover") ask for something specific
+_CATEGORY_WORDS = {"mesin", "engine", "kaki", "suspensi", "suspension", "body", "eksterior", "exterior",
+                   "interior", "audio", "rem", "brake", "brakes"}
+
+PlanKey = Tuple[int, str, Optional[int]]
+
+
+@dataclass
+class StagePlan:
+    modification_plan: str
+    total_cost: dict
+    stage_preset: Optional[dict]
+    catalog_version: int
+    generated_at: float
+
+
+def budget_bucket(budget: Optional[int]) -> Tuple[bool, Optional[int]]:
+    """(cacheable, bucket floor) for a parsed budget; no budget is its own bucket (None)"""
+    if budget is None:
+        return True, None
+    floors = [floor for floor in BUDGET_BUCKETS_IDR if floor <= budget]
+    return (True, floors[-1]) if floors else (False, None)
+
+
+def _is_plain_word(token: str) -> bool:
+    if token in _REQUEST_WORDS or token[0].isdigit() or token.startswith(("stage", *BUDGET_UNITS)):
+        return True
+    words = {token} | {token[:-len(suffix)] for suffix in ENCLITICS if token.endswith(suffix)}
+    return bool(words & (_CATEGORY_WORDS | STAGE_PLAN_FILLER_WORDS))
+
+
+def plan_key(message: str, features: Optional[dict] = None) -> Optional[PlanKey]:
+    """Cache key for a plain stage request, or None when the message asks for something more specific"""
+    features = features or analyze_message(message)
+    if not features["stage"]:
+        return None
+    cacheable, bucket = budget_bucket(features["budget"])
+    if not cacheable:
+        return None
+    if not all(_is_plain_word(token) for token in TOKEN_PATTERN.findall(message.lower())):
+        return None
+    return features["stage"], features["focus_area"] or "engine", bucket
+
+
+def canonical_request(key: PlanKey) -> str:
+    """The user request a cached plan is generated for"""
+    stage, focus_area, bucket = key
+    request = f"Stage {stage}, fokus {focus_area}"
+    if bucket is not None:
+        request += f", budget maksimal Rp {bucket:,}"
+    return request
+
+
+class StagePlanCache:
+    """
+    Plans by key plus the background (re)generation worker
+
+    generate(key) -> StagePlan is supplied by the modification agent via
+    attach(); it runs on the worker thread, one key at a time, so a
+    regeneration pass does not burst the Groq quota.
+    """
+
+    def __init__(self):
+        self._plans: Dict[PlanKey, StagePlan] = {}
+        # Keys asked for but not yet generated
+        self._wanted: set = set()
+        self._lock = threading.Lock()
+        self._generate: Optional[Callable[[PlanKey], StagePlan]] = None
+        self._catalog = None
+        self._pending_version: Optional[int] = None
+        self._worker: Optional[threading.Thread] = None
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "generated": 0, "failed": 0, "passes": 0}
+
+    def attach(self, catalog, generate: Callable[[PlanKey], StagePlan]):
+        """Regenerate on every catalog change (and now, if the catalog is already loaded)"""
+        self._catalog = catalog
+        self._generate = generate
+        catalog.on_change(lambda snapshot: self.schedule(snapshot))
+        if catalog.loaded:
+            self.schedule(catalog.get())
+
+    def keys_for(self, snapshot) -> List[PlanKey]:
+        """Precomputed keys plus every key requested so far"""
+        keys = [(stage, focus, None) for stage in sorted(snapshot.stages_by_number) for focus in STAGE_PLAN_PRECOMPUTE_FOCUS]
+        with self._lock:
+            keys.extend(key for key in [*self._plans, *self._wanted] if key not in keys)
+        return keys
+
+    def request(self, key: PlanKey):
+        """Generate this key in the background (a request missed it)"""
+        with self._lock:
+            if key in self._wanted or key in self._plans:
+                return
+            self._wanted.add(key)
+        if self._catalog is not None and self._catalog.loaded:
+            self.schedule(self._catalog.get())
+
+    def schedule(self, snapshot):
+        """Start (or extend) a background pass for this catalog version"""
+        with self._lock:
+            self._pending_version = snapshot.version
+            if self._worker and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="stage-plans", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                version = self._pending_version
+                self._pending_version = None
+                if version is None:
+                    self._worker = None
+                    return
+            snapshot = self._catalog.get()
+            start = time.monotonic()
+            keys = self.keys_for(snapshot)
+            for key in keys:
+                plan = self.get(key, count=False)
+                if plan and plan.catalog_version >= snapshot.version:
+                    continue
+                try:
+                    self.store(key, self._generate(key))
+                    self.stats["generated"] += 1
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    with self._lock:
+                        # The next request for it tries again
+                        self._wanted.discard(key)
+                    print(f"[PLAN] Generating stage {key[0]} / {key[1]} / {key[2]} failed: {e}")
+            self.stats["passes"] += 1
+            print(f"[PLAN] {len(keys)} stage plans current for catalog version {snapshot.version} "
+                  f"in {(time.monotonic() - start) * 1000:.0f} ms")
+
+    def get(self, key: PlanKey, count: bool = True) -> Optional[StagePlan]:
+        """Cached plan (possibly from an older catalog version while regeneration runs)"""
+        with self._lock:
+            plan = self._plans.get(key)
+        if count:
+            if plan is None:
+                self.stats["misses"] += 1
+            elif self._catalog is not None and self._catalog.loaded and plan.catalog_version < self._catalog.get().version:
+                self.stats["stale_hits"] += 1
+            else:
+                self.stats["hits"] += 1
+        return plan
+
+    def store(self, key: PlanKey, plan: StagePlan):
+        with self._lock:
+            current = self._plans.get(key)
+            # A slow request must not overwrite a plan from a newer catalog
+            if current is None or plan.catalog_version >= current.catalog_version:
+                self._plans[key] = plan
+            self._wanted.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self._wanted.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            plans = list(self._plans.values())
+        return {
+            **self.stats,
+            "plans": len(plans),
+            "catalog_versions": sorted({p.catalog_version for p in plans}),
+            "regenerating": self._worker is not None,
+        }
+
+
+_cache: Optional[StagePlanCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_stage_plans() -> Optional[StagePlanCache]:
+    """Shared stage plan cache, or None when STAGE_PLAN_CACHE_ENABLED is false"""
+    global _cache
+    if not STAGE_PLAN_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StagePlanCache()
+    return _cache
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Response Streaming
+Runs an agent graph in LangGraph's "messages" stream mode and turns the LLM
+node's token chunks into framed events for /process/stream:
+
+    header -> token* -> footer -> done
+
+header and footer are the fixed parts of the formatted response around the
+generated text; done carries the complete response, identical to what
+/process returns for the same run.
+"""
+from typing import AsyncIterator, Callable
+
+
+async def stream_graph(
+    graph,
+    state: dict,
+    llm_node: str,
+    header: Callable[[dict], str],
+    footer: Callable[[dict], str],
+) -> AsyncIterator[dict]:
+    """
+    Stream one graph run as events
+
+    Args:
+        graph: Compiled LangGraph whose llm_node calls a chat model
+        state: Initial graph state
+        llm_node: Node whose model tokens are forwarded
+        header: Header text from the state at the first token
+        footer: Footer text from the final state
+
+    Yields:
+        {"event": "header" | "token" | "footer", "text": ...}, then
+        {"event": "done", "response": ...}
+    """
+    latest = state
+    header_sent = False
+
+    async for mode, chunk in graph.astream(state, stream_mode=["messages", "values"]):
+        if mode == "values":
+            latest = chunk
+            continue
+
+        message, metadata = chunk
+        if metadata.get("langgraph_node") != llm_node or not isinstance(message.content, str) or not message.content:
+            continue
+        if not header_sent:
+            header_sent = True
+            yield {"event": "header", "text": header(latest)}
+        yield {"event": "token", "text": message.content}
+
+    if not header_sent:
+        # Model did not stream; clients still get the full text from done
+        yield {"event": "header", "text": header(latest)}
+    yield {"event": "footer", "text": footer(latest)}
+    yield {"event": "done", "response": latest["response"]}
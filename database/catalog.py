@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - Catalog Store
+modification_catalog and stage_presets held in memory as versioned,
+indexed snapshots. /parts, /stages and the modification agent read from
+here; the tables are reloaded in the background after CATALOG_TTL_SECONDS
+or on invalidate().
+"""
+import base64
+import bisect
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "300"))
+
+PAGE_SIZE = 1000  # PostgREST default max rows per request
+
+# Columns /parts?fields= may project (modification_catalog minus created_at)
+PART_FIELDS = (
+    "id", "part_name", "brand", "category", "subcategory", "description", "performance_gain",
+    "price_range_idr", "installation_time_hours", "min_stage", "legal_status", "compatibility", "notes",
+    "price_min_idr", "price_max_idr", "hp_gain_min", "hp_gain_max",
+)
+
+# "+5-8" -> (5, 8), "+10" -> (10, 10); same rule as the hp_gain_* generated columns in schema.sql.
+# Descriptive values ("Supports +80 HP builds") are not gains.
+HP_GAIN_PATTERN = re.compile(r"^\+(\d+)(?:-(\d+))?")
+# "+15-20 Nm" -> (15, 20)
+TORQUE_GAIN_PATTERN = re.compile(r"^\+(\d+)(?:-(\d+))?\s*nm\b", re.IGNORECASE)
+
+
+def _fetch_all(client, table: str, order: str) -> List[dict]:
+    rows = []
+    while True:
+        page = client.table(table).select("*").order(order).range(len(rows), len(rows) + PAGE_SIZE - 1).execute()
+        rows.extend(page.data or [])
+        if len(page.data or []) < PAGE_SIZE:
+            return rows
+
+
+def price_bounds(part: dict) -> Tuple[Optional[int], Optional[int]]:
+    """price_range_idr min/max (price_min_idr / price_max_idr columns)"""
+    price = part.get("price_range_idr") or {}
+    return price.get("min"), price.get("max")
+
+
+def hp_gain(part: dict) -> Tuple[Optional[int], Optional[int]]:
+    """Parsed performance_gain.hp (hp_gain_min / hp_gain_max columns)"""
+    match = HP_GAIN_PATTERN.match(str((part.get("performance_gain") or {}).get("hp") or ""))
+    if not match:
+        return None, None
+    low = int(match.group(1))
+    return low, int(match.group(2) or low)
+
+
+def torque_gain(part: dict) -> Tuple[Optional[int], Optional[int]]:
+    """Parsed performance_gain.torque in Nm"""
+    match = TORQUE_GAIN_PATTERN.match(str((part.get("performance_gain") or {}).get("torque") or ""))
+    if not match:
+        return None, None
+    low = int(match.group(1))
+    return low, int(match.group(2) or low)
+
+
+def _lowered(values: Optional[Iterable[str]]) -> Optional[set]:
+    if not values:
+        return None
+    return {v.strip().lower() for v in values if v and v.strip()} or None
+
+
+def encode_cursor(part_id) -> str:
+    """Opaque /parts cursor pointing after part_id"""
+    return base64.urlsafe_b64encode(json.dumps({"after": part_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Part id the cursor points after; ValueError when malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["after"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def check_fields(fields: Optional[List[str]]):
+    """ValueError for columns /parts?fields= cannot project"""
+    unknown = [f for f in fields or () if f not in PART_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+
+def project(parts: List[dict], fields: Optional[List[str]]) -> List[dict]:
+    """Keep only the requested columns (id is always kept so cursors stay usable)"""
+    if not fields:
+        return parts
+    check_fields(fields)
+    keep = ["id"] + [f for f in fields if f != "id"]
+    return [{f: part.get(f) for f in keep} for part in parts]
+
+
+def paginate(parts: List[dict], limit: Optional[int] = None, offset: int = 0, after=None) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of parts and the cursor for the next one (None on the last page)
+
+    A cursor (after = part id) takes precedence over offset; it raises
+    ValueError when that part is no longer in the filtered result.
+    """
+    start = offset
+    if after is not None:
+        start = next((i + 1 for i, part in enumerate(parts) if part.get("id") == after), None)
+        if start is None:
+            raise ValueError("Cursor no longer matches the catalog; restart from the first page")
+    end = len(parts) if limit is None else start + limit
+    page = parts[start:end]
+    next_cursor = encode_cursor(page[-1].get("id")) if page and end < len(parts) else None
+    return page, next_cursor
+
+
+class CatalogSnapshot:
+    """
+    One immutable load of both tables plus lookup indexes
+
+    Rows are shared between readers; treat them as read-only.
+    """
+
+    def __init__(self, parts: List[dict], stages: List[dict], version: int = 0):
+        self.version = version
+        self.loaded_at = time.time()
+        # Same order as the previous .order("category") queries
+        self.parts = sorted(parts, key=lambda p: p.get("category") or "")
+        self.stages = sorted(stages, key=lambda s: s.get("stage") or 0)
+
+        canonical = json.dumps({"parts": self.parts, "stages": self.stages}, sort_keys=True, default=str)
+        self.content_hash = hashlib.sha256(canonical.encode()).hexdigest()
+
+        self.stages_by_number: Dict[int, dict] = {s["stage"]: s for s in self.stages if s.get("stage") is not None}
+
+        # category -> parts sorted by min_stage (+ the min_stage keys for bisect)
+        self.by_category: Dict[str, List[dict]] = {}
+        for part in self.parts:
+            self.by_category.setdefault(part.get("category") or "", []).append(part)
+        self._category_stage_keys: Dict[str, List[int]] = {}
+        for category, rows in self.by_category.items():
+            rows.sort(key=self._min_stage)
+            self._category_stage_keys[category] = [self._min_stage(p) for p in rows]
+
+        self._by_min_stage = sorted(self.parts, key=self._min_stage)
+        self._stage_keys = [self._min_stage(p) for p in self._by_min_stage]
+
+        # Normalized filter columns, computed once per snapshot
+        self._facets: Dict[int, tuple] = {
+            id(part): (
+                (part.get("brand") or "").lower(),
+                (part.get("legal_status") or "").lower(),
+                {c.lower() for c in part.get("compatibility") or []},
+                price_bounds(part),
+                hp_gain(part),
+            )
+            for part in self.parts
+        }
+
+    @staticmethod
+    def _min_stage(part: dict) -> int:
+        # Column default is 1
+        value = part.get("min_stage")
+        return 1 if value is None else value
+
+    def _up_to_stage(self, rows: List[dict], keys: List[int], max_stage: Optional[int]) -> List[dict]:
+        if max_stage is None:
+            return rows
+        return rows[:bisect.bisect_right(keys, max_stage)]
+
+    def parts_for(
+        self,
+        category: Optional[str] = None,
+        max_stage: Optional[int] = None,
+        category_contains: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        Parts filtered like the former Supabase queries
+
+        Args:
+            category: exact category (eq)
+            max_stage: parts with min_stage <= max_stage (lte)
+            category_contains: case-insensitive substring of category (ilike %x%)
+            limit: max rows
+        """
+        if category is None and category_contains is None:
+            if max_stage is None:
+                rows = self.parts
+            else:
+                # Keep category order for the unfiltered listing
+                allowed = {id(p) for p in self._up_to_stage(self._by_min_stage, self._stage_keys, max_stage)}
+                rows = [p for p in self.parts if id(p) in allowed]
+        else:
+            if category is not None:
+                categories = [category] if category in self.by_category else []
+            else:
+                needle = category_contains.lower()
+                categories = sorted(c for c in self.by_category if needle in c.lower())
+            rows = []
+            for name in categories:
+                rows.extend(self._up_to_stage(self.by_category[name], self._category_stage_keys[name], max_stage))
+
+        return rows[:limit] if limit is not None else rows
+
+    def search_parts(
+        self,
+        category: Optional[str] = None,
+        max_stage: Optional[int] = None,
+        brands: Optional[Iterable[str]] = None,
+        legal_statuses: Optional[Iterable[str]] = None,
+        compatibility: Optional[Iterable[str]] = None,
+        price_min: Optional[int] = None,
+        price_max: Optional[int] = None,
+        hp_gain_min: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        parts_for() plus the /parts filters
+
+        Args:
+            brands / legal_statuses: any of these values (case-insensitive)
+            compatibility: compatible with all of these codes (compatibility @> ARRAY[...])
+            price_min / price_max: price range overlaps [price_min, price_max]
+            hp_gain_min: advertised hp gain (upper bound) of at least this
+        """
+        rows = self.parts_for(category=category, max_stage=max_stage)
+        brands, legal_statuses, compatibility = _lowered(brands), _lowered(legal_statuses), _lowered(compatibility)
+        if not any((brands, legal_statuses, compatibility)) and price_min is None \
+                and price_max is None and hp_gain_min is None:
+            return rows
+
+        matched = []
+        for part in rows:
+            brand, legal_status, compatible, (low, high), (_, hp_high) = self._facets[id(part)]
+            if brands and brand not in brands:
+                continue
+            if legal_statuses and legal_status not in legal_statuses:
+                continue
+            if compatibility and not compatibility <= compatible:
+                continue
+            if price_min is not None and (high is None or high < price_min):
+                continue
+            if price_max is not None and (low is None or low > price_max):
+                continue
+            if hp_gain_min is not None and (hp_high is None or hp_high < hp_gain_min):
+                continue
+            matched.append(part)
+        return matched
+
+    def stage(self, number: int) -> Optional[dict]:
+        return self.stages_by_number.get(number)
+
+
+class CatalogStore:
+    """Current snapshot, TTL refresh and change listeners"""
+
+    def __init__(self, ttl: float = CATALOG_TTL_SECONDS, client=None):
+        self.ttl = ttl
+        # Supabase client; None uses database.supabase_client on first refresh
+        self.client = client
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._listeners: List[Callable[[CatalogSnapshot], None]] = []
+        self._refresh_lock = threading.Lock()
+        self._stale = False
+        self._checked_at = 0.0
+        self.refreshes = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def on_change(self, listener: Callable[[CatalogSnapshot], None]):
+        """Call listener(snapshot) whenever a refresh changes the catalog content"""
+        self._listeners.append(listener)
+
+    def refresh(self, client=None) -> CatalogSnapshot:
+        """Reload both tables (blocking); the version only moves when content changes"""
+        client = client or self.client
+        if client is None:
+            from database.supabase_client import supabase as client
+
+        with self._refresh_lock:
+            start = time.monotonic()
+            # Cleared before fetching so an invalidate() during the fetch triggers another reload
+            self._stale = False
+            try:
+                parts = _fetch_all(client, "modification_catalog", "category")
+                stages = _fetch_all(client, "stage_presets", "stage")
+            except Exception as e:
+                self.last_error = str(e)[:200]
+                print(f"[CATALOG] Refresh failed: {e}")
+                raise
+
+            current = self._snapshot
+            snapshot = CatalogSnapshot(parts, stages, version=current.version if current else 0)
+            changed = current is None or snapshot.content_hash != current.content_hash
+            if changed:
+                snapshot.version += 1
+                self._snapshot = snapshot
+            else:
+                current.loaded_at = snapshot.loaded_at
+            self._checked_at = time.time()
+            self.refreshes += 1
+            self.last_error = None
+            print(f"[CATALOG] {len(parts)} parts, {len(stages)} stages, version {self._snapshot.version} "
+                  f"({'changed' if changed else 'unchanged'}) in {(time.monotonic() - start) * 1000:.0f} ms")
+
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener(self._snapshot)
+                except Exception as e:
+                    print(f"[CATALOG] Listener error: {e}")
+        return self._snapshot
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass
+
+    def invalidate(self):
+        """Mark the catalog stale; the next read starts a background reload"""
+        self._stale = True
+
+    def get(self) -> CatalogSnapshot:
+        """
+        Current snapshot (blocking load on first use)
+
+        Stale snapshots keep serving while a background thread reloads them.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh()
+
+        expired = self.ttl > 0 and time.time() - self._checked_at > self.ttl
+        if (expired or self._stale) and not self._refresh_lock.locked():
+            # Only one reader starts the reload
+            self._checked_at = time.time()
+            self._stale = False
+            threading.Thread(target=self._refresh_quietly, name="catalog-refresh", daemon=True).start()
+        return snapshot
+
+    def get_stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "version": snapshot.version if snapshot else None,
+            "content_hash": snapshot.content_hash[:16] if snapshot else None,
+            "parts": len(snapshot.parts) if snapshot else 0,
+            "stages": len(snapshot.stages) if snapshot else 0,
+            "age_seconds": round(time.time() - self._checked_at, 1) if snapshot else None,
+            "refreshes": self.refreshes,
+            "last_error": self.last_error,
+        }
+
+
+catalog = CatalogStore()
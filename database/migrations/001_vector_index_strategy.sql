@@ -0,0 +1,230 @@
+-- Migration 001: pgvector index strategy
+-- Run in the Supabase SQL Editor on databases created from the original schema.sql
+--
+-- The original ivfflat (lists = 100) indexes were created on empty tables, so
+-- their centroids were trained on nothing; with a few hundred rows that gives
+-- poor recall. This switches to HNSW (no training step), replaces the match_*
+-- functions with index-friendly versions that accept ef_search / probes, and
+-- adds rebuild_vector_indexes() for the seeding flow.
+
+DROP INDEX IF EXISTS freed_service_manuals_embedding_idx;
+DROP INDEX IF EXISTS freed_common_issues_embedding_idx;
+
+CREATE INDEX freed_service_manuals_embedding_idx ON freed_service_manuals USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX freed_common_issues_embedding_idx ON freed_common_issues USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+ANALYZE freed_service_manuals;
+ANALYZE freed_common_issues;
+
+-- Old signatures (without ef_search/probes) would otherwise remain as overloads
+DROP FUNCTION IF EXISTS match_service_manuals(vector, float, int);
+DROP FUNCTION IF EXISTS match_common_issues(vector, float, int);
+DROP FUNCTION IF EXISTS match_diagnostic_context(vector, float, int, float, int);
+
+-- Index search breadth for the current transaction (one RPC call)
+-- NULL keeps the server default (hnsw.ef_search = 40, ivfflat.probes = 1)
+CREATE OR REPLACE FUNCTION set_vector_search_params(
+    ef_search int DEFAULT NULL,
+    probes int DEFAULT NULL
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF ef_search IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+    END IF;
+    IF probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', probes::text, true);
+    END IF;
+END;
+$$;
+
+-- Function to search service manuals by semantic similarity
+-- The inner ORDER BY distance LIMIT is the shape the vector index serves;
+-- the threshold filters those candidates, and the distance is computed once
+CREATE OR REPLACE FUNCTION match_service_manuals(
+    query_embedding vector(384),
+    match_threshold float DEFAULT 0.5,
+    match_count int DEFAULT 5,
+    ef_search int DEFAULT NULL,
+    probes int DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    section TEXT,
+    subsection TEXT,
+    content TEXT,
+    tags TEXT[],
+    similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM set_vector_search_params(ef_search, probes);
+
+    RETURN QUERY
+    SELECT
+        m.id,
+        m.section,
+        m.subsection,
+        m.content,
+        m.tags,
+        1 - m.distance AS similarity
+    FROM (
+        SELECT
+            fsm.id,
+            fsm.section,
+            fsm.subsection,
+            fsm.content,
+            fsm.tags,
+            fsm.embedding <=> query_embedding AS distance
+        FROM freed_service_manuals fsm
+        ORDER BY fsm.embedding <=> query_embedding
+        LIMIT match_count
+    ) m
+    WHERE 1 - m.distance > match_threshold
+    ORDER BY m.distance;
+END;
+$$;
+
+-- Function to search common issues by semantic similarity
+CREATE OR REPLACE FUNCTION match_common_issues(
+    query_embedding vector(384),
+    match_threshold float DEFAULT 0.5,
+    match_count int DEFAULT 3,
+    ef_search int DEFAULT NULL,
+    probes int DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    symptom TEXT,
+    symptom_detail TEXT,
+    probable_cause TEXT[],
+    diagnostic_steps TEXT[],
+    part_codes TEXT[],
+    cost_estimate_idr JSONB,
+    urgency TEXT,
+    similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM set_vector_search_params(ef_search, probes);
+
+    RETURN QUERY
+    SELECT
+        i.id,
+        i.symptom,
+        i.symptom_detail,
+        i.probable_cause,
+        i.diagnostic_steps,
+        i.part_codes,
+        i.cost_estimate_idr,
+        i.urgency,
+        1 - i.distance AS similarity
+    FROM (
+        SELECT
+            fci.id,
+            fci.symptom,
+            fci.symptom_detail,
+            fci.probable_cause,
+            fci.diagnostic_steps,
+            fci.part_codes,
+            fci.cost_estimate_idr,
+            fci.urgency,
+            fci.embedding <=> query_embedding AS distance
+        FROM freed_common_issues fci
+        ORDER BY fci.embedding <=> query_embedding
+        LIMIT match_count
+    ) i
+    WHERE 1 - i.distance > match_threshold
+    ORDER BY i.distance;
+END;
+$$;
+
+-- Manuals and common issues for one query embedding in a single round-trip
+-- Returns {"manuals": [...], "issues": [...]} with the same columns as the
+-- two functions above, each ordered by similarity
+CREATE OR REPLACE FUNCTION match_diagnostic_context(
+    query_embedding vector(384),
+    manual_threshold float DEFAULT 0.5,
+    manual_count int DEFAULT 5,
+    issue_threshold float DEFAULT 0.5,
+    issue_count int DEFAULT 3,
+    ef_search int DEFAULT NULL,
+    probes int DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM set_vector_search_params(ef_search, probes);
+
+    RETURN jsonb_build_object(
+        'manuals', COALESCE((
+            SELECT jsonb_agg(to_jsonb(m) ORDER BY m.similarity DESC)
+            FROM match_service_manuals(query_embedding, manual_threshold, manual_count) m
+        ), '[]'::jsonb),
+        'issues', COALESCE((
+            SELECT jsonb_agg(to_jsonb(i) ORDER BY i.similarity DESC)
+            FROM match_common_issues(query_embedding, issue_threshold, issue_count) i
+        ), '[]'::jsonb)
+    );
+END;
+$$;
+
+-- (Re)build the embedding indexes on the data actually present, then ANALYZE
+-- Run after seeding: IVFFlat centroids are trained at build time, and fresh
+-- statistics let the planner cost the index correctly. Returns rows/method per table.
+CREATE OR REPLACE FUNCTION rebuild_vector_indexes(method text DEFAULT 'hnsw')
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, extensions
+AS $$
+DECLARE
+    tbl text;
+    row_count bigint;
+    lists int;
+    result jsonb := '{}'::jsonb;
+BEGIN
+    IF method NOT IN ('hnsw', 'ivfflat') THEN
+        RAISE EXCEPTION 'method must be hnsw or ivfflat, got %', method;
+    END IF;
+
+    FOREACH tbl IN ARRAY ARRAY['freed_service_manuals', 'freed_common_issues'] LOOP
+        EXECUTE format('SELECT count(*) FROM %I', tbl) INTO row_count;
+        EXECUTE format('DROP INDEX IF EXISTS %I', tbl || '_embedding_idx');
+
+        IF method = 'hnsw' THEN
+            EXECUTE format(
+                'CREATE INDEX %I ON %I USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)',
+                tbl || '_embedding_idx', tbl
+            );
+            result := result || jsonb_build_object(tbl, jsonb_build_object('rows', row_count, 'method', method));
+        ELSE
+            -- pgvector guidance: rows / 1000 lists (at least 1) up to 1M rows
+            lists := GREATEST(1, (row_count / 1000)::int);
+            EXECUTE format(
+                'CREATE INDEX %I ON %I USING ivfflat (embedding vector_cosine_ops) WITH (lists = %s)',
+                tbl || '_embedding_idx', tbl, lists
+            );
+            result := result || jsonb_build_object(tbl, jsonb_build_object('rows', row_count, 'method', method, 'lists', lists));
+        END IF;
+
+        EXECUTE format('ANALYZE %I', tbl);
+    END LOOP;
+
+    RETURN result;
+END;
+$$;
+
+-- Index maintenance is for the service role (seeding), not API clients
+REVOKE ALL ON FUNCTION rebuild_vector_indexes(text) FROM PUBLIC;
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+        REVOKE ALL ON FUNCTION rebuild_vector_indexes(text) FROM anon, authenticated;
+    END IF;
+END $$;
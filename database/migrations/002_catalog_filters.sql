@@ -0,0 +1,24 @@
+-- Migration 002: /parts filter columns and indexes
+-- Run in the Supabase SQL Editor on databases created before this migration
+--
+-- Adds generated columns for the price range and parsed HP gain so parts
+-- can be filtered and sorted server-side (PostgREST: price_min_idr=lte.5000000,
+-- hp_gain_max=gte.10, compatibility=cs.{GB3}), plus indexes for every /parts filter.
+
+ALTER TABLE modification_catalog
+    ADD COLUMN IF NOT EXISTS price_min_idr BIGINT GENERATED ALWAYS AS ((price_range_idr->>'min')::bigint) STORED,
+    ADD COLUMN IF NOT EXISTS price_max_idr BIGINT GENERATED ALWAYS AS ((price_range_idr->>'max')::bigint) STORED,
+    ADD COLUMN IF NOT EXISTS hp_gain_min INTEGER GENERATED ALWAYS AS (substring(performance_gain->>'hp' FROM '^\+(\d+)')::int) STORED,
+    ADD COLUMN IF NOT EXISTS hp_gain_max INTEGER GENERATED ALWAYS AS (
+        COALESCE(substring(performance_gain->>'hp' FROM '^\+\d+-(\d+)'), substring(performance_gain->>'hp' FROM '^\+(\d+)'))::int
+    ) STORED;
+
+DROP INDEX IF EXISTS modification_catalog_category_idx;
+CREATE INDEX IF NOT EXISTS modification_catalog_category_min_stage_idx ON modification_catalog (category, min_stage);
+CREATE INDEX IF NOT EXISTS modification_catalog_lower_idx ON modification_catalog (lower(brand));
+CREATE INDEX IF NOT EXISTS modification_catalog_legal_status_idx ON modification_catalog (legal_status);
+CREATE INDEX IF NOT EXISTS modification_catalog_compatibility_idx ON modification_catalog USING gin (compatibility);
+CREATE INDEX IF NOT EXISTS modification_catalog_price_min_idr_price_max_idr_idx ON modification_catalog (price_min_idr, price_max_idr);
+CREATE INDEX IF NOT EXISTS modification_catalog_hp_gain_max_idx ON modification_catalog (hp_gain_max);
+
+ANALYZE modification_catalog;
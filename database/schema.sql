@@ -18,7 +18,9 @@ CREATE TABLE freed_service_manuals (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
-CREATE INDEX ON freed_service_manuals USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+-- HNSW needs no training data, so it is valid on the empty table;
+-- seed_data.py rebuilds it and runs ANALYZE after inserting rows
+CREATE INDEX freed_service_manuals_embedding_idx ON freed_service_manuals USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
 
 -- ============================================
 -- COMMON ISSUES TABLE (Vector Search)
@@ -37,7 +39,7 @@ CREATE TABLE freed_common_issues (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
-CREATE INDEX ON freed_common_issues USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+CREATE INDEX freed_common_issues_embedding_idx ON freed_common_issues USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
 
 -- ============================================
 -- MODIFICATION CATALOG TABLE
@@ -57,11 +59,24 @@ CREATE TABLE modification_catalog (
     legal_status TEXT DEFAULT 'Street Legal',  -- Street Legal, Track Only, Gray Area
     compatibility TEXT[],  -- ["GB3", "GB4", "L15A"]
     notes TEXT,
-    created_at TIMESTAMPTZ DEFAULT NOW()
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    -- Filter columns for /parts (kept in sync with database/catalog.py)
+    price_min_idr BIGINT GENERATED ALWAYS AS ((price_range_idr->>'min')::bigint) STORED,
+    price_max_idr BIGINT GENERATED ALWAYS AS ((price_range_idr->>'max')::bigint) STORED,
+    -- "+5-8" -> 5 / 8; descriptive values ("Supports +80 HP builds") stay NULL
+    hp_gain_min INTEGER GENERATED ALWAYS AS (substring(performance_gain->>'hp' FROM '^\+(\d+)')::int) STORED,
+    hp_gain_max INTEGER GENERATED ALWAYS AS (
+        COALESCE(substring(performance_gain->>'hp' FROM '^\+\d+-(\d+)'), substring(performance_gain->>'hp' FROM '^\+(\d+)'))::int
+    ) STORED
 );
 
-CREATE INDEX ON modification_catalog (category);
+CREATE INDEX ON modification_catalog (category, min_stage);
 CREATE INDEX ON modification_catalog (min_stage);
+CREATE INDEX ON modification_catalog (lower(brand));
+CREATE INDEX ON modification_catalog (legal_status);
+CREATE INDEX ON modification_catalog USING gin (compatibility);
+CREATE INDEX ON modification_catalog (price_min_idr, price_max_idr);
+CREATE INDEX ON modification_catalog (hp_gain_max);
 
 -- ============================================
 -- STAGE PRESETS TABLE
@@ -103,11 +118,39 @@ CREATE INDEX ON workshops (city);
 -- VECTOR SEARCH FUNCTIONS
 -- ============================================
 
+-- Old signatures (without ef_search/probes) would otherwise remain as overloads
+DROP FUNCTION IF EXISTS match_service_manuals(vector, float, int);
+DROP FUNCTION IF EXISTS match_common_issues(vector, float, int);
+DROP FUNCTION IF EXISTS match_diagnostic_context(vector, float, int, float, int);
+
+-- Index search breadth for the current transaction (one RPC call)
+-- NULL keeps the server default (hnsw.ef_search = 40, ivfflat.probes = 1)
+CREATE OR REPLACE FUNCTION set_vector_search_params(
+    ef_search int DEFAULT NULL,
+    probes int DEFAULT NULL
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF ef_search IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+    END IF;
+    IF probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', probes::text, true);
+    END IF;
+END;
+$$;
+
 -- Function to search service manuals by semantic similarity
+-- The inner ORDER BY distance LIMIT is the shape the vector index serves;
+-- the threshold filters those candidates, and the distance is computed once
 CREATE OR REPLACE FUNCTION match_service_manuals(
     query_embedding vector(384),
     match_threshold float DEFAULT 0.5,
-    match_count int DEFAULT 5
+    match_count int DEFAULT 5,
+    ef_search int DEFAULT NULL,
+    probes int DEFAULT NULL
 )
 RETURNS TABLE (
     id UUID,
@@ -120,18 +163,30 @@ RETURNS TABLE (
 LANGUAGE plpgsql
 AS $$
 BEGIN
+    PERFORM set_vector_search_params(ef_search, probes);
+
     RETURN QUERY
     SELECT
-        fsm.id,
-        fsm.section,
-        fsm.subsection,
-        fsm.content,
-        fsm.tags,
-        1 - (fsm.embedding <=> query_embedding) AS similarity
-    FROM freed_service_manuals fsm
-    WHERE 1 - (fsm.embedding <=> query_embedding) > match_threshold
-    ORDER BY fsm.embedding <=> query_embedding
-    LIMIT match_count;
+        m.id,
+        m.section,
+        m.subsection,
+        m.content,
+        m.tags,
+        1 - m.distance AS similarity
+    FROM (
+        SELECT
+            fsm.id,
+            fsm.section,
+            fsm.subsection,
+            fsm.content,
+            fsm.tags,
+            fsm.embedding <=> query_embedding AS distance
+        FROM freed_service_manuals fsm
+        ORDER BY fsm.embedding <=> query_embedding
+        LIMIT match_count
+    ) m
+    WHERE 1 - m.distance > match_threshold
+    ORDER BY m.distance;
 END;
 $$;
 
@@ -139,7 +194,9 @@ $$;
 CREATE OR REPLACE FUNCTION match_common_issues(
     query_embedding vector(384),
     match_threshold float DEFAULT 0.5,
-    match_count int DEFAULT 3
+    match_count int DEFAULT 3,
+    ef_search int DEFAULT NULL,
+    probes int DEFAULT NULL
 )
 RETURNS TABLE (
     id UUID,
@@ -155,24 +212,125 @@ RETURNS TABLE (
 LANGUAGE plpgsql
 AS $$
 BEGIN
+    PERFORM set_vector_search_params(ef_search, probes);
+
     RETURN QUERY
     SELECT
-        fci.id,
-        fci.symptom,
-        fci.symptom_detail,
-        fci.probable_cause,
-        fci.diagnostic_steps,
-        fci.part_codes,
-        fci.cost_estimate_idr,
-        fci.urgency,
-        1 - (fci.embedding <=> query_embedding) AS similarity
-    FROM freed_common_issues fci
-    WHERE 1 - (fci.embedding <=> query_embedding) > match_threshold
-    ORDER BY fci.embedding <=> query_embedding
-    LIMIT match_count;
+        i.id,
+        i.symptom,
+        i.symptom_detail,
+        i.probable_cause,
+        i.diagnostic_steps,
+        i.part_codes,
+        i.cost_estimate_idr,
+        i.urgency,
+        1 - i.distance AS similarity
+    FROM (
+        SELECT
+            fci.id,
+            fci.symptom,
+            fci.symptom_detail,
+            fci.probable_cause,
+            fci.diagnostic_steps,
+            fci.part_codes,
+            fci.cost_estimate_idr,
+            fci.urgency,
+            fci.embedding <=> query_embedding AS distance
+        FROM freed_common_issues fci
+        ORDER BY fci.embedding <=> query_embedding
+        LIMIT match_count
+    ) i
+    WHERE 1 - i.distance > match_threshold
+    ORDER BY i.distance;
+END;
+$$;
+
+-- Manuals and common issues for one query embedding in a single round-trip
+-- Returns {"manuals": [...], "issues": [...]} with the same columns as the
+-- two functions above, each ordered by similarity
+CREATE OR REPLACE FUNCTION match_diagnostic_context(
+    query_embedding vector(384),
+    manual_threshold float DEFAULT 0.5,
+    manual_count int DEFAULT 5,
+    issue_threshold float DEFAULT 0.5,
+    issue_count int DEFAULT 3,
+    ef_search int DEFAULT NULL,
+    probes int DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM set_vector_search_params(ef_search, probes);
+
+    RETURN jsonb_build_object(
+        'manuals', COALESCE((
+            SELECT jsonb_agg(to_jsonb(m) ORDER BY m.similarity DESC)
+            FROM match_service_manuals(query_embedding, manual_threshold, manual_count) m
+        ), '[]'::jsonb),
+        'issues', COALESCE((
+            SELECT jsonb_agg(to_jsonb(i) ORDER BY i.similarity DESC)
+            FROM match_common_issues(query_embedding, issue_threshold, issue_count) i
+        ), '[]'::jsonb)
+    );
+END;
+$$;
+
+-- (Re)build the embedding indexes on the data actually present, then ANALYZE
+-- Run after seeding: IVFFlat centroids are trained at build time, and fresh
+-- statistics let the planner cost the index correctly. Returns rows/method per table.
+CREATE OR REPLACE FUNCTION rebuild_vector_indexes(method text DEFAULT 'hnsw')
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, extensions
+AS $$
+DECLARE
+    tbl text;
+    row_count bigint;
+    lists int;
+    result jsonb := '{}'::jsonb;
+BEGIN
+    IF method NOT IN ('hnsw', 'ivfflat') THEN
+        RAISE EXCEPTION 'method must be hnsw or ivfflat, got %', method;
+    END IF;
+
+    FOREACH tbl IN ARRAY ARRAY['freed_service_manuals', 'freed_common_issues'] LOOP
+        EXECUTE format('SELECT count(*) FROM %I', tbl) INTO row_count;
+        EXECUTE format('DROP INDEX IF EXISTS %I', tbl || '_embedding_idx');
+
+        IF method = 'hnsw' THEN
+            EXECUTE format(
+                'CREATE INDEX %I ON %I USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)',
+                tbl || '_embedding_idx', tbl
+            );
+            result := result || jsonb_build_object(tbl, jsonb_build_object('rows', row_count, 'method', method));
+        ELSE
+            -- pgvector guidance: rows / 1000 lists (at least 1) up to 1M rows
+            lists := GREATEST(1, (row_count / 1000)::int);
+            EXECUTE format(
+                'CREATE INDEX %I ON %I USING ivfflat (embedding vector_cosine_ops) WITH (lists = %s)',
+                tbl || '_embedding_idx', tbl, lists
+            );
+            result := result || jsonb_build_object(tbl, jsonb_build_object('rows', row_count, 'method', method, 'lists', lists));
+        END IF;
+
+        EXECUTE format('ANALYZE %I', tbl);
+    END LOOP;
+
+    RETURN result;
 END;
 $$;
 
+-- Index maintenance is for the service role (seeding), not API clients
+REVOKE ALL ON FUNCTION rebuild_vector_indexes(text) FROM PUBLIC;
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+        REVOKE ALL ON FUNCTION rebuild_vector_indexes(text) FROM anon, authenticated;
+    END IF;
+END $$;
+
 -- ============================================
 -- INITIAL STAGE PRESETS DATA
 -- ============================================
@@ -1,4 +1,5 @@
 import os
+from typing import Sequence
 from supabase import create_client
 from dotenv import load_dotenv
 
@@ -8,3 +9,67 @@ supabase = create_client(
     os.getenv("SUPABASE_URL"),
     os.getenv("SUPABASE_KEY")
 )
+
+# Optional per-call pgvector search breadth (hnsw.ef_search / ivfflat.probes);
+# unset keeps the server defaults and the RPC payload unchanged
+PGVECTOR_EF_SEARCH = os.getenv("PGVECTOR_EF_SEARCH")
+PGVECTOR_PROBES = os.getenv("PGVECTOR_PROBES")
+
+
+def vector_search_params() -> dict:
+    """Extra match_* RPC arguments for the configured index search breadth"""
+    params = {}
+    if PGVECTOR_EF_SEARCH:
+        params["ef_search"] = int(PGVECTOR_EF_SEARCH)
+    if PGVECTOR_PROBES:
+        params["probes"] = int(PGVECTOR_PROBES)
+    return params
+
+
+def to_vector_literal(embedding: Sequence[float]) -> str:
+    """
+    pgvector text literal for an embedding
+
+    9 significant digits round-trip float32 exactly (pgvector stores float32)
+    and are about half the size of Python's float64 JSON repr.
+    """
+    return "[" + ",".join(format(float(x), ".9g") for x in embedding) + "]"
+
+
+def match_diagnostic_context(
+    query_embedding: Sequence[float],
+    manual_threshold: float = 0.5,
+    manual_count: int = 5,
+    issue_threshold: float = 0.5,
+    issue_count: int = 3
+) -> dict:
+    """
+    Top manuals and common issues for one query in a single RPC
+
+    Returns:
+        {"manuals": [...], "issues": [...]} (see match_diagnostic_context in schema.sql)
+    """
+    result = supabase.rpc(
+        'match_diagnostic_context',
+        {
+            'query_embedding': to_vector_literal(query_embedding),
+            'manual_threshold': manual_threshold,
+            'manual_count': manual_count,
+            'issue_threshold': issue_threshold,
+            'issue_count': issue_count,
+            **vector_search_params()
+        }
+    ).execute()
+
+    data = result.data or {}
+    return {"manuals": data.get("manuals") or [], "issues": data.get("issues") or []}
+
+
+def rebuild_vector_indexes(method: str = "hnsw") -> dict:
+    """
+    Rebuild the embedding indexes on the current rows and ANALYZE (after seeding)
+
+    Requires the service role key; see rebuild_vector_indexes in schema.sql.
+    """
+    result = supabase.rpc('rebuild_vector_indexes', {'method': method}).execute()
+    return result.data or {}
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - In-Process Vector Index
+Service manuals and common issues held as contiguous NumPy matrices for
+local top-k cosine search, with the same match_threshold / match_count
+semantics as the match_* SQL functions. Callers fall back to the RPC path
+while the index is not loaded.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+# float16 halves memory; scores differ from float32 by ~1e-3
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+# Reload from Supabase when the index is older than this; 0 disables periodic refresh
+VECTOR_INDEX_REFRESH_SECONDS = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "600"))
+
+PAGE_SIZE = 1000  # PostgREST default max rows per request
+
+MANUAL_COLUMNS = ["id", "section", "subsection", "content", "tags"]
+ISSUE_COLUMNS = [
+    "id", "symptom", "symptom_detail", "probable_cause", "diagnostic_steps",
+    "part_codes", "cost_estimate_idr", "urgency"
+]
+
+
+def _parse_embedding(value) -> Optional[np.ndarray]:
+    """pgvector columns arrive from PostgREST as '[0.1,...]' strings"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+class VectorIndex:
+    """Row metadata plus an L2-normalized embedding matrix for one table"""
+
+    def __init__(self, table: str, columns: List[str], dtype: str = VECTOR_INDEX_DTYPE):
+        self.table = table
+        self.columns = columns
+        self.dtype = np.dtype(dtype)
+        # (row metadata, matrix), replaced as one object so readers never mix two loads
+        self._data: Tuple[List[dict], Optional[np.ndarray]] = ([], None)
+
+    def load(self, rows: List[dict]):
+        """Build the matrix from rows carrying an 'embedding' field"""
+        metadata, vectors = [], []
+        for row in rows:
+            vector = _parse_embedding(row.get("embedding"))
+            if vector is None:
+                continue
+            vectors.append(vector)
+            metadata.append({column: row.get(column) for column in self.columns})
+
+        if vectors:
+            matrix = np.vstack(vectors)
+            matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+            matrix = np.ascontiguousarray(matrix, dtype=self.dtype)
+        else:
+            matrix = np.zeros((0, 0), dtype=self.dtype)
+
+        # Single assignment; searches in flight keep the old pair
+        self._data = (metadata, matrix)
+
+    def fetch(self, client) -> List[dict]:
+        """All rows of the table, paged"""
+        rows = []
+        select = ",".join(self.columns + ["embedding"])
+        while True:
+            page = client.table(self.table).select(select).order("id").range(len(rows), len(rows) + PAGE_SIZE - 1).execute()
+            rows.extend(page.data or [])
+            if len(page.data or []) < PAGE_SIZE:
+                return rows
+
+    def search(self, query_embedding, match_threshold: float = 0.5, match_count: int = 5) -> List[dict]:
+        """
+        Top match_count rows with cosine similarity > match_threshold
+
+        Returns rows shaped like the match_* RPC results, best first.
+        """
+        rows, matrix = self._data
+        if matrix is None or not rows or match_count <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = (matrix @ query.astype(self.dtype)).astype(np.float32)
+
+        k = min(match_count, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**rows[i], "similarity": float(scores[i])}
+            for i in top if scores[i] > match_threshold
+        ]
+
+    @property
+    def rows(self) -> List[dict]:
+        return self._data[0]
+
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        return self._data[1]
+
+    @property
+    def size(self) -> int:
+        return len(self._data[0])
+
+
+class LocalRetrieval:
+    """Both diagnostic indexes, refreshed together"""
+
+    def __init__(self, refresh_seconds: float = VECTOR_INDEX_REFRESH_SECONDS):
+        self.manuals = VectorIndex("freed_service_manuals", MANUAL_COLUMNS)
+        self.issues = VectorIndex("freed_common_issues", ISSUE_COLUMNS)
+        self.refresh_seconds = refresh_seconds
+        self.loaded_at: Optional[float] = None
+        self.refreshes = 0
+        self.last_error: Optional[str] = None
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    def refresh(self, client=None):
+        """Reload both tables from Supabase (blocking)"""
+        if client is None:
+            from database.supabase_client import supabase as client
+
+        with self._refresh_lock:
+            start = time.monotonic()
+            try:
+                manual_rows = self.manuals.fetch(client)
+                issue_rows = self.issues.fetch(client)
+            except Exception as e:
+                self.last_error = str(e)[:200]
+                print(f"[INDEX] Refresh failed: {e}")
+                raise
+            self.manuals.load(manual_rows)
+            self.issues.load(issue_rows)
+            self.loaded_at = time.time()
+            self.refreshes += 1
+            self.last_error = None
+            print(f"[INDEX] Loaded {self.manuals.size} manuals, {self.issues.size} issues "
+                  f"in {(time.monotonic() - start) * 1000:.0f} ms")
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass
+
+    def maybe_refresh(self):
+        """Start a background reload when the index is stale; searches keep using the old data"""
+        if not self.ready or self.refresh_seconds <= 0:
+            return
+        if time.time() - self.loaded_at < self.refresh_seconds or self._refresh_lock.locked():
+            return
+        # Push loaded_at forward so only one caller starts the reload
+        self.loaded_at = time.time()
+        threading.Thread(target=self._refresh_quietly, name="vector-index-refresh", daemon=True).start()
+
+    def search_context(
+        self,
+        query_embedding,
+        manual_threshold: float = 0.5,
+        manual_count: int = 5,
+        issue_threshold: float = 0.5,
+        issue_count: int = 3
+    ) -> Dict[str, List[dict]]:
+        """Same result shape as database.supabase_client.match_diagnostic_context"""
+        return {
+            "manuals": self.manuals.search(query_embedding, manual_threshold, manual_count),
+            "issues": self.issues.search(query_embedding, issue_threshold, issue_count),
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": VECTOR_INDEX_ENABLED,
+            "ready": self.ready,
+            "dtype": self.manuals.dtype.name,
+            "manuals": self.manuals.size,
+            "issues": self.issues.size,
+            "age_seconds": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            "refreshes": self.refreshes,
+            "last_error": self.last_error,
+        }
+
+
+vector_index = LocalRetrieval()
+
+
+def get_local_index() -> Optional[LocalRetrieval]:
+    """The loaded local index, or None when disabled or not loaded yet (use the RPC)"""
+    if VECTOR_INDEX_ENABLED and vector_index.ready:
+        vector_index.maybe_refresh()
+        return vector_index
+    return None
@@ -1,5 +1,59 @@
 import { useState, useRef, useEffect } from 'react'
 
+// Parse a Server-Sent Events body (fetch + ReadableStream, since EventSource cannot POST)
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+
+      let event = 'message'
+      let data = ''
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) data += line.slice(5).trim()
+      }
+      if (data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
+// Client-side compression before upload (the server re-normalizes anyway)
+const MAX_IMAGE_EDGE = 1280
+const JPEG_QUALITY = 0.85
+
+const compressImage = async (file) => {
+  try {
+    const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' })
+    const scale = Math.min(1, MAX_IMAGE_EDGE / Math.max(bitmap.width, bitmap.height))
+    const canvas = document.createElement('canvas')
+    canvas.width = Math.round(bitmap.width * scale)
+    canvas.height = Math.round(bitmap.height * scale)
+
+    const ctx = canvas.getContext('2d')
+    // JPEG has no alpha; flatten transparent PNGs onto white
+    ctx.fillStyle = '#fff'
+    ctx.fillRect(0, 0, canvas.width, canvas.height)
+    ctx.drawImage(bitmap, 0, 0, canvas.width, canvas.height)
+    bitmap.close()
+
+    const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', JPEG_QUALITY))
+    return blob && blob.size < file.size ? blob : file
+  } catch (error) {
+    // e.g. HEIC outside Safari: send as-is and let the server decide
+    return file
+  }
+}
+
 const ChatWidget = ({ isOpen, onToggle }) => {
   const [messages, setMessages] = useState([
     {
@@ -10,6 +64,7 @@ const ChatWidget = ({ isOpen, onToggle }) => {
   ])
   const [inputText, setInputText] = useState('')
   const [isLoading, setIsLoading] = useState(false)
+  const [streamingId, setStreamingId] = useState(null)
   const [selectedImage, setSelectedImage] = useState(null)
   const [imagePreview, setImagePreview] = useState(null)
   const messagesEndRef = useRef(null)
@@ -40,8 +95,9 @@ const ChatWidget = ({ isOpen, onToggle }) => {
   const handleImageSelect = (e) => {
     const file = e.target.files[0]
     if (file) {
-      if (file.size > 5 * 1024 * 1024) {
-        alert('Ukuran file maksimal 5MB')
+      // Compressed before upload, so only absurd originals are refused here
+      if (file.size > 20 * 1024 * 1024) {
+        alert('Ukuran file maksimal 20MB')
         return
       }
       setSelectedImage(file)
@@ -61,6 +117,54 @@ const ChatWidget = ({ isOpen, onToggle }) => {
     }
   }
 
+  const updateBotMessage = (id, update) => {
+    setMessages(prev => prev.map(m => (m.id === id ? { ...m, text: update(m.text) } : m)))
+  }
+
+  // Stream a text reply: header, tokens and footer render as they arrive
+  const streamMessage = async (apiUrl, messageText) => {
+    const response = await fetch(`${apiUrl}/process/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+        'Authorization': `Bearer ${import.meta.env.VITE_API_SECRET || ''}`
+      },
+      body: JSON.stringify({
+        user_id: 'web-' + Date.now(),
+        message: messageText
+      })
+    })
+
+    if (!response.ok || !response.body) {
+      throw new Error('API request failed')
+    }
+
+    const botId = Date.now() + 1
+    let started = false
+    const ensureStarted = () => {
+      if (started) return
+      started = true
+      setMessages(prev => [...prev, { id: botId, type: 'bot', text: '' }])
+      setStreamingId(botId)
+    }
+
+    await readEventStream(response, (event, data) => {
+      if (event === 'header' || event === 'token' || event === 'footer') {
+        ensureStarted()
+        updateBotMessage(botId, text => text + data.text)
+      } else if (event === 'done' || event === 'error') {
+        // Final text is authoritative (also covers cached and canned replies)
+        ensureStarted()
+        updateBotMessage(botId, () => data.response)
+      }
+    })
+
+    if (!started) {
+      throw new Error('Empty stream')
+    }
+  }
+
   const sendMessage = async () => {
     if ((!inputText.trim() && !selectedImage) || isLoading) return
 
@@ -73,7 +177,7 @@ const ChatWidget = ({ isOpen, onToggle }) => {
 
     setMessages(prev => [...prev, userMessage])
     const messageText = inputText
-    const imageData = imagePreview
+    const imageFile = selectedImage
     setInputText('')
     clearImage()
     setIsLoading(true)
@@ -81,36 +185,26 @@ const ChatWidget = ({ isOpen, onToggle }) => {
     try {
       const apiUrl = import.meta.env.VITE_API_URL || '/api'
 
-      let response
-      if (imageData) {
-        // Send with image
-        response = await fetch(`${apiUrl}/process-image`, {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${import.meta.env.VITE_API_SECRET || ''}`
-          },
-          body: JSON.stringify({
-            user_id: 'web-' + Date.now(),
-            message: messageText || 'Tolong diagnosa masalah dari gambar ini',
-            image_base64: imageData.split(',')[1]
-          })
-        })
-      } else {
-        // Send text only
-        response = await fetch(`${apiUrl}/process`, {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${import.meta.env.VITE_API_SECRET || ''}`
-          },
-          body: JSON.stringify({
-            user_id: 'web-' + Date.now(),
-            message: messageText
-          })
-        })
+      if (!imageFile) {
+        await streamMessage(apiUrl, messageText)
+        return
       }
 
+      // Send with image: compressed binary as multipart (no base64 inflation)
+      const form = new FormData()
+      const upload = await compressImage(imageFile)
+      form.append('image', upload, upload.name || 'image.jpg')
+      form.append('user_id', 'web-' + Date.now())
+      form.append('message', messageText || 'Tolong diagnosa masalah dari gambar ini')
+
+      const response = await fetch(`${apiUrl}/process-image/upload`, {
+        method: 'POST',
+        headers: {
+          'Authorization': `Bearer ${import.meta.env.VITE_API_SECRET || ''}`
+        },
+        body: form
+      })
+
       if (!response.ok) {
         throw new Error('API request failed')
       }
@@ -134,6 +228,7 @@ const ChatWidget = ({ isOpen, onToggle }) => {
       setMessages(prev => [...prev, errorMessage])
     } finally {
       setIsLoading(false)
+      setStreamingId(null)
     }
   }
 
@@ -222,8 +317,8 @@ const ChatWidget = ({ isOpen, onToggle }) => {
             </div>
           ))}
 
-          {/* Typing Indicator */}
-          {isLoading && (
+          {/* Typing Indicator (until the first streamed text arrives) */}
+          {isLoading && !streamingId && (
             <div className="flex justify-start">
               <div className="bg-white rounded-2xl rounded-bl-md px-4 py-3 shadow-sm">
                 <div className="flex gap-1">
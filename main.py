@@ -4,23 +4,60 @@ Honda Freed Superchatbot - Main API Entry Point
 FastAPI application with routing to diagnostic and modification agents
 """
 import re
-import httpx
-from fastapi import FastAPI, HTTPException, Header, Request
+import json
+import importlib
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Any
+from typing import Optional, Any, AsyncIterator
 import os
 from dotenv import load_dotenv
 
+from agents import context_packer, fast_answer, image_preprocess, parts_optimizer
+from agents.embeddings import batcher as embedding_batcher, embedding_cache
+from agents.image_cache import get_image_cache
+from agents.stage_plans import get_stage_plans
+from agents.keywords import analyze_message
+from agents.response_cache import get_response_cache
+from database.catalog import catalog, check_fields, decode_cursor, paginate, project
+from database.vector_index import VECTOR_INDEX_ENABLED, vector_index
+from services import executor, rate_limit, waha_client
+from services.http_cache import (
+    DocumentCache, document_response, etag_matches, make_etag, not_modified_response
+)
+from services.job_queue import JobQueue, WebhookJob
+from services.readiness import readiness
+from services.uploads import read_multipart
+
 load_dotenv()
 
 WAHA_URL = os.getenv("WAHA_URL")
 WAHA_API_KEY = os.getenv("WAHA_API_KEY")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown"""
+    # Sync graph nodes offloaded by ainvoke share the bounded agent pool
+    executor.install()
+    await webhook_queue.start()
+    # Models, graphs and clients load in the background; /ready gates traffic
+    warmup_task = readiness.start_background()
+    yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    await webhook_queue.stop()
+    await waha_client.close()
+    executor.shutdown()
+
+
 app = FastAPI(
     title="Honda Freed Superchatbot API",
     version="1.0.0",
-    description="Agentic RAG system untuk komunitas Honda Freed Indonesia"
+    description="Agentic RAG system untuk komunitas Honda Freed Indonesia",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -52,6 +89,7 @@ class MessageResponse(BaseModel):
 def detect_intent(message: str) -> str:
     """
     Detect user intent from message to route to appropriate agent
+    (single-pass keyword scan, see agents.keywords)
 
     Returns:
         'diagnostic' - for car problems/issues
@@ -61,51 +99,7 @@ def detect_intent(message: str) -> str:
         'help' - for help/info requests
         'greeting' - for greetings
     """
-    message_lower = message.lower()
-
-    # Greeting patterns
-    greeting_patterns = ["halo", "helo", "hai", "hi", "hello", "selamat", "pagi", "siang", "sore", "malam"]
-    if any(g in message_lower for g in greeting_patterns) and len(message_lower) < 30:
-        return "greeting"
-
-    # Stage-specific requests
-    if re.search(r'stage\s*[123]', message_lower):
-        return "stage"
-
-    # Modification keywords
-    mod_keywords = [
-        "modif", "modifikasi", "upgrade", "ganti", "pasang",
-        "turbo", "supercharger", "exhaust", "intake", "header",
-        "coilover", "velg", "rem", "brake", "suspension",
-        "stage", "tune", "ecu", "hondata", "bodykit", "aero"
-    ]
-    if any(kw in message_lower for kw in mod_keywords):
-        return "modification"
-
-    # Workshop keywords
-    bengkel_keywords = ["bengkel", "workshop", "servis", "service", "lokasi", "alamat", "rekomendasi bengkel"]
-    if any(kw in message_lower for kw in bengkel_keywords):
-        return "bengkel"
-
-    # Diagnostic keywords (problems/issues)
-    diagnostic_keywords = [
-        "masalah", "rusak", "bunyi", "getar", "bocor", "panas",
-        "overheat", "mati", "susah", "boros", "lemah", "error",
-        "warning", "check engine", "ac", "dingin", "rem", "stir",
-        "cvt", "transmisi", "kopling", "oli", "bensin", "solar",
-        "aki", "starter", "alternator", "radiator", "knalpot",
-        "kenapa", "mengapa", "apa penyebab", "diagnosa", "cek"
-    ]
-    if any(kw in message_lower for kw in diagnostic_keywords):
-        return "diagnostic"
-
-    # Help keywords
-    help_keywords = ["help", "bantuan", "cara", "bagaimana", "info", "apa itu", "menu"]
-    if any(kw in message_lower for kw in help_keywords):
-        return "help"
-
-    # Default to diagnostic for unknown queries about the car
-    return "diagnostic"
+    return analyze_message(message)["intent"]
 
 
 def get_greeting_response() -> str:
@@ -186,6 +180,137 @@ Ketik keluhan mobil Anda untuk diagnosa!
 """
 
 
+async def _load_agent(module_name: str):
+    """Import an agent module on the thread pool (first import loads models)"""
+    return await executor.run_blocking(importlib.import_module, module_name)
+
+
+async def route_message(user_id: str, message: str) -> tuple:
+    """
+    Detect intent and run the matching handler without blocking the event loop
+
+    Agent pipelines run under their intent's concurrency limit; blocking work
+    inside them is offloaded to the bounded executor.
+
+    Returns:
+        (response text, detected intent)
+    """
+    intent = detect_intent(message)
+
+    if intent == "greeting":
+        return get_greeting_response(), intent
+
+    if intent == "help":
+        return get_help_response(), intent
+
+    if intent == "bengkel":
+        return get_workshop_response(message), intent
+
+    if intent == "modification" or intent == "stage":
+        agent = await _load_agent("agents.freed_modification")
+        response = await executor.run_agent("modification", agent.aprocess_modification_request, user_id, message)
+        return response, intent
+
+    # diagnostic (default)
+    agent = await _load_agent("agents.freed_diagnostic")
+    response = await executor.run_agent("diagnostic", agent.aprocess_freed_message, user_id, message)
+    return response, intent
+
+
+async def stream_message(user_id: str, message: str) -> AsyncIterator[dict]:
+    """
+    Streaming counterpart of route_message
+
+    Yields a meta event with the intent, then the agent's header / token /
+    footer / done events (see agents.streaming). Canned replies arrive as a
+    single done event.
+    """
+    intent = detect_intent(message)
+    yield {"event": "meta", "intent": intent}
+
+    if intent in ("greeting", "help", "bengkel"):
+        response, _ = await route_message(user_id, message)
+        yield {"event": "done", "response": response}
+        return
+
+    if intent == "modification" or intent == "stage":
+        agent = await _load_agent("agents.freed_modification")
+        events = executor.stream_agent("modification", agent.astream_modification_request, user_id, message)
+    else:
+        agent = await _load_agent("agents.freed_diagnostic")
+        events = executor.stream_agent("diagnostic", agent.astream_freed_message, user_id, message)
+
+    async for event in events:
+        yield event
+
+
+def _sse(event: dict) -> str:
+    """Format one event as a Server-Sent Events frame"""
+    payload = {key: value for key, value in event.items() if key != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _warm_http_client():
+    await waha_client.start()
+
+
+async def _warm_database():
+    def ping():
+        from database.supabase_client import supabase
+        supabase.table("stage_presets").select("stage").limit(1).execute()
+    await executor.run_blocking(ping)
+
+
+async def _warm_embedder():
+    from agents.embeddings import get_embedder
+    embedder = await executor.run_blocking(get_embedder)
+    # First forward pass allocates buffers / JIT-initializes kernels
+    await executor.run_blocking(embedder.encode, "AC tidak dingin")
+
+
+async def _warm_vector_index():
+    if VECTOR_INDEX_ENABLED:
+        await executor.run_blocking(vector_index.refresh)
+
+
+async def _warm_catalog():
+    await executor.run_blocking(catalog.refresh)
+
+
+async def _warm_diagnostic_agent():
+    # Import creates the LLM client and compiles the graph
+    await _load_agent("agents.freed_diagnostic")
+
+
+async def _warm_prompt_tokenizer():
+    # Load (or give up on) the token counter before the first diagnosis needs it
+    await executor.run_blocking(context_packer.get_tokenizer)
+    if not context_packer.counts_are_exact():
+        raise RuntimeError(f"{context_packer.PROMPT_TOKENIZER} unavailable, prompt tokens are estimated "
+                           f"({context_packer.tokenizer_name})")
+
+
+async def _warm_modification_agent():
+    await _load_agent("agents.freed_modification")
+
+
+async def _warm_vision_agent():
+    await _load_agent("agents.freed_vision")
+
+
+readiness.register("http_client", _warm_http_client)
+readiness.register("database", _warm_database, required=False)
+readiness.register("catalog", _warm_catalog, required=False)
+readiness.register("embedder", _warm_embedder)
+# Optional: retrieval uses the Supabase RPCs until the local index loads
+readiness.register("vector_index", _warm_vector_index, required=False)
+readiness.register("diagnostic_agent", _warm_diagnostic_agent)
+# Optional: prompt token counts fall back to an estimate without it
+readiness.register("prompt_tokenizer", _warm_prompt_tokenizer, required=False)
+readiness.register("modification_agent", _warm_modification_agent)
+readiness.register("vision_agent", _warm_vision_agent, required=False)
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -195,15 +320,80 @@ async def root():
         "status": "active",
         "endpoints": {
             "/health": "Health check",
-            "/process": "Process message (POST)"
+            "/ready": "Readiness check",
+            "/metrics": "Runtime metrics",
+            "/cache/invalidate": "Drop cached diagnostic responses (POST, admin)",
+            "/index/refresh": "Reload the local vector index (POST, admin)",
+            "/catalog/invalidate": "Reload parts and stage presets (POST, admin)",
+            "/plan": "Best parts build within a budget",
+            "/process": "Process message (POST)",
+            "/process/stream": "Process message, streamed as Server-Sent Events (POST)",
+            "/process-image/upload": "Image diagnosis from a multipart upload (POST)"
         }
     }
 
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
-    return {"status": "healthy", "database": "connected", "agents": "ready"}
+    """Liveness check endpoint (process is up; see /ready for warm-up state)"""
+    return {"status": "healthy", "ready": readiness.ready}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness check: 200 once models, graphs and clients are warm, else 503"""
+    status = readiness.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Runtime metrics for the agent executor, webhook queue and caches"""
+    cache = get_response_cache()
+    image_cache = get_image_cache()
+    stage_plans = get_stage_plans()
+    return {
+        "executor": executor.get_stats(),
+        "webhook_queue": webhook_queue.get_stats(),
+        "response_cache": cache.get_stats() if cache else {"enabled": False},
+        "embedding_cache": embedding_cache.get_stats(),
+        "embedding_batcher": embedding_batcher.get_stats(),
+        "vector_index": vector_index.get_stats(),
+        "catalog": catalog.get_stats(),
+        "catalog_documents": catalog_documents.get_stats(),
+        "image_preprocess": image_preprocess.get_stats(),
+        "image_cache": image_cache.get_stats() if image_cache else {"enabled": False},
+        "rate_limits": rate_limit.get_stats(),
+        "prompt": context_packer.get_stats(),
+        "answers": fast_answer.get_stats(),
+        "stage_plans": stage_plans.get_stats() if stage_plans else {"enabled": False},
+    }
+
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(authorization: str = Header(None)):
+    """Drop cached diagnostic responses (called after re-seeding the knowledge base)"""
+    if not API_SECRET or authorization != f"Bearer {API_SECRET}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    cache = get_response_cache()
+    invalidated = await executor.run_blocking(cache.invalidate) if cache else 0
+    return {"status": "ok", "invalidated": invalidated}
+
+
+@app.post("/index/refresh")
+async def refresh_vector_index(authorization: str = Header(None)):
+    """Reload service manual and common issue embeddings into the local index"""
+    if not API_SECRET or authorization != f"Bearer {API_SECRET}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if not VECTOR_INDEX_ENABLED:
+        return {"status": "disabled"}
+
+    try:
+        await executor.run_blocking(vector_index.refresh)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Index refresh failed: {str(e)[:100]}")
+    return {"status": "ok", **vector_index.get_stats()}
 
 
 @app.post("/process", response_model=MessageResponse)
@@ -230,27 +420,9 @@ async def process_message(request: MessageRequest, authorization: str = Header(N
             intent="empty"
         )
 
-    # Detect intent
-    intent = detect_intent(request.message)
-
-    # Route to appropriate handler
+    # Detect intent and route to appropriate handler
     try:
-        if intent == "greeting":
-            response = get_greeting_response()
-
-        elif intent == "help":
-            response = get_help_response()
-
-        elif intent == "bengkel":
-            response = get_workshop_response(request.message)
-
-        elif intent == "modification" or intent == "stage":
-            from agents.freed_modification import process_modification_request
-            response = process_modification_request(request.user_id, request.message)
-
-        else:  # diagnostic (default)
-            from agents.freed_diagnostic import process_freed_message
-            response = process_freed_message(request.user_id, request.message)
+        response, intent = await route_message(request.user_id, request.message)
 
     except Exception as e:
         response = f"""⚠️ *TERJADI KESALAHAN*
@@ -267,6 +439,43 @@ Atau ketik *HELP* untuk melihat panduan penggunaan.
     return MessageResponse(response=response, intent=intent)
 
 
+@app.post("/process/stream")
+async def process_message_stream(request: MessageRequest, authorization: str = Header(None)):
+    """
+    Process a message and stream the reply as Server-Sent Events
+
+    Events: meta {intent}, header {text}, token {text}*, footer {text},
+    done {response} (the complete reply, same as /process), or error {response}.
+    """
+    if authorization is not None and authorization != "" and authorization != "Bearer ":
+        if API_SECRET and authorization != f"Bearer {API_SECRET}":
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+    async def events():
+        if not request.message or not request.message.strip():
+            yield _sse({"event": "meta", "intent": "empty"})
+            yield _sse({"event": "done", "response": "Silakan ketik pesan Anda."})
+            return
+        try:
+            async for event in stream_message(request.user_id, request.message):
+                yield _sse(event)
+        except Exception as e:
+            yield _sse({"event": "error", "response": f"""⚠️ *TERJADI KESALAHAN*
+
+Maaf, sistem sedang mengalami gangguan.
+Error: {str(e)[:100]}
+
+Silakan coba lagi dalam beberapa saat.
+"""})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Disable proxy buffering (nginx) so tokens reach the browser immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/process-image", response_model=MessageResponse)
 async def process_image(request: ImageRequest, authorization: str = Header(None)):
     """
@@ -290,8 +499,10 @@ async def process_image(request: ImageRequest, authorization: str = Header(None)
         )
 
     try:
-        from agents.freed_vision import process_image_diagnosis
-        response = process_image_diagnosis(
+        agent = await _load_agent("agents.freed_vision")
+        response = await executor.run_agent(
+            "vision",
+            agent.aprocess_image_diagnosis,
             request.user_id,
             request.message or "Tolong diagnosa masalah dari gambar ini",
             request.image_base64
@@ -307,97 +518,263 @@ async def process_image(request: ImageRequest, authorization: str = Header(None)
         )
 
 
+@app.post("/process-image/upload", response_model=MessageResponse)
+async def process_image_upload(request: Request, authorization: str = Header(None)):
+    """
+    Multipart variant of /process-image
+
+    Form fields: image (file), user_id, message (optional). The body is
+    streamed into a spooled temp file with a hard size cap, so neither the
+    raw upload nor a base64 copy is held in memory.
+    """
+    if API_SECRET and authorization and authorization != f"Bearer {API_SECRET}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    # Room for the other form fields and part headers
+    form = await read_multipart(request, max_bytes=image_preprocess.IMAGE_MAX_INPUT_BYTES + 64 * 1024)
+    try:
+        image = form.get("image")
+        if image is None or isinstance(image, str):
+            return MessageResponse(
+                response="Silakan kirim gambar untuk diagnosa.",
+                intent="empty"
+            )
+
+        agent = await _load_agent("agents.freed_vision")
+        response = await executor.run_agent(
+            "vision",
+            agent.aprocess_image_upload,
+            form.get("user_id") or "web",
+            form.get("message") or "Tolong diagnosa masalah dari gambar ini",
+            image.file
+        )
+        return MessageResponse(response=response, intent="vision_diagnostic")
+    except Exception as e:
+        print(f"[VISION] Error: {e}")
+        return MessageResponse(
+            response=f"⚠️ *TERJADI KESALAHAN*\n\nMaaf, gagal memproses gambar.\nError: {str(e)[:100]}\n\nCoba kirim ulang atau ketik keluhan Anda.",
+            intent="error"
+        )
+    finally:
+        await form.close()
+
+
+# Serialized (and compressed) catalog responses, one per catalog version and query
+catalog_documents = DocumentCache()
+catalog.on_change(lambda snapshot: catalog_documents.clear())
+
+
+async def _catalog_snapshot():
+    """Current catalog; only the first call (before warm-up) waits on Supabase"""
+    if catalog.loaded:
+        return catalog.get()
+    return await executor.run_blocking(catalog.get)
+
+
+async def _catalog_response(request: Request, key: tuple, payload_fn):
+    """
+    Conditional, precompressed response for a catalog document
+
+    The ETag derives from the catalog content hash and the query; a
+    matching If-None-Match gets a 304 with the per-encoding ETag of the
+    cached document (serialized at most once per catalog version).
+    """
+    snapshot = await _catalog_snapshot()
+    etag = make_etag(snapshot.content_hash, key)
+    document = catalog_documents.lookup(etag)
+    if document is None:
+        document = await executor.run_blocking(catalog_documents.build, etag, lambda: payload_fn(snapshot))
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        catalog_documents.not_modified += 1
+        return not_modified_response(request, document)
+    return document_response(request, document)
+
+
 @app.get("/stages")
-async def get_stages():
-    """Get all modification stage presets"""
+async def get_stages(request: Request):
+    """Get all modification stage presets (served from the in-memory catalog)"""
     try:
-        from database.supabase_client import supabase
-        result = supabase.table("stage_presets").select("*").order("stage").execute()
-        return {"stages": result.data}
+        return await _catalog_response(request, ("stages",), lambda snapshot: {"stages": snapshot.stages})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _csv(value: Optional[str]) -> Optional[tuple]:
+    """'a, b' -> ('a', 'b'); None when empty"""
+    items = tuple(v.strip() for v in (value or "").split(",") if v.strip())
+    return items or None
+
+
 @app.get("/parts")
-async def get_parts(category: str = None, stage: int = None):
-    """Get modification parts catalog"""
+async def get_parts(
+    request: Request,
+    category: str = None,
+    stage: int = None,
+    brand: str = Query(None, description="Comma-separated brands (any)"),
+    legal_status: str = Query(None, description="Comma-separated: Street Legal, Track Only, Gray Area (any)"),
+    compatibility: str = Query(None, description="Comma-separated codes, e.g. GB3,L15A (all)"),
+    price_min: int = Query(None, ge=0, description="Price range overlaps [price_min, price_max] (IDR)"),
+    price_max: int = Query(None, ge=0),
+    hp_gain_min: int = Query(None, ge=0, description="Advertised HP gain of at least"),
+    fields: str = Query(None, description="Comma-separated columns to return (id is always included)"),
+    limit: int = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: str = Query(None, description="next_cursor from the previous page (overrides offset)"),
+):
+    """
+    Get modification parts catalog (served from the in-memory catalog)
+
+    Without limit every matching part is returned, as before. Filters mirror
+    the indexed/generated columns in schema.sql.
+    """
+    field_list = list(_csv(fields) or ())
     try:
-        from database.supabase_client import supabase
-        query = supabase.table("modification_catalog").select("*")
+        after = decode_cursor(cursor) if cursor else None
+        check_fields(field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filters = dict(
+        category=category or None,
+        max_stage=stage or None,
+        brands=_csv(brand),
+        legal_statuses=_csv(legal_status),
+        compatibility=_csv(compatibility),
+        price_min=price_min,
+        price_max=price_max,
+        hp_gain_min=hp_gain_min,
+    )
+
+    def payload(snapshot):
+        parts = snapshot.search_parts(**filters)
+        page, next_cursor = paginate(parts, limit=limit, offset=offset, after=after)
+        return {
+            "parts": project(page, field_list),
+            "count": len(page),
+            "total": len(parts),
+            "offset": offset if after is None else None,
+            "limit": limit,
+            "next_cursor": next_cursor,
+        }
+
+    key = ("parts", tuple(sorted(filters.items())), tuple(field_list), limit, offset, after)
+    try:
+        return await _catalog_response(request, key, payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if category:
-            query = query.eq("category", category)
-        if stage:
-            query = query.lte("min_stage", stage)
 
-        result = query.order("category").execute()
-        return {"parts": result.data, "count": len(result.data)}
+@app.get("/plan")
+async def get_plan(
+    request: Request,
+    budget: int = Query(..., ge=1, description="Total budget incl. installation (IDR)"),
+    category: str = Query("engine", description="Catalog category to build from"),
+    stage: int = Query(None, ge=1, le=3, description="Only parts with min_stage <= stage"),
+    compatibility: str = Query(None, description="Comma-separated codes, e.g. GB3,L15A (all)"),
+    legal_status: str = Query(None, description="Comma-separated allowed statuses (default Street Legal, Gray Area)"),
+    price_basis: str = Query(None, pattern="^(min|mid|max)$", description="Price range end used for costs"),
+):
+    """
+    Best build within a budget (one part per subcategory, maximum HP/torque gain)
+
+    Deterministic; the same build the modification agent gives the LLM.
+    """
+    options = dict(
+        category=category or None,
+        max_stage=stage,
+        compatibility=_csv(compatibility),
+        legal_statuses=_csv(legal_status) or parts_optimizer.PLAN_LEGAL_STATUSES,
+        price_basis=price_basis or parts_optimizer.PLAN_PRICE_BASIS,
+    )
+
+    def payload(snapshot):
+        return parts_optimizer.plan_build(snapshot, budget, **options).to_dict()
+
+    key = ("plan", budget, tuple(sorted(options.items())))
+    try:
+        return await _catalog_response(request, key, payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/catalog/invalidate")
+async def invalidate_catalog(authorization: str = Header(None)):
+    """Reload modification parts and stage presets now (after editing the catalog tables)"""
+    if not API_SECRET or authorization != f"Bearer {API_SECRET}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    catalog.invalidate()
+    try:
+        await executor.run_blocking(catalog.refresh)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Catalog refresh failed: {str(e)[:100]}")
+    return {"status": "ok", **catalog.get_stats()}
+
+
 async def send_waha_message(chat_id: str, text: str, session: str = "default"):
-    """Send message back via WAHA API"""
+    """Send message back via WAHA API (reuses the pooled WAHA client)"""
     print(f"[WAHA] Sending message to {chat_id} via session {session}")
     print(f"[WAHA] WAHA_URL: {WAHA_URL}, API_KEY set: {bool(WAHA_API_KEY)}")
 
-    async with httpx.AsyncClient() as client:
-        # Try the newer WAHA API endpoint first
-        send_url = f"{WAHA_URL}/api/sendText"
-        headers = {"X-Api-Key": WAHA_API_KEY}
-        payload = {
-            "session": session,
-            "chatId": chat_id,
-            "text": text
-        }
-
-        print(f"[WAHA] POST {send_url}")
-        print(f"[WAHA] Payload: {payload}")
+    client = waha_client.get_client()
 
-        try:
-            response = await client.post(
-                send_url,
-                headers=headers,
-                json=payload,
-                timeout=30.0
-            )
-            print(f"[WAHA] Response status: {response.status_code}")
-            print(f"[WAHA] Response body: {response.text}")
-            return response.json()
-        except Exception as e:
-            print(f"[WAHA] Error: {e}")
-            return {"error": str(e)}
+    # Try the newer WAHA API endpoint first
+    send_url = f"{WAHA_URL}/api/sendText"
+    headers = {"X-Api-Key": WAHA_API_KEY}
+    payload = {
+        "session": session,
+        "chatId": chat_id,
+        "text": text
+    }
 
+    print(f"[WAHA] POST {send_url}")
+    print(f"[WAHA] Payload: {payload}")
 
-def process_message_sync(user_id: str, message: str) -> str:
-    """Process message and return response (sync version for webhook)"""
-    if not message or not message.strip():
-        return "Silakan ketik pesan Anda."
+    try:
+        response = await client.post(
+            send_url,
+            headers=headers,
+            json=payload
+        )
+        print(f"[WAHA] Response status: {response.status_code}")
+        print(f"[WAHA] Response body: {response.text}")
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        print(f"[WAHA] Error: {e}")
+        return {"error": str(e)}
 
-    intent = detect_intent(message)
 
+async def process_webhook_job(job: WebhookJob) -> str:
+    """Queue worker step: route the message and build the reply"""
+    print(f"[WEBHOOK] Processing message from {job.chat_id}...")
     try:
-        if intent == "greeting":
-            return get_greeting_response()
-        elif intent == "help":
-            return get_help_response()
-        elif intent == "bengkel":
-            return get_workshop_response(message)
-        elif intent == "modification" or intent == "stage":
-            from agents.freed_modification import process_modification_request
-            return process_modification_request(user_id, message)
-        else:
-            from agents.freed_diagnostic import process_freed_message
-            return process_freed_message(user_id, message)
+        response_text, _ = await route_message(job.chat_id, job.message)
     except Exception as e:
-        return f"⚠️ *TERJADI KESALAHAN*\n\nError: {str(e)[:100]}\n\nKetik *HELP* untuk panduan."
+        response_text = f"⚠️ *TERJADI KESALAHAN*\n\nError: {str(e)[:100]}\n\nKetik *HELP* untuk panduan."
+    print(f"[WEBHOOK] Response generated ({len(response_text)} chars): {response_text[:100]}...")
+    return response_text
+
+
+async def deliver_webhook_reply(job: WebhookJob, text: str):
+    """Queue worker step: send the reply via WAHA, raising so the queue retries"""
+    result = await send_waha_message(job.chat_id, text, job.session)
+    if isinstance(result, dict) and "error" in result:
+        raise RuntimeError(result["error"])
+
+
+webhook_queue = JobQueue(process=process_webhook_job, deliver=deliver_webhook_reply)
 
 
 @app.post("/webhook")
 async def waha_webhook(request: Request):
     """
     Webhook endpoint for WAHA WhatsApp messages
-    Receives message, processes it, sends reply back via WAHA
+    Validates the message and queues it; a background worker processes it
+    and sends the reply back via WAHA
     """
     try:
         payload = await request.json()
@@ -439,8 +816,8 @@ async def waha_webhook(request: Request):
             print(f"[WEBHOOK] Skipping self message")
             return {"status": "ignored", "reason": "message from self"}
 
-        # Skip empty messages
-        if not message_body:
+        # Skip empty and whitespace-only messages
+        if not message_body or not message_body.strip():
             print(f"[WEBHOOK] Skipping empty message")
             return {"status": "ignored", "reason": "empty message"}
 
@@ -448,18 +825,32 @@ async def waha_webhook(request: Request):
             print(f"[WEBHOOK] No chat_id found")
             return {"status": "error", "reason": "no chat_id"}
 
-        # Process the message
-        print(f"[WEBHOOK] Processing message...")
-        response_text = process_message_sync(chat_id, message_body)
-        print(f"[WEBHOOK] Response generated ({len(response_text)} chars): {response_text[:100]}...")
+        # WEBJS engine sends the id as an object, NOWEB as a string
+        message_id = message_data.get("id") or key_data.get("id")
+        if isinstance(message_id, dict):
+            message_id = message_id.get("_serialized")
+
+        # Queue for background processing; WAHA gets its 200 right away
+        job = WebhookJob(
+            chat_id=chat_id,
+            message=message_body,
+            session=session,
+            message_id=message_id
+        )
+        status = await webhook_queue.enqueue(job)
+        print(f"[WEBHOOK] Enqueue result: {status} (depth {webhook_queue.depth})")
+
+        if status == "full":
+            # 503 makes WAHA redeliver later instead of us dropping the message
+            return JSONResponse(
+                status_code=503,
+                content={"status": "busy", "reason": "queue full"}
+            )
 
-        # Send reply via WAHA
-        print(f"[WEBHOOK] Sending reply to WAHA...")
-        result = await send_waha_message(chat_id, response_text, session)
-        print(f"[WEBHOOK] WAHA send result: {result}")
-        print(f"[WEBHOOK] ====== REQUEST COMPLETE ======")
+        if status == "duplicate":
+            return {"status": "ignored", "reason": "duplicate message"}
 
-        return {"status": "ok", "chat_id": chat_id, "processed": True}
+        return {"status": "queued", "chat_id": chat_id, "queue_depth": webhook_queue.depth}
 
     except Exception as e:
         print(f"[WEBHOOK] ERROR: {e}")
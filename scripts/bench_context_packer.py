@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Diagnosis Prompt Size Benchmark
+Compares the old context builder (3 manuals cut at 500 characters plus every
+common issue) with agents.context_packer on sample retrieval results, and
+optionally times both prompts against Groq.
+
+Usage:
+    python scripts/bench_context_packer.py [--live] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import context_packer
+from agents.context_packer import count_tokens, pack_context
+
+AC_MANUAL = (
+    "Sistem AC Honda Freed menggunakan kompresor tipe scroll dengan refrigerant R134a. "
+    "Jika AC tidak dingin, periksa tekanan refrigerant terlebih dahulu: tekanan low side normal 30-40 psi saat kompresor bekerja. "
+    "Periksa juga magnetic clutch kompresor, relay AC dan sekring 10A di panel bawah dashboard. "
+    "Kondensor yang kotor menurunkan pelepasan panas sehingga udara kabin tidak dingin saat macet. "
+    "Filter kabin yang tersumbat mengurangi aliran udara dan harus diganti setiap 20.000 km."
+)
+
+SAMPLES = [
+    {
+        "message": "AC tidak dingin kalau macet, kadang bunyi klik dari kompresor",
+        "manuals": [
+            {"section": "Sistem AC", "content": AC_MANUAL, "similarity": 0.83},
+            # Same section indexed twice (overlapping chunks)
+            {"section": "Sistem AC (lanjutan)", "content": AC_MANUAL[120:] + " Gunakan manifold gauge saat pengukuran.", "similarity": 0.79},
+            {"section": "Kelistrikan AC", "content": (
+                "Relay AC terletak di kotak sekring ruang mesin. Jika relay lemah, magnetic clutch hanya menyala sebentar "
+                "lalu mati, sehingga terdengar bunyi klik berulang. Ukur tegangan di konektor kompresor, minimal 12V saat AC ON. "
+                "Sensor suhu evaporator yang rusak juga membuat kompresor sering putus-sambung."
+            ), "similarity": 0.71},
+            {"section": "Pendinginan Mesin", "content": (
+                "Kipas radiator dan kipas kondensor dikendalikan ECU. Kipas kondensor harus menyala setiap kali AC ON. "
+                "Jika kipas mati, tekanan high side naik dan AC tidak dingin saat mobil diam atau macet."
+            ), "similarity": 0.64},
+        ],
+        "issues": [
+            {"symptom": "AC tidak dingin saat macet", "probable_cause": ["Kipas kondensor mati", "Kondensor kotor"],
+             "cost_estimate_idr": {"min": 150000, "max": 1200000}, "similarity": 0.8},
+            {"symptom": "AC tidak dingin saat macet atau idle", "probable_cause": ["Kipas kondensor mati", "Kondensor kotor"],
+             "cost_estimate_idr": {"min": 150000, "max": 1200000}, "similarity": 0.78},
+            {"symptom": "Kompresor AC bunyi klik berulang", "probable_cause": ["Relay AC lemah", "Sensor evaporator rusak"],
+             "cost_estimate_idr": {"min": 100000, "max": 600000}, "similarity": 0.74},
+            {"symptom": "Bau apek dari AC", "probable_cause": ["Filter kabin kotor", "Evaporator berjamur"],
+             "cost_estimate_idr": {"min": 80000, "max": 900000}, "similarity": 0.41},
+        ],
+    },
+    {
+        "message": "CVT getar saat akselerasi dari berhenti",
+        "manuals": [
+            {"section": "Transmisi CVT", "content": (
+                "CVT Honda Freed menggunakan sabuk baja dan dua pulley variabel. Getaran saat mulai jalan (judder) umumnya "
+                "berasal dari start clutch yang aus atau oli CVT yang sudah menurun kualitasnya. Gunakan hanya Honda HCF-2. "
+                "Setelah penggantian oli, lakukan prosedur start clutch calibration dengan HDS agar titik engagement kembali "
+                "benar. Penggantian oli dianjurkan setiap 40.000 km, atau 20.000 km untuk pemakaian berat di kota."
+            ), "similarity": 0.81},
+            {"section": "Engine Mounting", "content": (
+                "Engine mounting kanan dan mounting transmisi yang retak membuat getaran terasa di kabin saat akselerasi "
+                "dan saat posisi D ketika berhenti. Periksa karet mounting dari retak dan oli yang merembes."
+            ), "similarity": 0.68},
+        ],
+        "issues": [
+            {"symptom": "CVT judder saat mulai jalan", "probable_cause": ["Oli CVT menurun", "Start clutch aus"],
+             "cost_estimate_idr": {"min": 700000, "max": 8000000}, "similarity": 0.82},
+        ],
+    },
+]
+
+
+def legacy_context(manuals: list, issues: list) -> str:
+    """The pre-packer prompt context (agents/freed_diagnostic.py before the token budget)"""
+    context_parts = []
+    if manuals:
+        context_parts.append("📚 DARI SERVICE MANUAL:")
+        for doc in manuals[:3]:
+            context_parts.append(f"- {doc.get('section', 'N/A')}: {doc.get('content', '')[:500]}")
+    if issues:
+        context_parts.append("\n⚠️ COMMON ISSUES TERKAIT:")
+        for issue in issues:
+            causes = ", ".join(issue.get('probable_cause', []))
+            cost = issue.get('cost_estimate_idr', {})
+            context_parts.append(
+                f"- Gejala: {issue.get('symptom', 'N/A')}\n"
+                f"  Penyebab: {causes}\n"
+                f"  Estimasi: Rp {cost.get('min', 0):,} - Rp {cost.get('max', 0):,}"
+            )
+    return "\n".join(context_parts) if context_parts else "Tidak ada data spesifik ditemukan."
+
+
+def build_messages(message: str, context: str) -> list:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from agents.freed_diagnostic import FREED_SYSTEM_PROMPT
+    return [
+        SystemMessage(content=FREED_SYSTEM_PROMPT),
+        HumanMessage(content=f"KELUHAN USER: {message}\n\nKONTEKS DARI DATABASE:\n{context}\n\nBerikan diagnosa lengkap."),
+    ]
+
+
+def time_llm(message: str, context: str, runs: int) -> float:
+    from agents.freed_diagnostic import llm
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        llm.invoke(build_messages(message, context))
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Also time both prompts against Groq (needs GROQ_API_KEY)")
+    parser.add_argument("--runs", type=int, default=3, help="LLM calls per prompt with --live")
+    args = parser.parse_args()
+
+    context_packer.get_tokenizer()
+    exact = "" if context_packer.counts_are_exact() else " (estimate, not Llama 3 prompt tokens)"
+    print(f"Tokenizer: {context_packer.tokenizer_name}{exact}\n")
+    totals = {"old": 0, "new": 0}
+    for sample in SAMPLES:
+        old = legacy_context(sample["manuals"], sample["issues"])
+        packed = pack_context(sample["manuals"], sample["issues"])
+        old_tokens, new_tokens = count_tokens(old), packed.tokens
+        totals["old"] += old_tokens
+        totals["new"] += new_tokens
+
+        print(f"{sample['message']}")
+        print(f"  context tokens: {old_tokens} -> {new_tokens} ({100 * (1 - new_tokens / old_tokens):.0f}% smaller)")
+        print(f"  kept {len(packed.manuals)}/{len(sample['manuals'])} manuals, {len(packed.issues)}/{len(sample['issues'])} issues; "
+              f"dropped {packed.dropped_redundant} redundant, {packed.dropped_budget} over budget")
+        if args.live:
+            old_ms = time_llm(sample["message"], old, args.runs)
+            new_ms = time_llm(sample["message"], packed.text, args.runs)
+            print(f"  LLM median: {old_ms:.0f} ms -> {new_ms:.0f} ms")
+        print()
+
+    print(f"Total context tokens: {totals['old']} -> {totals['new']} "
+          f"({100 * (1 - totals['new'] / totals['old']):.0f}% smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Diagnostic Graph Benchmark
+Runs the diagnostic LangGraph against a latency-injecting Supabase stand-in
+and compares the old sequential retrieval wiring, the parallel fan-out and
+the single combined match_diagnostic_context RPC.
+The embedder and LLM are stubbed, so timings isolate retrieval round-trips.
+
+Usage:
+    python scripts/bench_diagnostic_graph.py [--rpc-ms 80] [--llm-ms 50] [--runs 20]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import types
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RPC_DATA = {
+    "match_service_manuals": [
+        {"section": "Air Conditioning - Refrigerant", "content": "Kapasitas freon R134a 450-500g.", "similarity": 0.81},
+    ],
+    "match_common_issues": [
+        {"symptom": "AC tidak dingin", "probable_cause": ["freon habis", "kompresor"],
+         "cost_estimate_idr": {"min": 200000, "max": 3500000}, "similarity": 0.88},
+    ],
+}
+
+
+RPC_DATA["match_diagnostic_context"] = {
+    "manuals": RPC_DATA["match_service_manuals"],
+    "issues": RPC_DATA["match_common_issues"],
+}
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Rpc:
+    def __init__(self, name: str, delay: float):
+        self.name = name
+        self.delay = delay
+
+    def execute(self):
+        time.sleep(self.delay)
+        return _Result(RPC_DATA.get(self.name, []))
+
+
+class FakeSupabase:
+    """Blocking client like supabase-py; every RPC costs one simulated round-trip"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def rpc(self, name: str, params: dict):
+        return _Rpc(name, self.delay)
+
+
+class FakeEmbedder:
+    def encode(self, texts, batch_size: int = 32):
+        vector = np.full(384, 1 / np.sqrt(384), dtype=np.float32)
+        # Batched calls (the embedding batcher) expect one row per text
+        return vector if isinstance(texts, str) else np.tile(vector, (len(texts), 1))
+
+
+class FakeLLM:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def invoke(self, messages):
+        time.sleep(self.delay)
+        return types.SimpleNamespace(content="Kemungkinan freon habis (70%).")
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.delay)
+        return types.SimpleNamespace(content="Kemungkinan freon habis (70%).")
+
+
+def load_agent(rpc_delay: float, llm_delay: float):
+    """Import the diagnostic agent with stand-ins for Supabase, the embedder and Groq"""
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    # Measure the LLM path even when the sample issue clears FAST_ANSWER_THRESHOLD
+    os.environ["FAST_ANSWER_ENABLED"] = "false"
+
+    # database.supabase_client (and its helpers) bind to the stand-in client
+    import supabase
+    supabase.create_client = lambda url, key: FakeSupabase(rpc_delay)
+    os.environ.setdefault("SUPABASE_URL", "http://bench")
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+
+    from agents import embeddings
+    embeddings._embedder = FakeEmbedder()
+
+    from agents import freed_diagnostic
+    freed_diagnostic.llm = FakeLLM(llm_delay)
+    return freed_diagnostic
+
+
+def build_sequential_graph(agent):
+    """The previous wiring: retrieve_docs -> retrieve_issues in sequence"""
+    from langgraph.graph import StateGraph, END
+    from langchain_core.runnables import RunnableLambda
+
+    workflow = StateGraph(agent.DiagnosticState)
+    workflow.add_node("extract_symptoms", agent.extract_symptoms)
+    workflow.add_node("embed_message", agent.embed_message)
+    workflow.add_node("retrieve_docs", agent.retrieve_service_docs)
+    workflow.add_node("retrieve_issues", agent.retrieve_common_issues)
+    workflow.add_node(
+        "generate_diagnosis",
+        RunnableLambda(agent.generate_diagnosis, afunc=agent.agenerate_diagnosis, name="generate_diagnosis")
+    )
+    workflow.add_node("format_response", agent.format_response)
+    workflow.set_entry_point("extract_symptoms")
+    workflow.add_edge("extract_symptoms", "embed_message")
+    workflow.add_edge("embed_message", "retrieve_docs")
+    workflow.add_edge("retrieve_docs", "retrieve_issues")
+    workflow.add_edge("retrieve_issues", "generate_diagnosis")
+    workflow.add_edge("generate_diagnosis", "format_response")
+    workflow.add_edge("format_response", END)
+    return workflow.compile()
+
+
+def time_graph(agent, graph, runs: int, use_async: bool) -> list:
+    timings = []
+    for i in range(runs):
+        state = agent._initial_state(f"bench-{i}", "AC tidak dingin")
+        start = time.perf_counter()
+        if use_async:
+            result = asyncio.run(graph.ainvoke(state))
+        else:
+            result = graph.invoke(state)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert len(result["retrieved_docs"]) == 1 and len(result["common_issues"]) == 1
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rpc-ms", type=float, default=80, help="Simulated Supabase RPC round-trip")
+    parser.add_argument("--llm-ms", type=float, default=50, help="Simulated LLM latency")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    agent = load_agent(args.rpc_ms / 1000, args.llm_ms / 1000)
+    graphs = {
+        "sequential": build_sequential_graph(agent),
+        "parallel": agent.build_diagnostic_graph(combined=False),
+        "combined": agent.build_diagnostic_graph(combined=True),
+    }
+
+    print(f"RPC round-trip {args.rpc_ms:.0f} ms, LLM {args.llm_ms:.0f} ms, {args.runs} runs\n")
+    print(f"{'graph':<12} {'mode':<7} {'mean ms':>8} {'p50 ms':>8} {'max ms':>8}")
+    for mode in ("invoke", "ainvoke"):
+        for name, graph in graphs.items():
+            timings = time_graph(agent, graph, args.runs, use_async=(mode == "ainvoke"))
+            print(f"{name:<12} {mode:<7} {statistics.mean(timings):8.1f} "
+                  f"{statistics.median(timings):8.1f} {max(timings):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Embedding Backend Benchmark
+Compares the torch, onnx and onnx-int8 backends of agents.embeddings on
+load time, resident memory, per-query latency and cosine agreement with
+the torch model. Each backend runs in its own subprocess so RSS is isolated.
+
+Usage:
+    python scripts/bench_embeddings.py [--backends torch,onnx,onnx-int8] [--queries 200] [--threads 2]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES = [
+    "AC tidak dingin", "ac ga dingin kenapa ya", "CVT getar saat akselerasi",
+    "mobil getar dari lampu merah", "Check engine light menyala",
+    "Rem bunyi decit kalau pagi", "mesin overheat di tol", "oli bocor di bawah mesin",
+    "stir berat kalau belok", "mobil susah start pagi hari", "bunyi gluduk kaki-kaki depan",
+    "idle kasar dan rpm naik turun", "boros bensin setelah servis", "aki cepat tekor",
+    "Kapasitas oli mesin Honda Freed berapa liter?",
+    "Honda Freed menggunakan CVT dengan torque converter. Gear ratio 2.631-0.408.",
+]
+
+
+def rss_mb() -> float:
+    """Current resident set size from /proc (Linux)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_worker(backend: str, queries: int, threads: int):
+    """Measure one backend in this process and print JSON to stdout"""
+    import numpy as np
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    from agents.embeddings import load_embedder
+    embedder = load_embedder(backend=backend, threads=threads)
+    embedder.encode("warm up")
+    load_seconds = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    latencies = []
+    for i in range(queries):
+        text = QUERIES[i % len(QUERIES)]
+        t0 = time.perf_counter()
+        embedder.encode(text)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+
+    vectors = np.asarray(embedder.encode(QUERIES), dtype=np.float32)
+    print(json.dumps({
+        "backend": backend,
+        "load_s": load_seconds,
+        "rss_mb": rss_loaded,
+        "rss_delta_mb": rss_loaded - rss_before,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "dim": int(vectors.shape[1]),
+        "vectors": vectors.tolist(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=int(os.getenv("EMBEDDING_THREADS", "0")))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.queries, args.threads)
+        return
+
+    import numpy as np
+
+    results = {}
+    for backend in args.backends.split(","):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", backend,
+             "--queries", str(args.queries), "--threads", str(args.threads)],
+            capture_output=True, text=True
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            print(f"{backend}: failed\n{proc.stderr.strip()[-500:]}\n")
+            continue
+        results[backend] = json.loads(lines[-1])
+
+    reference = np.array(results["torch"]["vectors"]) if "torch" in results else None
+
+    print(f"{'backend':<10} {'load s':>7} {'RSS MB':>8} {'+RSS MB':>8} {'p50 ms':>7} {'p95 ms':>7} {'dim':>4} {'cos vs torch (min/mean)':>24}")
+    for backend, r in results.items():
+        agreement = "-"
+        if reference is not None and backend != "torch":
+            vectors = np.array(r["vectors"])
+            cosines = (vectors * reference).sum(axis=1) / (
+                np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+            )
+            agreement = f"{cosines.min():.4f} / {cosines.mean():.4f}"
+        print(f"{backend:<10} {r['load_s']:7.2f} {r['rss_mb']:8.0f} {r['rss_delta_mb']:8.0f} "
+              f"{r['p50_ms']:7.2f} {r['p95_ms']:7.2f} {r['dim']:4d} {agreement:>24}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Keyword Matcher Benchmark
+Compares the old per-list substring scans (detect_intent + extract_symptoms +
+parse_request) with the single-pass matcher in agents.keywords, and prints
+every message whose routing changed.
+
+Usage:
+    python scripts/bench_keywords.py [--rounds 2000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import keywords
+from agents.keywords import SYMPTOM_CAUSES
+
+MESSAGES = [
+    "Halo", "selamat pagi min", "Stage 1", "stage 2 berapa biayanya",
+    "modif mesin budget 10jt", "Rekomendasi coilover buat harian",
+    "bengkel jakarta", "AC tidak dingin", "ac ga dingin kenapa ya",
+    "CVT getar saat akselerasi dari lampu merah", "Check engine light menyala",
+    "Rem bunyi decit kalau pagi", "premium atau pertalite yang bagus?",
+    "mobil susah start pagi", "mesin overheat di tol cipularang",
+    "upgrade performa mesin biar kencang", "pasang speaker dan head unit",
+    "oli bocor di bawah mesin, perlu ganti seal?", "menu",
+    "stir berat kalau belok, bunyi kletek dari kaki-kaki depan",
+]
+
+
+def legacy_analyze(message: str) -> dict:
+    """The pre-matcher logic: one lowercase + substring scan per keyword list"""
+    message_lower = message.lower()
+    intent = "diagnostic"
+    if any(g in message_lower for g in keywords.GREETING_KEYWORDS) and len(message_lower) < 30:
+        intent = "greeting"
+    elif re.search(r'stage\s*[123]', message_lower):
+        intent = "stage"
+    elif any(kw in message_lower for kw in [
+        "modif", "modifikasi", "upgrade", "ganti", "pasang", "turbo", "supercharger", "exhaust",
+        "intake", "header", "coilover", "velg", "rem", "brake", "suspension", "stage", "tune",
+        "ecu", "hondata", "bodykit", "aero"
+    ]):
+        intent = "modification"
+    elif any(kw in message_lower for kw in keywords.BENGKEL_KEYWORDS):
+        intent = "bengkel"
+    elif any(kw in message_lower for kw in [
+        "masalah", "rusak", "bunyi", "getar", "bocor", "panas", "overheat", "mati", "susah",
+        "boros", "lemah", "error", "warning", "check engine", "ac", "dingin", "rem", "stir",
+        "cvt", "transmisi", "kopling", "oli", "bensin", "solar", "aki", "starter", "alternator",
+        "radiator", "knalpot", "kenapa", "mengapa", "apa penyebab", "diagnosa", "cek"
+    ]):
+        intent = "diagnostic"
+    elif any(kw in message_lower for kw in keywords.HELP_KEYWORDS):
+        intent = "help"
+
+    # extract_symptoms
+    symptom_message = message.lower()
+    symptoms = []
+    for keyword, related in SYMPTOM_CAUSES.items():
+        if keyword in symptom_message:
+            symptoms.extend(related)
+
+    # parse_request
+    parse_message = message.lower()
+    focus_area = "engine"
+    for area, words in {
+        "engine": ["mesin", "engine", "power", "hp", "turbo", "supercharger", "intake", "exhaust"],
+        "suspension": ["kaki", "suspension", "coilover", "per", "shockbreaker", "handling"],
+        "exterior": ["body", "bodykit", "aero", "spoiler", "widebody", "exterior"],
+        "interior": ["interior", "jok", "seat", "dashboard", "racing seat"],
+        "audio": ["audio", "speaker", "subwoofer", "amplifier", "head unit"],
+        "brakes": ["rem", "brake", "brembo", "caliper", "rotor"],
+    }.items():
+        if any(kw in parse_message for kw in words):
+            focus_area = area
+            break
+    budget_match = re.search(r'(\d+)\s*(jt|juta|jt|million)', parse_message)
+    budget = int(budget_match.group(1)) * 1_000_000 if budget_match else None
+
+    return {"intent": intent, "symptoms": list(set(symptoms)), "focus_area": focus_area, "budget": budget}
+
+
+def new_analyze(message: str) -> tuple:
+    """Single-pass matcher with the memo cache bypassed"""
+    return keywords._analyze.__wrapped__(message.lower())
+
+
+def bench(func, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in MESSAGES:
+            func(message)
+    return (time.perf_counter() - start) / (rounds * len(MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    legacy_us = bench(legacy_analyze, args.rounds)
+    new_us = bench(new_analyze, args.rounds)
+    cached_us = bench(keywords.analyze_message, args.rounds)
+
+    print(f"{len(MESSAGES)} messages x {args.rounds} rounds")
+    print(f"  legacy substring scans : {legacy_us:6.2f} us/message")
+    print(f"  single-pass matcher    : {new_us:6.2f} us/message")
+    print(f"  matcher (memoized)     : {cached_us:6.2f} us/message")
+
+    print("\nRouting changes (legacy -> new):")
+    changed = 0
+    for message in MESSAGES:
+        old = legacy_analyze(message)["intent"]
+        new = keywords.analyze_message(message)["intent"]
+        if old != new:
+            changed += 1
+            print(f"  {message!r}: {old} -> {new}")
+    if not changed:
+        print("  none")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+WAHA Send Benchmark
+Compares per-send latency of a fresh httpx client per message (old
+send_waha_message) against the shared pooled client from services.waha_client.
+
+Starts a local stand-in WAHA server unless --url points at a real one.
+
+Usage:
+    python scripts/bench_waha_send.py [--sends 200] [--concurrency 1] [--url https://waha.example.com]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from services import waha_client
+
+
+def build_standin_app() -> FastAPI:
+    """Minimal WAHA stand-in: accepts sendText and echoes an id"""
+    standin = FastAPI()
+
+    @standin.post("/api/sendText")
+    async def send_text(payload: dict):
+        return {"id": f"true_{payload.get('chatId')}_BENCH", "status": "sent"}
+
+    return standin
+
+
+def start_standin_server() -> str:
+    """Run the stand-in on a free local port in a background thread"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    config = uvicorn.Config(build_standin_app(), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def payload(i: int) -> dict:
+    return {"session": "default", "chatId": f"62812{i:07d}@c.us", "text": "🔧 *DIAGNOSA HONDA FREED*"}
+
+
+async def send_fresh_client(url: str, headers: dict, i: int) -> float:
+    """Old behaviour: new AsyncClient (new TCP/TLS connection) per send"""
+    start = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{url}/api/sendText", headers=headers, json=payload(i), timeout=30.0)
+        response.json()
+    return time.perf_counter() - start
+
+
+async def send_pooled_client(url: str, headers: dict, i: int) -> float:
+    """New behaviour: shared keep-alive client"""
+    start = time.perf_counter()
+    response = await waha_client.get_client().post(f"{url}/api/sendText", headers=headers, json=payload(i))
+    response.json()
+    return time.perf_counter() - start
+
+
+async def run(send, url: str, headers: dict, sends: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await send(url, headers, i)
+
+    # Warm up DNS, imports and (for the pooled client) the first connection
+    await one(-1)
+    return await asyncio.gather(*(one(i) for i in range(sends)))
+
+
+def report(name: str, latencies: list):
+    ordered = sorted(latencies)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    print(f"{name:<22} mean {statistics.mean(ordered) * 1000:7.2f} ms | "
+          f"p50 {statistics.median(ordered) * 1000:7.2f} ms | p95 {p95 * 1000:7.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sends", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--url", default=None, help="Real WAHA base URL (default: local stand-in)")
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") if args.url else start_standin_server()
+    headers = {"X-Api-Key": os.getenv("WAHA_API_KEY", "bench")}
+    print(f"Target: {url} | sends: {args.sends} | concurrency: {args.concurrency}\n")
+
+    before = await run(send_fresh_client, url, headers, args.sends, args.concurrency)
+    await waha_client.start()
+    after = await run(send_pooled_client, url, headers, args.sends, args.concurrency)
+    await waha_client.close()
+
+    report("before (client/send)", before)
+    report("after (pooled)", after)
+    print(f"\nSpeedup (mean): {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,13 +7,9 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sentence_transformers import SentenceTransformer
+from agents.embeddings import encode_texts
 from database.supabase_client import supabase
 
-# Initialize embedding model
-print("Loading embedding model...")
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
-
 
 # ============================================
 # HONDA FREED SERVICE MANUAL DATA
@@ -1058,17 +1054,19 @@ def seed_service_manuals():
     """Seed service manual data with embeddings"""
     print("\n[SERVICE MANUALS] Seeding service manuals...")
 
-    for manual in SERVICE_MANUALS:
-        # Generate embedding for the content
-        text_for_embedding = f"{manual['section']} {manual['subsection']} {manual['content']}"
-        embedding = embedder.encode(text_for_embedding).tolist()
+    # Generate embeddings for all contents in batched forward passes
+    embeddings = encode_texts([
+        f"{manual['section']} {manual['subsection']} {manual['content']}"
+        for manual in SERVICE_MANUALS
+    ])
 
+    for manual, embedding in zip(SERVICE_MANUALS, embeddings):
         data = {
             "section": manual["section"],
             "subsection": manual["subsection"],
             "content": manual["content"],
             "tags": manual["tags"],
-            "embedding": embedding
+            "embedding": embedding.tolist()
         }
 
         try:
@@ -1084,11 +1082,10 @@ def seed_common_issues():
     """Seed common issues data with embeddings"""
     print("\n[COMMON ISSUES] Seeding common issues...")
 
-    for issue in COMMON_ISSUES:
-        # Generate embedding for symptom + detail
-        text_for_embedding = f"{issue['symptom']} {issue['symptom_detail']}"
-        embedding = embedder.encode(text_for_embedding).tolist()
+    # Generate embeddings for symptom + detail in batched forward passes
+    embeddings = encode_texts([f"{issue['symptom']} {issue['symptom_detail']}" for issue in COMMON_ISSUES])
 
+    for issue, embedding in zip(COMMON_ISSUES, embeddings):
         data = {
             "symptom": issue["symptom"],
             "symptom_detail": issue["symptom_detail"],
@@ -1097,7 +1094,7 @@ def seed_common_issues():
             "part_codes": issue["part_codes"],
             "cost_estimate_idr": issue["cost_estimate_idr"],
             "urgency": issue["urgency"],
-            "embedding": embedding
+            "embedding": embedding.tolist()
         }
 
         try:
@@ -1141,6 +1138,64 @@ def clear_tables():
             print(f"  ✗ Error clearing {table}: {e}")
 
 
+def rebuild_vector_indexes():
+    """Build the embedding indexes on the seeded rows and refresh planner statistics"""
+    from database.supabase_client import rebuild_vector_indexes as rebuild
+
+    method = os.getenv("PGVECTOR_INDEX_METHOD", "hnsw")
+    print(f"\n[INDEXES] Rebuilding vector indexes ({method}) and running ANALYZE...")
+    try:
+        for table, info in rebuild(method).items():
+            print(f"  ✓ {table}: {info.get('rows', 0)} rows" + (f", lists={info['lists']}" if "lists" in info else ""))
+    except Exception as e:
+        print(f"  ✗ Error rebuilding indexes: {e}")
+        print("    Apply database/migrations/001_vector_index_strategy.sql and seed with the service role key")
+
+
+def _notify_api(path: str) -> dict:
+    """POST an admin endpoint of the running API (needs API_URL and API_SECRET)"""
+    import httpx
+    response = httpx.post(
+        f"{os.getenv('API_URL').rstrip('/')}{path}",
+        headers={"Authorization": f"Bearer {os.getenv('API_SECRET', '')}"},
+        timeout=30
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def refresh_api_caches():
+    """Drop cached answers and reload the API's vector index and catalog after seeding"""
+    print("\n[CACHE] Refreshing API caches...")
+
+    # Persistent response cache tier (RESPONSE_CACHE_DB), shared with the API on the same host
+    from agents.response_cache import RESPONSE_CACHE_DB, ResponseCache
+    if RESPONSE_CACHE_DB:
+        cache = ResponseCache(db_path=RESPONSE_CACHE_DB)
+        cache.invalidate()
+        cache.close()
+
+    # In-memory state of a running API
+    if not os.getenv("API_URL"):
+        print("  - API_URL not set, restart the API or POST /cache/invalidate, /index/refresh and /catalog/invalidate")
+        return
+    try:
+        result = _notify_api("/cache/invalidate")
+        print(f"  ✓ Response cache cleared ({result.get('invalidated', 0)} entries)")
+    except Exception as e:
+        print(f"  ✗ Error invalidating API cache: {e}")
+    try:
+        result = _notify_api("/index/refresh")
+        print(f"  ✓ Vector index reloaded ({result.get('manuals', 0)} manuals, {result.get('issues', 0)} issues)")
+    except Exception as e:
+        print(f"  ✗ Error refreshing vector index: {e}")
+    try:
+        result = _notify_api("/catalog/invalidate")
+        print(f"  ✓ Catalog reloaded ({result.get('parts', 0)} parts, version {result.get('version')})")
+    except Exception as e:
+        print(f"  ✗ Error reloading catalog: {e}")
+
+
 def main():
     import sys
     import io
@@ -1169,6 +1224,8 @@ def main():
     seed_service_manuals()
     seed_common_issues()
     seed_modification_catalog()
+    rebuild_vector_indexes()
+    refresh_api_caches()
 
     print("\n" + "=" * 50)
     print("SEEDING COMPLETE!")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - Agent Executor
+Runs blocking agent work off the event loop with per-intent concurrency limits
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Size of the shared thread pool for blocking work (Supabase, embeddings, sync LLM calls)
+AGENT_EXECUTOR_WORKERS = int(os.getenv("AGENT_EXECUTOR_WORKERS", "16"))
+
+# Max pipelines running at once per intent; extra requests wait on the event loop
+INTENT_CONCURRENCY = {
+    "diagnostic": int(os.getenv("MAX_CONCURRENT_DIAGNOSTIC", "8")),
+    "modification": int(os.getenv("MAX_CONCURRENT_MODIFICATION", "4")),
+    "vision": int(os.getenv("MAX_CONCURRENT_VISION", "2")),
+}
+DEFAULT_CONCURRENCY = int(os.getenv("MAX_CONCURRENT_DEFAULT", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared bounded thread pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=AGENT_EXECUTOR_WORKERS,
+            thread_name_prefix="agent"
+        )
+    return _executor
+
+
+def install(loop: asyncio.AbstractEventLoop = None):
+    """
+    Make the bounded pool the loop's default executor
+
+    LangGraph runs sync nodes through run_in_executor(None, ...) during
+    ainvoke, so this keeps those nodes inside the same bound.
+    """
+    loop = loop or asyncio.get_running_loop()
+    loop.set_default_executor(get_executor())
+
+
+def shutdown():
+    """Stop the thread pool (called on application shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _get_semaphore(intent: str) -> asyncio.Semaphore:
+    """Get the semaphore for an intent, bound to the running loop"""
+    global _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore_loop is not loop:
+        _semaphores.clear()
+        _semaphore_loop = loop
+
+    if intent not in _semaphores:
+        limit = INTENT_CONCURRENCY.get(intent, DEFAULT_CONCURRENCY)
+        _semaphores[intent] = asyncio.Semaphore(max(1, limit))
+    return _semaphores[intent]
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """Run a blocking callable on the shared thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+@asynccontextmanager
+async def _agent_slot(intent: str):
+    """Hold one of the intent's concurrency slots"""
+    stats = _stats.setdefault(intent, {"waiting": 0, "running": 0, "completed": 0})
+    semaphore = _get_semaphore(intent)
+
+    stats["waiting"] += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        stats["waiting"] -= 1
+
+    stats["running"] += 1
+    try:
+        yield
+    finally:
+        stats["running"] -= 1
+        stats["completed"] += 1
+        semaphore.release()
+
+
+async def run_agent(intent: str, func: Callable, *args, **kwargs):
+    """
+    Run an agent pipeline under its intent's concurrency limit
+
+    Args:
+        intent: Routing intent ('diagnostic', 'modification', ...)
+        func: Coroutine function, or blocking function run on the thread pool
+        *args, **kwargs: Passed through to func
+
+    Returns:
+        Whatever func returns
+    """
+    async with _agent_slot(intent):
+        if asyncio.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        return await run_blocking(func, *args, **kwargs)
+
+
+async def stream_agent(intent: str, func: Callable, *args, **kwargs) -> AsyncIterator:
+    """
+    Iterate a streaming agent pipeline under its intent's concurrency limit
+
+    The slot is held until the stream finishes or the consumer closes it
+    (e.g. the client disconnects).
+
+    Args:
+        func: Async generator function
+    """
+    async with _agent_slot(intent):
+        async for item in func(*args, **kwargs):
+            yield item
+
+
+def get_stats() -> dict:
+    """Return executor and per-intent concurrency stats"""
+    return {
+        "workers": AGENT_EXECUTOR_WORKERS,
+        "limits": {**INTENT_CONCURRENCY, "default": DEFAULT_CONCURRENCY},
+        "intents": {intent: dict(values) for intent, values in _stats.items()},
+    }
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - HTTP Caching
+Precomputed JSON documents with strong ETags, If-None-Match -> 304,
+gzip/brotli variants and Cache-Control headers for the catalog endpoints
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import Response
+
+load_dotenv()
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+# Browsers revalidate after max-age; edge caches (Cloudflare) keep s-maxage
+CATALOG_CACHE_CONTROL = os.getenv(
+    "CATALOG_CACHE_CONTROL",
+    "public, max-age=60, s-maxage=300, stale-while-revalidate=600"
+)
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "256"))
+
+# Suffix that keeps each encoded representation's strong ETag distinct
+ENCODING_SUFFIX = {"br": "-br", "gzip": "-gz"}
+
+
+def make_etag(content_hash: str, key: Tuple) -> str:
+    """Strong ETag for one document variant of one catalog version"""
+    variant = hashlib.sha1(repr(key).encode()).hexdigest()[:8]
+    return f'"{content_hash[:20]}-{variant}"'
+
+
+def _opaque(tag: str) -> str:
+    """Compare tags ignoring W/ and the content-coding suffix (If-None-Match uses weak comparison)"""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ENCODING_SUFFIX.values():
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = _opaque(etag)
+    return any(_opaque(tag) == target for tag in if_none_match.split(","))
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """Pick br, then gzip, if the client accepts it (q=0 excludes)"""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class CachedDocument:
+    """One serialized JSON body and its compressed variants"""
+
+    def __init__(self, etag: str, payload: Any):
+        self.etag = etag
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+        self.bodies: Dict[Optional[str], bytes] = {None: body}
+        if len(body) >= COMPRESS_MIN_BYTES:
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body, quality=11)
+
+
+class DocumentCache:
+    """LRU of CachedDocument keyed by ETag (catalog content hash + request variant)"""
+
+    def __init__(self, max_entries: int = DOCUMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._documents: "OrderedDict[str, CachedDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.not_modified = 0
+
+    def lookup(self, etag: str) -> Optional[CachedDocument]:
+        with self._lock:
+            document = self._documents.get(etag)
+            if document is not None:
+                self._documents.move_to_end(etag)
+                self.hits += 1
+            return document
+
+    def build(self, etag: str, payload_fn: Callable[[], Any]) -> CachedDocument:
+        """Serialize and compress once (blocking; run off the event loop)"""
+        document = CachedDocument(etag, payload_fn())
+        with self._lock:
+            self._documents[etag] = document
+            while len(self._documents) > self.max_entries:
+                self._documents.popitem(last=False)
+            self.builds += 1
+        return document
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._documents),
+                "hits": self.hits,
+                "builds": self.builds,
+                "not_modified": self.not_modified,
+                "brotli": brotli is not None,
+            }
+
+
+def _cache_headers(etag: str, cache_control: str) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+
+def representation_etag(document: CachedDocument, encoding: Optional[str]) -> str:
+    """The document's ETag for one content-coding (each encoded body is its own representation)"""
+    if not encoding:
+        return document.etag
+    return document.etag[:-1] + ENCODING_SUFFIX[encoding] + '"'
+
+
+def not_modified_response(request: Request, document: CachedDocument, cache_control: str = CATALOG_CACHE_CONTROL) -> Response:
+    """304 carrying the same ETag the matching 200 would send for this Accept-Encoding"""
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), document.bodies)
+    return Response(status_code=304, headers=_cache_headers(representation_etag(document, encoding), cache_control))
+
+
+def document_response(request: Request, document: CachedDocument, cache_control: str = CATALOG_CACHE_CONTROL) -> Response:
+    """200 with the best encoding the client accepts"""
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), document.bodies)
+    headers = _cache_headers(representation_etag(document, encoding), cache_control)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=document.bodies[encoding], media_type="application/json", headers=headers)
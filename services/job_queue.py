@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - Webhook Job Queue
+Bounded in-process queue drained by async workers, with send retries and metrics
+"""
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WEBHOOK_QUEUE_MAXSIZE = int(os.getenv("WEBHOOK_QUEUE_MAXSIZE", "200"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_SEND_RETRIES = int(os.getenv("WEBHOOK_SEND_RETRIES", "3"))
+WEBHOOK_RETRY_BACKOFF = float(os.getenv("WEBHOOK_RETRY_BACKOFF", "1.0"))
+WEBHOOK_RETRY_MAX_BACKOFF = float(os.getenv("WEBHOOK_RETRY_MAX_BACKOFF", "30.0"))
+
+# Recently seen WAHA message ids, used to drop webhook redeliveries
+DEDUPE_WINDOW = 1000
+# Number of recent jobs kept for latency percentiles
+LATENCY_WINDOW = 500
+
+
+@dataclass
+class WebhookJob:
+    """A WhatsApp message waiting for a reply"""
+    chat_id: str
+    message: str
+    session: str = "default"
+    message_id: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _latency_summary(values) -> dict:
+    values = list(values)
+    return {
+        "avg_ms": round(sum(values) / len(values) * 1000, 1) if values else 0.0,
+        "p50_ms": round(_percentile(values, 50) * 1000, 1),
+        "p95_ms": round(_percentile(values, 95) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1) if values else 0.0,
+    }
+
+
+class JobQueue:
+    """
+    Webhook job queue
+
+    Jobs are processed once (intent routing + agent pipeline) and the reply
+    delivery is retried with exponential backoff, so a WAHA hiccup never
+    re-runs the LLM.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[WebhookJob], Awaitable[str]],
+        deliver: Callable[[WebhookJob, str], Awaitable[None]],
+        maxsize: int = WEBHOOK_QUEUE_MAXSIZE,
+        workers: int = WEBHOOK_WORKERS,
+        send_retries: int = WEBHOOK_SEND_RETRIES,
+        retry_backoff: float = WEBHOOK_RETRY_BACKOFF,
+        retry_max_backoff: float = WEBHOOK_RETRY_MAX_BACKOFF,
+    ):
+        self.process = process
+        self.deliver = deliver
+        self.maxsize = maxsize
+        self.worker_count = max(1, workers)
+        self.send_retries = send_retries
+        self.retry_backoff = retry_backoff
+        self.retry_max_backoff = retry_max_backoff
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._seen_ids: OrderedDict = OrderedDict()
+
+        self._counters = {
+            "enqueued": 0,
+            "rejected_full": 0,
+            "duplicates": 0,
+            "processed": 0,
+            "delivered": 0,
+            "failed": 0,
+            "send_retries": 0,
+        }
+        self._max_depth = 0
+        self._queue_wait = deque(maxlen=LATENCY_WINDOW)
+        self._processing = deque(maxlen=LATENCY_WINDOW)
+        self._end_to_end = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers) and not all(w.done() for w in self._workers)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        """Create the queue and spawn the worker tasks"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"webhook-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        print(f"[QUEUE] Started {self.worker_count} workers (maxsize={self.maxsize})")
+
+    async def stop(self):
+        """Cancel workers; jobs still queued are dropped"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.depth:
+            print(f"[QUEUE] Stopped with {self.depth} jobs still queued")
+
+    async def enqueue(self, job: WebhookJob) -> str:
+        """
+        Add a job without waiting
+
+        Returns:
+            'queued', 'duplicate' or 'full'
+        """
+        if not self.running:
+            await self.start()
+
+        if job.message_id:
+            if job.message_id in self._seen_ids:
+                self._counters["duplicates"] += 1
+                return "duplicate"
+            self._seen_ids[job.message_id] = True
+            if len(self._seen_ids) > DEDUPE_WINDOW:
+                self._seen_ids.popitem(last=False)
+
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._counters["rejected_full"] += 1
+            if job.message_id:
+                # Let WAHA's redelivery through once there is room
+                self._seen_ids.pop(job.message_id, None)
+            return "full"
+
+        self._counters["enqueued"] += 1
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+        return "queued"
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._counters["failed"] += 1
+                print(f"[QUEUE] Worker {index} job for {job.chat_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: WebhookJob):
+        started = time.monotonic()
+        self._queue_wait.append(started - job.enqueued_at)
+
+        reply = await self.process(job)
+        self._processing.append(time.monotonic() - started)
+        self._counters["processed"] += 1
+
+        await self._deliver_with_retry(job, reply)
+        self._end_to_end.append(time.monotonic() - job.enqueued_at)
+        self._counters["delivered"] += 1
+
+    async def _deliver_with_retry(self, job: WebhookJob, reply: str):
+        delay = self.retry_backoff
+        while True:
+            job.attempts += 1
+            try:
+                await self.deliver(job, reply)
+                return
+            except Exception as e:
+                if job.attempts > self.send_retries:
+                    raise
+                self._counters["send_retries"] += 1
+                wait = min(delay, self.retry_max_backoff) * random.uniform(0.8, 1.2)
+                print(f"[QUEUE] Send to {job.chat_id} failed ({e}), retry {job.attempts}/{self.send_retries} in {wait:.1f}s")
+                await asyncio.sleep(wait)
+                delay *= 2
+
+    async def join(self):
+        """Wait until every queued job has been handled"""
+        if self._queue:
+            await self._queue.join()
+
+    def get_stats(self) -> dict:
+        """Return queue depth, counters and latency summaries"""
+        return {
+            "running": self.running,
+            "workers": self.worker_count,
+            "depth": self.depth,
+            "max_depth": self._max_depth,
+            "maxsize": self.maxsize,
+            **self._counters,
+            "queue_wait": _latency_summary(self._queue_wait),
+            "processing": _latency_summary(self._processing),
+            "end_to_end": _latency_summary(self._end_to_end),
+        }
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - Upstream Rate Limiting
+Concurrency cap, request/token buckets and retry with backoff for calls to
+rate-limited APIs (Groq). Queue time (waiting for a slot or budget) is
+tracked separately from call time.
+"""
+import asyncio
+import email.utils
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding up to burst
+
+    acquire() reserves tokens immediately (the balance may go negative) and
+    sleeps until the reservation is covered, so waiters are served in order.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take tokens now; returns the seconds to wait before using them"""
+        self._refill()
+        self._tokens -= min(tokens, self.capacity)
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self, tokens: float = 1) -> float:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def drain(self, seconds: float):
+        """Upstream said we are over quota: empty the bucket for about this long"""
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+def status_code_of(error: Exception) -> Optional[int]:
+    """HTTP status from an SDK error (groq/openai-style .status_code or .response)"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP date) from an SDK error, if present"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def is_retryable(error: Exception) -> bool:
+    """429, 5xx and connection/timeouts (no status)"""
+    status = status_code_of(error)
+    if status is None:
+        return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    return status == 429 or status >= 500
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimiter:
+    """
+    Concurrency cap + request/token buckets + retries for one upstream
+
+    Args:
+        name: Label in /metrics
+        concurrency: Max calls in flight
+        requests_per_minute: Request quota (0 disables the bucket)
+        tokens_per_minute: Token quota; each call is charged its estimate (0 disables)
+        retries: Retries after the first attempt for retryable errors
+        backoff_base / backoff_cap: Backoff bounds in seconds when there is no Retry-After
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 20.0,
+    ):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self.stats = {
+            "calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "rate_limited": 0,
+            "waiting": 0, "in_flight": 0, "queue_ms_total": 0.0, "call_ms_total": 0.0,
+            "queue_ms_max": 0.0,
+        }
+        _limiters[name] = self
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Rebind per event loop (tests and scripts run several loops)
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _attempt(self, call: Callable[[], Awaitable], tokens: float):
+        semaphore = self._get_semaphore()
+        queued = time.perf_counter()
+        self.stats["waiting"] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.stats["waiting"] -= 1
+        try:
+            # Buckets are charged while holding the slot, so a burst cannot overdraw them
+            if self.requests:
+                await self.requests.acquire(1)
+            if self.tokens and tokens:
+                await self.tokens.acquire(tokens)
+            queue_ms = (time.perf_counter() - queued) * 1000
+            self.stats["queue_ms_total"] += queue_ms
+            self.stats["queue_ms_max"] = max(self.stats["queue_ms_max"], queue_ms)
+
+            self.stats["in_flight"] += 1
+            started = time.perf_counter()
+            try:
+                return await call()
+            finally:
+                self.stats["in_flight"] -= 1
+                self.stats["call_ms_total"] += (time.perf_counter() - started) * 1000
+        finally:
+            semaphore.release()
+
+    async def call(self, call: Callable[[], Awaitable], tokens: float = 0):
+        """
+        Run call() within the limits, retrying retryable errors
+
+        A 429 honors Retry-After (and drains the request bucket so queued
+        callers wait too); otherwise the delay is jittered exponential backoff.
+        The last error is re-raised when retries are exhausted.
+        """
+        self.stats["calls"] += 1
+        for attempt in range(self.retries + 1):
+            try:
+                result = await self._attempt(call, tokens)
+                self.stats["succeeded"] += 1
+                return result
+            except Exception as e:
+                if attempt >= self.retries or not is_retryable(e):
+                    self.stats["failed"] += 1
+                    raise
+                delay = None
+                if status_code_of(e) == 429:
+                    self.stats["rate_limited"] += 1
+                    delay = retry_after_seconds(e)
+                    if delay is not None and self.requests:
+                        self.requests.drain(delay)
+                if delay is None:
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                self.stats["retries"] += 1
+                print(f"[RATE] {self.name}: {type(e).__name__}, retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        attempts = max(1, stats["succeeded"] + stats["failed"] + stats["retries"])
+        stats["queue_ms_avg"] = round(stats.pop("queue_ms_total") / attempts, 1)
+        stats["call_ms_avg"] = round(stats.pop("call_ms_total") / attempts, 1)
+        stats["queue_ms_max"] = round(stats["queue_ms_max"], 1)
+        stats["concurrency"] = self.concurrency
+        return stats
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_stats() -> dict:
+    """Stats of every limiter created so far"""
+    return {name: limiter.get_stats() for name, limiter in _limiters.items()}
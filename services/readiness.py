@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - Readiness
+Startup warm-up of models, graphs and clients with per-component state and timings
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+# Component states
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Readiness:
+    """
+    Tracks warm-up of each component
+
+    Required components gate readiness; optional ones (e.g. the database
+    ping) are reported but only mark the instance as degraded.
+    """
+
+    def __init__(self):
+        self._steps: List[Tuple[str, Callable[[], Awaitable], bool]] = []
+        self.components: Dict[str, dict] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def register(self, name: str, step: Callable[[], Awaitable], required: bool = True):
+        """Add a warm-up step; steps run in registration order"""
+        self._steps.append((name, step, required))
+        self.components[name] = {"state": PENDING, "required": required, "duration_ms": None, "error": None}
+
+    async def warm_up(self):
+        """Run every registered step, recording state and timing"""
+        self.started_at = time.monotonic()
+        for name, step, required in self._steps:
+            component = self.components[name]
+            component["state"] = WARMING
+            start = time.monotonic()
+            try:
+                await step()
+                component["state"] = READY
+            except Exception as e:
+                component["state"] = FAILED
+                component["error"] = str(e)[:200]
+                print(f"[READY] {name} failed: {e}")
+            component["duration_ms"] = round((time.monotonic() - start) * 1000, 1)
+            print(f"[READY] {name}: {component['state']} in {component['duration_ms']} ms")
+        self.finished_at = time.monotonic()
+
+    def skip(self):
+        """Mark all steps skipped (warm-up disabled, components load lazily)"""
+        for component in self.components.values():
+            component["state"] = SKIPPED
+        self.started_at = self.finished_at = time.monotonic()
+
+    def start_background(self) -> asyncio.Task:
+        """Warm up without blocking startup so the port opens immediately"""
+        if not WARMUP_ON_STARTUP:
+            self.skip()
+            return None
+        return asyncio.create_task(self.warm_up(), name="warm-up")
+
+    @property
+    def ready(self) -> bool:
+        if self.finished_at is None:
+            return False
+        return all(
+            c["state"] in (READY, SKIPPED)
+            for c in self.components.values() if c["required"]
+        )
+
+    def status(self) -> dict:
+        """Overall status plus per-component state and timings"""
+        if self.ready:
+            optional_ok = all(c["state"] in (READY, SKIPPED) for c in self.components.values())
+            status = "ready" if optional_ok else "degraded"
+        elif self.finished_at is not None:
+            status = "failed"
+        elif self.started_at is not None:
+            status = "warming"
+        else:
+            status = "starting"
+
+        warmup_ms = None
+        if self.started_at is not None:
+            end = self.finished_at or time.monotonic()
+            warmup_ms = round((end - self.started_at) * 1000, 1)
+
+        return {
+            "status": status,
+            "ready": self.ready,
+            "warmup_ms": warmup_ms,
+            "components": {name: dict(c) for name, c in self.components.items()},
+        }
+
+
+readiness = Readiness()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - Upload Parsing
+multipart/form-data bodies parsed from the request stream with a hard byte
+cap. File parts are spooled to a temp file (memory up to 1 MB, then disk),
+so an upload is never held in memory as one bytes object.
+"""
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Upload exceeds {max_bytes // (1024 * 1024)}MB")
+
+
+async def _capped(request: Request, max_bytes: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        # Chunked bodies have no Content-Length; stop reading as soon as the cap is passed
+        if received > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        yield chunk
+
+
+async def read_multipart(request: Request, max_bytes: int, max_files: int = 1, max_fields: int = 8) -> FormData:
+    """
+    Parse a multipart/form-data request without buffering it whole
+
+    Raises:
+        HTTPException: 413 over max_bytes (checked against Content-Length
+            before reading, then while streaming), 415 wrong content type,
+            400 malformed body
+    """
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    parser = MultiPartParser(request.headers, _capped(request, max_bytes), max_files=max_files, max_fields=max_fields)
+    try:
+        return await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
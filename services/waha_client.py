@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Honda Freed Superchatbot - WAHA HTTP Client
+One pooled, keep-alive httpx client shared by every outbound WAHA call
+"""
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WAHA_TIMEOUT = float(os.getenv("WAHA_TIMEOUT", "30"))
+WAHA_CONNECT_TIMEOUT = float(os.getenv("WAHA_CONNECT_TIMEOUT", "5"))
+WAHA_MAX_CONNECTIONS = int(os.getenv("WAHA_MAX_CONNECTIONS", "20"))
+WAHA_MAX_KEEPALIVE = int(os.getenv("WAHA_MAX_KEEPALIVE", "10"))
+WAHA_KEEPALIVE_EXPIRY = float(os.getenv("WAHA_KEEPALIVE_EXPIRY", "30"))
+WAHA_HTTP2 = os.getenv("WAHA_HTTP2", "false").lower() == "true"
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def build_client(
+    http2: bool = WAHA_HTTP2,
+    max_connections: int = WAHA_MAX_CONNECTIONS,
+    max_keepalive: int = WAHA_MAX_KEEPALIVE,
+) -> httpx.AsyncClient:
+    """Create an AsyncClient with the configured pool limits and timeouts"""
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("[WAHA] WAHA_HTTP2 set but 'h2' is not installed (pip install httpx[http2]), using HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(WAHA_TIMEOUT, connect=WAHA_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=WAHA_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def start():
+    """Open the shared client (called from the FastAPI lifespan)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+        print(f"[WAHA] HTTP client ready (max_connections={WAHA_MAX_CONNECTIONS}, "
+              f"keepalive={WAHA_MAX_KEEPALIVE}, http2={WAHA_HTTP2})")
+
+
+async def close():
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, opening it if the lifespan has not run"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+    return _client
+
+
+def is_open() -> bool:
+    return _client is not None and not _client.is_closed
@@ -0,0 +1,51 @@
+"""Shared test doubles"""
+
+# Sample modification_catalog / stage_presets rows
+PARTS = [
+    {"id": "1", "part_name": "Cold Air Intake", "category": "engine", "min_stage": 1},
+    {"id": "2", "part_name": "Supercharger Kit", "category": "engine", "min_stage": 3},
+    {"id": "3", "part_name": "Coilover", "category": "suspension", "min_stage": 2},
+    {"id": "4", "part_name": "Brembo Caliper", "category": "brakes", "min_stage": 2},
+    {"id": "5", "part_name": "Header 4-2-1", "category": "engine", "min_stage": None},
+]
+STAGES = [{"stage": 2, "stage_name": "Weekend Warrior"}, {"stage": 1, "stage_name": "Street Sleeper"}]
+
+
+class _Page:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, client, name):
+        self.client, self.name = client, name
+        self.ordered_by = None
+
+    def select(self, columns):
+        return self
+
+    def order(self, column):
+        self.ordered_by = column
+        return self
+
+    def range(self, start, end):
+        self.start, self.end = start, end
+        return self
+
+    def execute(self):
+        self.client.calls += 1
+        self.client.orders.append((self.name, self.ordered_by))
+        return _Page(self.client.tables[self.name][self.start:self.end + 1])
+
+
+class FakeClient:
+    """Supabase client serving table().select().order().range().execute() pages from in-memory rows"""
+
+    def __init__(self, tables=None):
+        self.calls = 0
+        # (table, order column) of every executed page
+        self.orders = []
+        self.tables = tables if tables is not None else {"modification_catalog": list(PARTS), "stage_presets": list(STAGES)}
+
+    def table(self, name):
+        return _Query(self, name)
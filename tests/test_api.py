@@ -7,3 +7,26 @@ client = TestClient(app)
 def test_health():
     response = client.get("/health")
     assert response.status_code == 200
+
+def test_ready_reports_components():
+    # Lifespan warm-up has not run for this client
+    response = client.get("/ready")
+    assert response.status_code == 503
+    body = response.json()
+    assert body["ready"] is False
+    assert "embedder" in body["components"]
+    assert body["components"]["database"]["required"] is False
+
+@pytest.mark.parametrize("body", ["", " ", "\n"])
+def test_webhook_ignores_blank_messages(body, monkeypatch):
+    from main import webhook_queue
+
+    async def enqueue(job):
+        raise AssertionError("blank message was queued")
+
+    monkeypatch.setattr(webhook_queue, "enqueue", enqueue)
+    response = client.post("/webhook", json={
+        "event": "message",
+        "payload": {"from": "628123@c.us", "body": body, "fromMe": False},
+    })
+    assert response.json() == {"status": "ignored", "reason": "empty message"}
@@ -0,0 +1,126 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from database.catalog import CatalogSnapshot, CatalogStore
+from tests.fakes import PARTS, STAGES, FakeClient
+
+
+def _names(parts):
+    return [p["part_name"] for p in parts]
+
+
+def test_snapshot_filters_match_former_queries():
+    snapshot = CatalogSnapshot(PARTS, STAGES)
+
+    assert [p["category"] for p in snapshot.parts] == ["brakes", "engine", "engine", "engine", "suspension"]
+    assert [s["stage"] for s in snapshot.stages] == [1, 2]
+    assert set(_names(snapshot.parts_for(category="engine", max_stage=1))) == {"Cold Air Intake", "Header 4-2-1"}
+    assert _names(snapshot.parts_for(max_stage=2)) == ["Brembo Caliper", "Cold Air Intake", "Header 4-2-1", "Coilover"]
+    assert _names(snapshot.parts_for(category_contains="ENG", limit=2)) == ["Cold Air Intake", "Header 4-2-1"]
+    assert snapshot.parts_for(category="audio") == []
+    assert snapshot.stage(2)["stage_name"] == "Weekend Warrior"
+
+
+def test_version_listeners_and_invalidate():
+    client = FakeClient()
+    store = CatalogStore(ttl=0, client=client)
+    versions = []
+    store.on_change(lambda snapshot: versions.append(snapshot.version))
+
+    first = store.refresh()
+    assert store.refresh() is first and versions == [1]
+
+    client.tables["stage_presets"].append({"stage": 3, "stage_name": "Track Monster"})
+    store.invalidate()
+    assert store.get() is first  # stale snapshot keeps serving during the reload
+    deadline = time.time() + 2
+    while versions == [1] and time.time() < deadline:
+        time.sleep(0.01)
+    assert versions == [1, 2]
+    assert store.get().stage(3)["stage_name"] == "Track Monster"
+
+
+def test_parts_endpoint_served_from_catalog(monkeypatch):
+    from main import app
+    from database import catalog as catalog_module
+
+    monkeypatch.setattr(catalog_module.catalog, "_snapshot", CatalogSnapshot(PARTS, STAGES, version=1))
+    monkeypatch.setattr(catalog_module.catalog, "_checked_at", time.time())
+    client = TestClient(app)
+
+    body = client.get("/parts", params={"category": "engine", "stage": 1}).json()
+    assert body["count"] == 2
+    assert [s["stage"] for s in client.get("/stages").json()["stages"]] == [1, 2]
+
+
+def test_catalog_conditional_get_and_compression(monkeypatch):
+    from main import app
+    from database import catalog as catalog_module
+
+    parts = [dict(p, description="Upgrade untuk Honda Freed " * 20) for p in PARTS]
+    monkeypatch.setattr(catalog_module.catalog, "_snapshot", CatalogSnapshot(parts, STAGES, version=1))
+    monkeypatch.setattr(catalog_module.catalog, "_checked_at", time.time())
+    client = TestClient(app)
+
+    first = client.get("/parts", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in first.headers["vary"]
+    assert "max-age" in first.headers["cache-control"]
+    assert first.json()["count"] == 5
+
+    repeat = client.get("/parts", headers={"If-None-Match": first.headers["etag"], "Accept-Encoding": "gzip"})
+    assert repeat.status_code == 304 and repeat.content == b""
+    assert repeat.headers["etag"] == first.headers["etag"]
+
+    plain = client.get("/parts", headers={"If-None-Match": first.headers["etag"], "Accept-Encoding": "identity"})
+    assert plain.status_code == 304 and plain.headers["etag"] != first.headers["etag"]
+
+    other = client.get("/parts", params={"stage": 1}, headers={"If-None-Match": first.headers["etag"]})
+    assert other.status_code == 200 and other.headers["etag"] != first.headers["etag"]
+
+
+def test_search_parts_filters_and_pagination():
+    from database.catalog import decode_cursor, hp_gain, paginate, project
+
+    parts = [
+        dict(PARTS[0], brand="K&N", legal_status="Street Legal", compatibility=["GB3", "GB4", "L15A"],
+             price_range_idr={"min": 1500000, "max": 2500000}, performance_gain={"hp": "+5-8"}),
+        dict(PARTS[1], brand="Jackson Racing", legal_status="Track Only", compatibility=["GB3", "GB4"],
+             price_range_idr={"min": 45000000, "max": 60000000}, performance_gain={"hp": "+60-80"}),
+        dict(PARTS[4], brand="Mugen", legal_status="Street Legal", compatibility=["GB3", "GB4", "L15A"],
+             price_range_idr={"min": 4000000, "max": 6000000}, performance_gain={"hp": "Supports +50 HP builds"}),
+    ]
+    snapshot = CatalogSnapshot(parts, STAGES)
+
+    assert hp_gain(parts[0]) == (5, 8) and hp_gain(parts[2]) == (None, None)
+    assert _names(snapshot.search_parts(legal_statuses=["street legal"], compatibility=["l15a"])) == \
+        ["Cold Air Intake", "Header 4-2-1"]
+    assert _names(snapshot.search_parts(price_max=5000000, hp_gain_min=6)) == ["Cold Air Intake"]
+    assert _names(snapshot.search_parts(brands=["mugen", "jackson racing"], price_min=3000000)) == \
+        ["Supercharger Kit", "Header 4-2-1"]
+
+    rows = snapshot.search_parts(category="engine")
+    first, cursor = paginate(rows, limit=2)
+    rest, last = paginate(rows, limit=2, after=decode_cursor(cursor))
+    assert [p["id"] for p in first + rest] == [p["id"] for p in rows] and last is None
+    assert project(rest, ["part_name"]) == [{"id": rest[0]["id"], "part_name": rest[0]["part_name"]}]
+
+
+def test_parts_endpoint_pagination_and_fields(monkeypatch):
+    from main import app
+    from database import catalog as catalog_module
+
+    monkeypatch.setattr(catalog_module.catalog, "_snapshot", CatalogSnapshot(PARTS, STAGES, version=1))
+    monkeypatch.setattr(catalog_module.catalog, "_checked_at", time.time())
+    client = TestClient(app)
+
+    page = client.get("/parts", params={"limit": 2, "fields": "part_name"}).json()
+    assert page["count"] == 2 and page["total"] == 5
+    assert set(page["parts"][0]) == {"id", "part_name"}
+    following = client.get("/parts", params={"limit": 2, "cursor": page["next_cursor"]}).json()
+    assert [p["id"] for p in following["parts"]] == ["2", "5"]
+
+    assert client.get("/parts", params={"fields": "secret"}).status_code == 400
+    assert client.get("/parts", params={"cursor": "!!"}).status_code == 400
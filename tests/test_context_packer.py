@@ -0,0 +1,45 @@
+from agents.context_packer import pack_context, truncate_to_tokens
+
+
+def _words(text):
+    return len(text.split())
+
+
+def _issue(symptom, causes, similarity):
+    return {"symptom": symptom, "probable_cause": causes,
+            "cost_estimate_idr": {"min": 100000, "max": 500000}, "similarity": similarity}
+
+
+def test_truncation_keeps_whole_sentences():
+    text = "Periksa tekanan refrigerant. Periksa relay AC dan sekring. Bersihkan kondensor dari kotoran jalan."
+    assert truncate_to_tokens(text, 8, _words) == "Periksa tekanan refrigerant. Periksa relay AC dan sekring."
+    assert truncate_to_tokens(text, 2, _words) == "Periksa …"
+
+
+def test_duplicates_dropped_and_budgets_enforced():
+    sentence = "Kipas kondensor harus menyala setiap kali AC ON agar tekanan tidak naik."
+    manuals = [
+        {"section": "AC", "content": " ".join([sentence] * 6), "similarity": 0.9},
+        {"section": "AC (lanjutan)", "content": " ".join([sentence] * 5), "similarity": 0.85},
+        {"section": "Relay", "content": "Relay AC ada di kotak sekring ruang mesin. " * 3, "similarity": 0.7},
+    ]
+    issues = [
+        _issue("AC tidak dingin saat macet", ["Kipas kondensor mati"], 0.8),
+        _issue("AC tidak dingin saat macet", ["Kipas kondensor mati"], 0.79),
+        _issue("Bau apek dari AC", ["Filter kabin kotor"], 0.4),
+    ]
+
+    packed = pack_context(manuals, issues, manual_tokens=60, issue_tokens=40,
+                          item_max_tokens=45, counter=_words)
+
+    assert [doc["section"] for doc in packed.manuals] == ["AC"]
+    assert [issue["symptom"] for issue in packed.issues] == ["AC tidak dingin saat macet", "Bau apek dari AC"]
+    assert packed.dropped_redundant == 2
+    assert packed.dropped_budget == 1  # Relay no longer fits the manual budget
+    manual_line = packed.text.splitlines()[1]
+    assert manual_line.endswith("naik.") and _words(manual_line) <= 45
+    assert packed.text.startswith("📚 DARI SERVICE MANUAL:")
+
+
+def test_empty_context():
+    assert pack_context([], [], counter=_words).text == "Tidak ada data spesifik ditemukan."
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import numpy as np
+
+from agents import embeddings
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.extend(texts)
+        return np.vstack([np.full(embeddings.EMBEDDING_DIM, len(t), dtype=np.float32) for t in texts])
+
+
+def test_embed_query_memoized_on_normalized_text(monkeypatch):
+    model = CountingEmbedder()
+    monkeypatch.setattr(embeddings, "_embedder", model)
+    monkeypatch.setattr(embeddings, "embedding_cache", embeddings.EmbeddingCache(max_entries=2))
+
+    first = embeddings.embed_query("AC tidak  dingin")
+    again = embeddings.embed_query("  ac TIDAK dingin ")
+    assert model.calls == ["ac tidak dingin"]
+    assert again is first and not first.flags.writeable
+
+    embeddings.embed_query("rem bunyi")
+    embeddings.embed_query("cvt getar")
+    embeddings.embed_query("ac tidak dingin")
+    assert len(model.calls) == 4
+
+    stats = embeddings.embedding_cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 2)
+
+
+def test_batcher_coalesces_concurrent_requests():
+    batch_sizes = []
+
+    def encode(texts):
+        batch_sizes.append(len(texts))
+        time.sleep(0.02)
+        return np.vstack([np.full(3, float(t.split()[-1])) for t in texts])
+
+    batcher = embeddings.EmbeddingBatcher(encode, window_ms=20, max_batch=8)
+    results = {}
+
+    def call(i):
+        results[i] = batcher.encode(f"query {i % 3}")
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[i][0] == i % 3 for i in range(20))
+    stats = batcher.get_stats()
+    assert stats["items"] == 20
+    assert stats["batches"] < 20 and stats["max_batch_seen"] <= 8
+    # Duplicate texts inside a batch share one forward row
+    assert sum(batch_sizes) < 20
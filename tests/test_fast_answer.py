@@ -0,0 +1,28 @@
+from agents.fast_answer import render_fast_answer, select_fast_answer
+
+
+def _issue(symptom, similarity, **fields):
+    return {"symptom": symptom, "probable_cause": ["Refrigerant habis"], "similarity": similarity, **fields}
+
+
+def test_only_a_clear_close_match_takes_the_fast_path():
+    ac = _issue("AC tidak dingin", 0.93)
+    assert select_fast_answer([_issue("Bau apek", 0.7), ac], threshold=0.88, margin=0.05) is ac
+    assert select_fast_answer([_issue("AC tidak dingin", 0.85)], threshold=0.88, margin=0.05) is None
+    # Two near-equal matches are ambiguous
+    assert select_fast_answer([ac, _issue("AC bunyi", 0.91)], threshold=0.88, margin=0.05) is None
+    assert select_fast_answer([ac], threshold=0.88, margin=0.05, enabled=False) is None
+    assert select_fast_answer([], threshold=0.88, margin=0.05) is None
+
+
+def test_render_uses_stored_fields():
+    text = render_fast_answer(_issue(
+        "AC tidak dingin", 0.93,
+        diagnostic_steps=["Cek tekanan refrigerant"],
+        cost_estimate_idr={"min": 200000, "max": 5000000},
+        urgency="high",
+    ))
+    assert text.startswith("*AC tidak dingin*")
+    assert "1. Refrigerant habis" in text and "1. Cek tekanan refrigerant" in text
+    assert "Rp 200,000 - Rp 5,000,000" in text
+    assert "Segera" in text
@@ -0,0 +1,54 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from agents.image_cache import ImageDiagnosisCache
+from agents.image_preprocess import prepare_image
+
+
+def _photo(seed):
+    rng = np.random.default_rng(seed)
+    # Smooth random scene (blurred noise) so the hash has structure
+    coarse = rng.integers(0, 255, (12, 16, 3), dtype=np.uint8)
+    return Image.fromarray(coarse).resize((1600, 1200), Image.BICUBIC)
+
+
+def _jpeg(image, quality, size=None):
+    if size:
+        image = image.resize(size)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_recompressed_copy_hits_and_other_photo_misses():
+    cache = ImageDiagnosisCache(max_distance=4)
+    original = prepare_image(_jpeg(_photo(1), 95))
+    forwarded = prepare_image(_jpeg(_photo(1), 40, size=(800, 600)))  # WhatsApp-style re-encode
+    other = prepare_image(_jpeg(_photo(2), 95))
+
+    assert cache.lookup(original.dhash, "Lampu apa ini?") is None
+    cache.store(original.dhash, "Lampu apa ini?", "Lampu check engine")
+
+    assert cache.lookup(forwarded.dhash, "lampu apa ini") == "Lampu check engine"
+    assert cache.lookup(forwarded.dhash, "ban aus?") is None  # different prompt
+    assert cache.lookup(other.dhash, "Lampu apa ini?") is None
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 3
+
+
+def test_bounded_and_low_detail_images_skipped():
+    cache = ImageDiagnosisCache(max_entries=2, max_distance=3)
+    hashes = [0x0F0F_F0F0_1234_5678 ^ (0xFFFF << (16 * i)) for i in range(3)]
+    for i, value in enumerate(hashes):
+        cache.store(value, "x", f"r{i}")
+
+    assert cache.lookup(hashes[0], "x") is None  # evicted
+    assert cache.lookup(hashes[2] ^ 0b101, "x") == "r2"  # 2 bits away
+    assert cache.get_stats()["entries"] == 2
+
+    blank = prepare_image(_jpeg(Image.new("RGB", (640, 480), (10, 10, 10)), 80))
+    cache.store(blank.dhash, "x", "dark")
+    assert cache.lookup(blank.dhash, "x") is None
+    assert cache.get_stats()["skipped_low_detail"] == 1
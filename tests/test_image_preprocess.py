@@ -0,0 +1,47 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from agents.image_preprocess import ImageRejected, prepare_base64_image, prepare_image, sniff_format
+
+
+def _encode(image, fmt, **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def test_downsizes_orients_and_strips_exif():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW
+    exif[0x010F] = "PhoneMaker"
+    data = _encode(Image.new("RGB", (3000, 2000), (200, 30, 30)), "JPEG", quality=95, exif=exif)
+
+    prepared = prepare_image(data, max_edge=1280)
+    result = Image.open(io.BytesIO(prepared.data))
+
+    assert result.format == "JPEG" and (result.width, result.height) == (853, 1280)
+    assert not result.getexif()
+    assert prepared.saved_bytes > 0
+    assert prepared.data_url.startswith("data:image/jpeg;base64,")
+
+
+def test_png_labelled_as_jpeg_is_sniffed_and_flattened():
+    data = _encode(Image.new("RGBA", (64, 64), (0, 0, 0, 0)), "PNG")
+    assert sniff_format(data) == "png"
+
+    prepared = prepare_base64_image("data:image/jpeg;base64," + base64.b64encode(data).decode())
+
+    assert prepared.source_format == "png" and prepared.mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(prepared.data)).getpixel((10, 10)) == (255, 255, 255)
+
+
+def test_rejects_unknown_and_oversize_input(monkeypatch):
+    with pytest.raises(ImageRejected):
+        prepare_image(b"%PDF-1.7 not an image")
+
+    monkeypatch.setattr("agents.image_preprocess.IMAGE_MAX_INPUT_BYTES", 1024)
+    with pytest.raises(ImageRejected):
+        prepare_base64_image(base64.b64encode(b"\xff\xd8\xff" + b"0" * 4096).decode())
@@ -0,0 +1,62 @@
+import asyncio
+
+from services.job_queue import JobQueue, WebhookJob
+
+
+def test_delivery_retried_without_reprocessing():
+    calls = {"process": 0, "deliver": 0}
+
+    async def process(job):
+        calls["process"] += 1
+        return f"reply to {job.message}"
+
+    async def deliver(job, text):
+        calls["deliver"] += 1
+        if calls["deliver"] < 3:
+            raise RuntimeError("WAHA unavailable")
+
+    async def run():
+        queue = JobQueue(process, deliver, workers=2, send_retries=3, retry_backoff=0.01)
+        assert await queue.enqueue(WebhookJob(chat_id="628123@c.us", message="ac tidak dingin")) == "queued"
+        await queue.join()
+        stats = queue.get_stats()
+        await queue.stop()
+        return stats
+
+    stats = asyncio.run(run())
+
+    assert calls == {"process": 1, "deliver": 3}
+    assert stats["delivered"] == 1
+    assert stats["send_retries"] == 2
+    assert stats["depth"] == 0
+
+
+def test_full_queue_and_duplicates_rejected():
+    async def run():
+        gate = asyncio.Event()
+
+        async def process(job):
+            await gate.wait()
+            return "ok"
+
+        async def deliver(job, text):
+            pass
+
+        queue = JobQueue(process, deliver, maxsize=1, workers=1)
+        first = await queue.enqueue(WebhookJob(chat_id="a", message="1", message_id="m1"))
+        await asyncio.sleep(0)  # worker picks up m1 and blocks
+        second = await queue.enqueue(WebhookJob(chat_id="a", message="2", message_id="m2"))
+        duplicate = await queue.enqueue(WebhookJob(chat_id="a", message="2", message_id="m2"))
+        full = await queue.enqueue(WebhookJob(chat_id="a", message="3", message_id="m3"))
+        gate.set()
+        await queue.join()
+        stats = queue.get_stats()
+        await queue.stop()
+        return first, second, duplicate, full, stats
+
+    first, second, duplicate, full, stats = asyncio.run(run())
+
+    assert (first, second, duplicate, full) == ("queued", "queued", "duplicate", "full")
+    assert stats["rejected_full"] == 1
+    assert stats["duplicates"] == 1
+    assert stats["delivered"] == 2
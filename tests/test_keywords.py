@@ -0,0 +1,75 @@
+import pytest
+
+from agents.keywords import analyze_message
+from main import detect_intent
+
+# (message, intent) - routing the old substring scan already got right
+GOLDEN_INTENTS = [
+    ("Halo", "greeting"),
+    ("selamat pagi", "greeting"),
+    ("hi", "greeting"),
+    ("Stage 1", "stage"),
+    ("stage2 dong", "stage"),
+    ("info stage 3", "stage"),
+    ("modif mesin budget 10jt", "modification"),
+    ("Modifikasi velg 17 inch", "modification"),
+    ("Rekomendasi coilover", "modification"),
+    ("upgrade rem brembo", "modification"),
+    ("remap ecu hondata", "modification"),
+    ("bengkel jakarta", "bengkel"),
+    ("rekomendasi bengkel bandung", "bengkel"),
+    ("AC tidak dingin", "diagnostic"),
+    ("ac ga dingin kenapa ya", "diagnostic"),
+    ("CVT getar", "diagnostic"),
+    ("Check engine light menyala", "diagnostic"),
+    ("Mobil getar saat akselerasi", "diagnostic"),
+    ("mesin overheat di tol", "diagnostic"),
+    ("menu", "help"),
+    ("bantuan", "help"),
+    ("apa itu i-vtec", "help"),
+    ("lampu kabin berkedip", "diagnostic"),
+]
+
+# (message, intent) - cases the old substring scan misrouted
+GOLDEN_FIXES = [
+    ("Rem bunyi decit", "diagnostic"),           # was modification ("rem")
+    ("premium atau pertalite?", "diagnostic"),   # was modification ("rem" in "premium")
+    ("chip", "diagnostic"),                      # was greeting ("hi" in "chip")
+    ("mobil susah start pagi", "diagnostic"),    # was greeting ("pagi", < 30 chars)
+    ("secara umum gimana", "diagnostic"),        # was help ("cara" in "secara")
+]
+
+
+@pytest.mark.parametrize("message,intent", GOLDEN_INTENTS + GOLDEN_FIXES)
+def test_intent_golden(message, intent):
+    assert detect_intent(message) == intent
+
+
+@pytest.mark.parametrize("message,focus_area,stage,budget", [
+    ("Stage 1", None, 1, None),
+    ("modif mesin budget 10jt", "engine", None, 10_000_000),
+    ("modif mesin budget 7.5 juta", "engine", None, 7_500_000),
+    ("modif mesin budget 10jtan", "engine", None, 10_000_000),
+    ("modif mesin budget 20 jutaan", "engine", None, 20_000_000),
+    ("ganti per belakang", "suspension", None, None),
+    ("kaki-kaki pakai coilover", "suspension", None, None),
+    ("pasang speaker dan head unit", "audio", None, None),
+    ("racing seat bride", "interior", None, None),
+    ("upgrade brembo caliper", "brakes", None, None),
+    ("upgrade performa", None, None, None),      # was suspension ("per" in "performa")
+])
+def test_modification_features(message, focus_area, stage, budget):
+    features = analyze_message(message)
+    assert features["focus_area"] == focus_area
+    assert features["stage"] == stage
+    assert features["budget"] == budget
+
+
+def test_symptoms_single_scan():
+    features = analyze_message("AC bocor dan mobil susah start")
+
+    assert features["symptom_keys"] == ["ac", "bocor", "susah_start"]
+    assert features["symptoms"][:4] == ["freon habis", "kompresor", "kondensor", "evaporator"]
+    assert "aki lemah" in features["symptoms"]
+    # "ac" must not match inside other words
+    assert analyze_message("acara kopdar freed")["symptom_keys"] == []
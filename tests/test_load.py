@@ -0,0 +1,73 @@
+import asyncio
+import statistics
+import sys
+import time
+import types
+
+import httpx
+
+from main import app
+
+IN_FLIGHT = 50
+PIPELINE_SECONDS = 0.2
+
+
+def _install_slow_diagnostic_agent(monkeypatch):
+    """
+    Stand-in for agents.freed_diagnostic
+
+    Mirrors how diagnostic_graph.ainvoke runs sync nodes: blocking work
+    goes through run_in_executor(None, ...), i.e. the loop's default executor.
+    """
+    module = types.ModuleType("agents.freed_diagnostic")
+
+    async def aprocess_freed_message(user_id: str, message: str) -> str:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, time.sleep, PIPELINE_SECONDS)
+        return "🔧 *DIAGNOSA HONDA FREED*"
+
+    module.aprocess_freed_message = aprocess_freed_message
+    monkeypatch.setitem(sys.modules, "agents.freed_diagnostic", module)
+
+
+async def _health_latencies(client: httpx.AsyncClient, samples: int) -> list:
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        response = await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+        await asyncio.sleep(0.02)
+    return latencies
+
+
+async def _run_load_test():
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            idle = await _health_latencies(client, 10)
+
+            diagnostics = [
+                client.post("/process", json={"user_id": f"load-{i}", "message": "mesin bunyi kasar"}, timeout=60)
+                for i in range(IN_FLIGHT)
+            ]
+            pending = asyncio.gather(*diagnostics)
+            await asyncio.sleep(0.05)
+            loaded = await _health_latencies(client, 20)
+            responses = await pending
+
+    return idle, loaded, responses
+
+
+def test_health_latency_flat_under_diagnostic_load(monkeypatch):
+    _install_slow_diagnostic_agent(monkeypatch)
+    monkeypatch.setattr("services.readiness.WARMUP_ON_STARTUP", False)
+
+    idle, loaded, responses = asyncio.run(_run_load_test())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json()["intent"] == "diagnostic" for r in responses)
+
+    # A blocked loop would stall /health for the full pipeline time
+    assert max(loaded) < PIPELINE_SECONDS
+    assert statistics.median(loaded) < statistics.median(idle) + 0.05
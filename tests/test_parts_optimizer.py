@@ -0,0 +1,71 @@
+import itertools
+import time
+
+from fastapi.testclient import TestClient
+
+from agents.parts_optimizer import optimize_build, planned_part
+from database.catalog import CatalogSnapshot
+
+
+def _part(id, subcategory, hp, price, hours=1, min_stage=1, **fields):
+    return {
+        "id": id, "part_name": f"Part {id}", "category": "engine", "subcategory": subcategory,
+        "performance_gain": {"hp": hp}, "price_range_idr": {"min": price // 2, "max": price},
+        "installation_time_hours": hours, "min_stage": min_stage, "legal_status": "Street Legal",
+        "compatibility": ["GB3", "GB4"], **fields,
+    }
+
+
+PARTS = [
+    _part("intake", "air intake", "+5-8", 3_000_000),
+    _part("filter", "air intake", "+3-5", 1_000_000),
+    _part("header", "exhaust", "+5-8", 3_500_000, hours=3),
+    _part("muffler", "exhaust", "+3-5", 2_000_000),
+    _part("tune", "tuning", "+10-15", 8_000_000, hours=2),
+    _part("plugs", "ignition", "+1-2", 500_000, hours=0.5),
+    _part("injectors", "fuel", "Supports +50 HP builds", 4_000_000),
+    _part("supercharger", "forced induction", "+60-80", 50_000_000, hours=16, min_stage=3, legal_status="Gray Area"),
+    _part("turbo", "forced induction", "+80-120", 60_000_000, min_stage=3, legal_status="Track Only"),
+]
+
+
+def _brute_force(parts, budget):
+    """Best value over every choice of at most one part per subcategory"""
+    planned = [p for p in (planned_part(part) for part in parts) if p.value > 0]
+    groups = {}
+    for p in planned:
+        groups.setdefault(p.part["subcategory"], [None]).append(p)
+    best = 0.0
+    for combo in itertools.product(*groups.values()):
+        chosen = [p for p in combo if p]
+        if sum(p.cost for p in chosen) <= budget:
+            best = max(best, sum(p.value for p in chosen))
+    return best
+
+
+def test_build_is_optimal_and_within_budget():
+    for budget in (1_000_000, 5_000_000, 10_000_000, 20_000_000):
+        build = optimize_build(PARTS, budget)
+        assert build.total_cost <= budget
+        assert abs(sum(p.value for p in build.parts) - _brute_force(PARTS, budget)) < 1e-6
+        subcategories = [p.part["subcategory"] for p in build.parts]
+        assert len(subcategories) == len(set(subcategories))
+        assert "injectors" not in [p.part["id"] for p in build.parts]  # no numeric gain
+
+
+def test_plan_endpoint_respects_stage_and_legal_status(monkeypatch):
+    from main import app
+    from database import catalog as catalog_module
+
+    monkeypatch.setattr(catalog_module.catalog, "_snapshot", CatalogSnapshot(PARTS, [], version=1))
+    monkeypatch.setattr(catalog_module.catalog, "_checked_at", time.time())
+    client = TestClient(app)
+
+    body = client.get("/plan", params={"budget": 100_000_000, "stage": 2}).json()
+    ids = {p["id"] for p in body["parts"]}
+    assert ids == {"intake", "header", "tune", "plugs"}
+    assert body["total_cost_idr"] <= 100_000_000 and body["estimated_hp"][0] == 117 + 21
+
+    ids = {p["id"] for p in client.get("/plan", params={"budget": 100_000_000, "stage": 3}).json()["parts"]}
+    assert "supercharger" in ids and "turbo" not in ids  # Track Only is opt-in
+    assert client.get("/plan", params={"budget": 0}).status_code == 422
@@ -0,0 +1,70 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+from services.rate_limit import RateLimiter, TokenBucket, retry_after_seconds
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_retries_429_honoring_retry_after():
+    limiter = RateLimiter("test_429", concurrency=2, retries=2, backoff_base=5)
+    attempts = []
+
+    async def call():
+        attempts.append(time.perf_counter())
+        if len(attempts) == 1:
+            raise FakeStatusError(429, {"retry-after": "0.05"})
+        return "ok"
+
+    assert asyncio.run(limiter.call(call)) == "ok"
+    stats = limiter.get_stats()
+    assert stats["rate_limited"] == 1 and stats["retries"] == 1 and stats["succeeded"] == 1
+    # Retry-After (50 ms) was used instead of the 5 s backoff
+    assert 0.04 < attempts[1] - attempts[0] < 1
+
+
+def test_client_errors_are_not_retried():
+    limiter = RateLimiter("test_400", concurrency=1, retries=3)
+
+    async def call():
+        raise FakeStatusError(400)
+
+    with pytest.raises(FakeStatusError):
+        asyncio.run(limiter.call(call))
+    assert limiter.get_stats()["retries"] == 0 and limiter.get_stats()["failed"] == 1
+
+
+def test_concurrency_cap_and_queue_time():
+    limiter = RateLimiter("test_cap", concurrency=2)
+    running = {"now": 0, "peak": 0}
+
+    async def call():
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.02)
+        running["now"] -= 1
+
+    async def run():
+        await asyncio.gather(*(limiter.call(call) for _ in range(6)))
+
+    asyncio.run(run())
+    stats = limiter.get_stats()
+    assert running["peak"] == 2
+    assert stats["queue_ms_max"] >= 30 and stats["call_ms_avg"] >= 15
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate_per_minute=600, burst=2)  # 10/s
+    assert bucket.reserve() == 0 and bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+
+    error = FakeStatusError(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    assert retry_after_seconds(error) == 0.0
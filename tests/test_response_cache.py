@@ -0,0 +1,77 @@
+import numpy as np
+
+from agents.response_cache import EXACT, SEMANTIC, ResponseCache
+
+# Hand-made unit vectors stand in for MiniLM embeddings
+VECTORS = {
+    "ac tidak dingin": [1.0, 0.0, 0.0],
+    "ac ga dingin kenapa ya": [0.96, 0.28, 0.0],
+    "rem bunyi decit": [0.0, 1.0, 0.0],
+    "rem tidak pakem": [0.0, 0.97, 0.243],
+}
+
+
+def fake_embed(text):
+    key = " ".join(text.lower().replace("?", "").split())
+    return np.array(VECTORS.get(key, [0.0, 0.0, 1.0]), dtype=np.float32)
+
+
+def _cache(**kwargs):
+    return ResponseCache(embed=fake_embed, similarity=0.9, **kwargs)
+
+
+def test_exact_and_semantic_tiers():
+    cache = _cache()
+
+    miss = cache.lookup("AC tidak dingin")
+    assert not miss.hit
+    cache.store(miss, "cek freon")
+
+    exact = cache.lookup("  ac TIDAK dingin!! ")
+    assert (exact.tier, exact.response) == (EXACT, "cek freon")
+
+    near = cache.lookup("ac ga dingin kenapa ya?")
+    assert (near.tier, near.response) == (SEMANTIC, "cek freon")
+
+    stats = cache.get_stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_semantic_hit_requires_same_symptoms():
+    cache = _cache()
+    miss = cache.lookup("rem bunyi decit")
+    cache.store(miss, "ganti brake pad")
+
+    # Cosine 0.97 but 'bunyi' is not detected, so it must not reuse the answer
+    assert not cache.lookup("rem tidak pakem").hit
+
+
+def test_lru_ttl_and_invalidate():
+    cache = _cache(max_entries=2, ttl=60)
+    for message in ["ac tidak dingin", "rem bunyi decit", "rem tidak pakem"]:
+        cache.store(cache.lookup(message), message)
+    assert not cache.lookup("ac tidak dingin").hit
+    assert cache.get_stats()["evictions"] == 1
+
+    cache._entries["rem bunyi decit"].created_at -= 120
+    assert not cache.lookup("rem bunyi decit").hit
+    assert cache.get_stats()["expired"] == 1
+
+    pending = cache.lookup("mesin overheat")
+    assert cache.invalidate() == 1
+    cache.store(pending, "stale answer")
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = _cache(db_path=path)
+    cache.store(cache.lookup("ac tidak dingin"), "cek freon")
+    cache.close()
+
+    restarted = _cache(db_path=path)
+    assert restarted.lookup("ac ga dingin kenapa ya").response == "cek freon"
+    restarted.invalidate()
+    restarted.close()
+
+    assert _cache(db_path=path).get_stats()["entries"] == 0
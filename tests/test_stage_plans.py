@@ -0,0 +1,68 @@
+import time
+
+from agents.stage_plans import StagePlan, StagePlanCache, plan_key
+from database.catalog import CatalogStore
+from tests.fakes import FakeClient
+
+
+def test_plan_key_only_for_plain_stage_requests():
+    assert plan_key("Stage 1") == (1, "engine", None)
+    assert plan_key("stage 2 kaki-kaki dong") == (2, "suspension", None)
+    assert plan_key("stage 1 budget 12jt") == (1, "engine", 10_000_000)
+    assert plan_key("stage 1 budget 3jt") is None  # below the smallest bucket
+    assert plan_key("stage 1 tapi jangan ganti knalpot racing ya") is None
+    assert plan_key("stage 1 tapi jangan pakai turbo") is None
+    assert plan_key("stage 2 jangan yang ilegal") is None
+    assert plan_key("stage 1 knalpot racing") is None
+    assert plan_key("stage 1 coilover") is None  # part-level focus word, not a category
+    assert plan_key("minta detail stage 1 mesinnya dong") == (1, "engine", None)
+    assert plan_key("modif mesin budget 10jt") is None
+
+
+def _wait_idle(cache):
+    for _ in range(100):
+        if not cache.get_stats()["regenerating"]:
+            return
+        time.sleep(0.01)
+
+
+def test_plans_generated_on_load_and_regenerated_on_change():
+    client = FakeClient()
+    store = CatalogStore(ttl=0, client=client)
+    generated = []
+
+    def generate(key):
+        generated.append(key)
+        return StagePlan(f"plan {key}", {}, None, store.get().version, time.time())
+
+    cache = StagePlanCache()
+    cache.attach(store, generate)
+    store.refresh()
+    _wait_idle(cache)
+    assert sorted(generated) == [(1, "engine", None), (2, "engine", None)]
+    assert cache.get((1, "engine", None)).modification_plan == "plan (1, 'engine', None)"
+
+    generated.clear()
+    store.refresh()  # unchanged content: nothing to do
+    _wait_idle(cache)
+    assert generated == []
+
+    client.tables["modification_catalog"].append({"id": "9", "part_name": "CAI", "category": "engine", "min_stage": 1})
+    store.refresh()
+    _wait_idle(cache)
+    assert len(generated) == 2
+    assert cache.get_stats()["catalog_versions"] == [2]
+
+
+def test_requested_key_is_generated_in_the_background():
+    store = CatalogStore(ttl=0, client=FakeClient())
+    cache = StagePlanCache()
+    cache.attach(store, lambda key: StagePlan(f"plan {key}", {}, None, store.get().version, time.time()))
+    store.refresh()
+    _wait_idle(cache)
+
+    key = (1, "engine", 10_000_000)
+    assert cache.get(key) is None
+    cache.request(key)
+    _wait_idle(cache)
+    assert cache.get(key).modification_plan == f"plan {key}"
@@ -0,0 +1,63 @@
+import asyncio
+from typing import TypedDict
+
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, END
+
+from agents.streaming import stream_graph
+
+
+class _State(TypedDict):
+    message: str
+    answer: str
+    response: str
+
+
+def _build_graph(llm):
+    async def generate(state):
+        return {"answer": (await llm.ainvoke(state["message"])).content}
+
+    def generate_sync(state):
+        return {"answer": llm.invoke(state["message"]).content}
+
+    def format_response(state):
+        return {"response": f"HEAD|{state['answer']}|FOOT"}
+
+    workflow = StateGraph(_State)
+    workflow.add_node("generate", RunnableLambda(generate_sync, afunc=generate, name="generate"))
+    workflow.add_node("format_response", format_response)
+    workflow.set_entry_point("generate")
+    workflow.add_edge("generate", "format_response")
+    workflow.add_edge("format_response", END)
+    return workflow.compile()
+
+
+def test_stream_graph_frames_tokens():
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content="Kemungkinan freon habis")]))
+    graph = _build_graph(llm)
+
+    async def collect():
+        state = {"message": "AC tidak dingin", "answer": "", "response": ""}
+        return [e async for e in stream_graph(graph, state, "generate", lambda s: "HEAD|", lambda s: "|FOOT")]
+
+    events = asyncio.run(collect())
+
+    kinds = [e["event"] for e in events]
+    assert kinds[0] == "header" and kinds[-2:] == ["footer", "done"]
+    assert kinds.count("token") > 1  # streamed, not one final chunk
+    streamed = "".join(e["text"] for e in events if e["event"] in ("header", "token", "footer"))
+    assert streamed == events[-1]["response"] == "HEAD|Kemungkinan freon habis|FOOT"
+
+
+def test_process_stream_canned_reply():
+    from main import app
+
+    with TestClient(app).stream("POST", "/process/stream", json={"user_id": "web-1", "message": "halo"}) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = response.read().decode()
+
+    assert body.startswith('event: meta\ndata: {"intent": "greeting"}')
+    assert "event: done" in body and "SELAMAT DATANG" in body
@@ -0,0 +1,50 @@
+import types
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_multipart_upload_reaches_agent_as_file(monkeypatch):
+    received = {}
+
+    async def aprocess_image_upload(user_id, message, image_file):
+        received.update(user_id=user_id, message=message, head=image_file.read(3))
+        return "ok"
+
+    async def load_agent(name):
+        return types.SimpleNamespace(aprocess_image_upload=aprocess_image_upload)
+
+    monkeypatch.setattr(main, "_load_agent", load_agent)
+    client = TestClient(main.app)
+
+    response = client.post(
+        "/process-image/upload",
+        data={"user_id": "web-1", "message": "ban aus?"},
+        files={"image": ("ban.jpg", b"\xff\xd8\xff" + b"0" * 2048, "image/jpeg")},
+    )
+
+    assert response.json() == {"response": "ok", "intent": "vision_diagnostic"}
+    assert received == {"user_id": "web-1", "message": "ban aus?", "head": b"\xff\xd8\xff"}
+
+
+def test_upload_size_cap(monkeypatch):
+    monkeypatch.setattr(main.image_preprocess, "IMAGE_MAX_INPUT_BYTES", 1024)
+    client = TestClient(main.app)
+    files = {"image": ("big.jpg", b"0" * 200_000, "image/jpeg")}
+
+    assert client.post("/process-image/upload", files=files).status_code == 413
+
+    # Without Content-Length the cap is enforced while streaming
+    def chunks():
+        body = b"--x\r\nContent-Disposition: form-data; name=\"image\"; filename=\"a.jpg\"\r\n\r\n"
+        yield body
+        for _ in range(50):
+            yield b"0" * 8192
+
+    response = client.post(
+        "/process-image/upload",
+        content=chunks(),
+        headers={"Content-Type": "multipart/form-data; boundary=x"},
+    )
+    assert response.status_code == 413
@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+
+from database.vector_index import ISSUE_COLUMNS, LocalRetrieval, VectorIndex
+from tests.fakes import FakeClient
+
+
+def _rows(count, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, 384)).astype(np.float32)
+    return [
+        {"id": str(i), "symptom": f"gejala {i}", "embedding": json.dumps(v.tolist())}
+        for i, v in enumerate(vectors)
+    ], vectors
+
+
+def test_search_matches_brute_force_cosine():
+    rows, vectors = _rows(300)
+    index = VectorIndex("freed_common_issues", ISSUE_COLUMNS)
+    index.load(rows)
+
+    query = vectors[7] + 0.5 * vectors[42]
+    expected = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    order = np.argsort(-expected)
+
+    results = index.search(query, match_threshold=-1.0, match_count=5)
+    assert [r["id"] for r in results] == [str(i) for i in order[:5]]
+    assert np.allclose([r["similarity"] for r in results], expected[order[:5]], atol=1e-5)
+    assert set(results[0]) == set(ISSUE_COLUMNS) | {"similarity"}
+
+    # Threshold is strict '>' like the SQL functions
+    above = index.search(query, match_threshold=0.3, match_count=50)
+    assert [r["id"] for r in above] == [str(i) for i in order if expected[i] > 0.3][:50]
+
+    half = VectorIndex("freed_common_issues", ISSUE_COLUMNS, dtype="float16")
+    half.load(rows)
+    assert [r["id"] for r in half.search(query, -1.0, 2)] == [str(i) for i in order[:2]]
+
+
+def test_refresh_pages_through_tables(monkeypatch):
+    monkeypatch.setattr("database.vector_index.PAGE_SIZE", 64)
+    manuals, _ = _rows(150, seed=1)
+    issues, _ = _rows(10, seed=2)
+    local = LocalRetrieval()
+    assert not local.ready
+
+    client = FakeClient({"freed_service_manuals": manuals, "freed_common_issues": issues})
+    local.refresh(client)
+    # Paging is only stable with an explicit order
+    assert {column for _, column in client.orders} == {"id"}
+
+    stats = local.get_stats()
+    assert (stats["ready"], stats["manuals"], stats["issues"]) == (True, 150, 10)
+    context = local.search_context(np.ones(384), manual_count=5, issue_count=3, manual_threshold=-1, issue_threshold=-1)
+    assert (len(context["manuals"]), len(context["issues"])) == (5, 3)